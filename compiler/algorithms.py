@@ -19,9 +19,11 @@ def representative(s):
 	'''
 	return iter(s).next()
 
-def all_indices(string, sub, listindex=[], offset=0):
+def all_indices(string, sub, listindex=None, offset=0):
     # call as l = allindices(string, sub)
     # http://code.activestate.com/recipes/499314-find-all-indices-of-a-substring-in-a-given-string/
+    if listindex is None:
+        listindex = []
     i = string.find(sub, offset)
     while i >= 0:
         listindex.append(i)
@@ -1,6 +1,7 @@
 import logging
 import errors
-from utility import camelCaseToUnderscores
+from syntax.ast_meta import AstNode
+from syntax.ast import AstStatement
 
 def elideNode(node, liftFormalTypes=False):
     """
@@ -31,28 +32,95 @@ def elideNode(node, liftFormalTypes=False):
             item.parent_property = node.parent_property
             # Note: item.parent_index remains unchanged
     assert hasattr(node.parent, node.parent_property)
+    node_index = nodeIndexOf(node)
+    if node_index is not None:
+        node_index.remove(node)
     if liftFormalTypes:
-        node.parent.child_infos[camelCaseToUnderscores(node.parent_property)] = node.child_infos[prop]
+        owner = node.parent.__class__
+        owner.setChildInfo(owner._info_names[node.parent_property], node.child_infos[prop])
     node.parent.setProperty(getattr(node, prop), node.parent_property)
     
 def findFollowingStatement(statement):
     """
-    Given a statement, locates the following statement or None
+    Given a statement, returns the following statement or None, from the
+    successor index built by indexSuccessors.
     """
-    if statement.parent is None:
-        return None
+    return statement.linear_successor
 
-    if statement.parent_index is None:
-        return None
-    
-    parent_list = getattr(statement.parent, statement.parent_property)
-    
-    if isinstance(parent_list, list):
-        logging.debug("statement.parent_index = %s", statement.parent_index)
-        if statement.parent_index < (len(parent_list) - 1):
-            return parent_list[statement.parent_index + 1]
-    
-    return findFollowingStatement(statement.parent)
+def searchFollowingStatement(statement):
+    """
+    Given a statement, locates the following statement or None, searching up
+    through the enclosing statements
+    """
+    while statement.parent is not None and statement.parent_index is not None:
+        parent_list = getattr(statement.parent, statement.parent_property)
+        
+        if isinstance(parent_list, list):
+            logging.debug("statement.parent_index = %s", statement.parent_index)
+            if statement.parent_index < (len(parent_list) - 1):
+                return parent_list[statement.parent_index + 1]
+        
+        statement = statement.parent
+    return None
+
+def indexSuccessors(root, successor=None):
+    """
+    Build the successor index of the statements of the AST rooted at root in a
+    single pass, setting the linear_successor of each statement to the statement
+    which searchFollowingStatement would locate. Within a statement list each
+    statement is followed by the next, and the last by the successor of the
+    statement holding the list. The AST must have been simplified, so that every
+    statement is held in a list, and only lists are searched for statements.
+    :param successor: The successor of root, if root is a statement
+    """
+    if isinstance(root, AstStatement):
+        root.linear_successor = successor
+    pending = [(root, successor)]
+    while pending:
+        node, successor = pending.pop()
+        for name in node._child_order:
+            child = getattr(node, name)
+            if isinstance(child, list):
+                last = len(child) - 1
+                for index, subchild in enumerate(child):
+                    if not isinstance(subchild, AstNode):
+                        continue
+                    if subchild.parent is not node:
+                        # Such as a statement of a StatementList lifted into its owner
+                        subchild_successor = searchFollowingStatement(subchild)
+                    elif index < last:
+                        subchild_successor = child[index + 1]
+                    else:
+                        subchild_successor = successor
+                    if isinstance(subchild, AstStatement):
+                        subchild.linear_successor = subchild_successor
+                    pending.append((subchild, subchild_successor))
+
+def exitStatements(statement):
+    """
+    :returns: The statements which share the successor of statement by being
+              last in the statement lists it holds, nested to any depth,
+              together with statement itself.
+    """
+    exits = []
+    pending = [statement]
+    while pending:
+        statement = pending.pop()
+        exits.append(statement)
+        for name in statement._child_order:
+            child = getattr(statement, name)
+            if isinstance(child, list) and len(child) > 0:
+                last = child[-1]
+                if isinstance(last, AstStatement) and last.parent is statement:
+                    pending.append(last)
+    return exits
+
+def reindexStatements(parent_list, start):
+    """
+    Correct the parent_index of the statements in parent_list from index start
+    """
+    for index in xrange(start, len(parent_list)):
+        parent_list[index].parent_index = index
 
 def findRoot(node):
     """
@@ -63,6 +131,13 @@ def findRoot(node):
         n = n.parent
     return n
 
+def nodeIndexOf(node):
+    """
+    :returns: The NodeIndex of the AST holding node, or None if the AST has not
+              been indexed.
+    """
+    return getattr(findRoot(node), 'node_index', None)
+
 def findNode(node, predicate):
     """
     Given an AST node, search up the tree until a node matching the
@@ -87,11 +162,22 @@ def insertStatementBefore(statement, target):
     parent_list = getattr(statement.parent, statement.parent_property)
     
     if isinstance(parent_list, list):
-        parent_list.insert(statement.parent_index, target)
+        index = statement.parent_index
+        parent_list.insert(index, target)
         target.parent = statement.parent
         target.parent_property = statement.parent_property
-        target.parent_index = statement.parent_index
-        statement.parent_index += 1
+        target.parent_index = index
+        reindexStatements(parent_list, index + 1)
+        
+        # Correct the successor index
+        if index > 0:
+            for exit_statement in exitStatements(parent_list[index - 1]):
+                exit_statement.linear_successor = target
+        indexSuccessors(target, statement)
+        
+        node_index = nodeIndexOf(statement)
+        if node_index is not None:
+            node_index.insertBefore(target, statement)
                   
     else:
         errors.fatalError("Cannot insert statement into non-list %s at line %s" % (statement, statement.lineNum))
@@ -127,6 +213,17 @@ def insertStatementAfter(statement, target):
         target.parent = statement.parent
         target.parent_property = statement.parent_property
         target.parent_index = target_index
+        reindexStatements(parent_list, target_index + 1)
+        
+        # Correct the successor index
+        successor = statement.linear_successor
+        for exit_statement in exitStatements(statement):
+            exit_statement.linear_successor = target
+        indexSuccessors(target, successor)
+        
+        node_index = nodeIndexOf(statement)
+        if node_index is not None:
+            node_index.insertAfter(target, statement)
                   
     else:
         errors.fatalError("Cannot insert statement into non-list %s at line %s" % (statement, statement.lineNum))
@@ -135,8 +232,8 @@ def insertStatementAfter(statement, target):
     # Reconnect CFG
     for next_stmt in statement.outEdges:
         assert statement in next_stmt.inEdges
-        next_statement.inEdges.remove(statement)
-        next_statement.inEdges.add(target)
+        next_stmt.inEdges.remove(statement)
+        next_stmt.inEdges.add(target)
         target.outEdges.add(next_stmt)
         
     statement.clearOutEdges()
@@ -154,7 +251,19 @@ def removeStatement(statement):
         
     # Remove from the parent list
     parent_list = getattr(statement.parent, statement.parent_property)
-    parent_list.remove(statement)
+    index = statement.parent_index
+    assert parent_list[index] is statement
+    del parent_list[index]
+    reindexStatements(parent_list, index)
+    
+    # Correct the successor index
+    if index > 0:
+        for exit_statement in exitStatements(parent_list[index - 1]):
+            exit_statement.linear_successor = statement.linear_successor
+    
+    node_index = nodeIndexOf(statement)
+    if node_index is not None:
+        node_index.removeTree(statement)
     
     # Reconnect CFG
     for prior_stmt in statement.inEdges:
@@ -170,6 +279,41 @@ def removeStatement(statement):
     statement.clearInEdges()
     statement.clearOutEdges()
 
+def removeStatements(statements):
+    """
+    Remove the statements, which must already have been disconnected from the
+    CFG, from the AST. The statements held in each list are removed together,
+    in a single pass over the list, rather than one at a time.
+    """
+    removals = {}
+    for statement in statements:
+        if statement.parent is None:
+            errors.fatalError("Cannot remove statement %s at line %s" % (statement, statement.lineNum))
+        key = (id(statement.parent), statement.parent_property)
+        removals.setdefault(key, (statement.parent, statement.parent_property, set()))[2].add(statement)
+    
+    for parent, parent_property, removed in removals.itervalues():
+        parent_list = getattr(parent, parent_property)
+        kept = []
+        last_removed = None
+        for statement in parent_list + [None]:
+            if statement is not None and statement in removed:
+                last_removed = statement
+                continue
+            # Correct the successor index, over the run of removed statements
+            if last_removed is not None and kept:
+                for exit_statement in exitStatements(kept[-1]):
+                    exit_statement.linear_successor = last_removed.linear_successor
+            last_removed = None
+            if statement is not None:
+                kept.append(statement)
+        parent_list[:] = kept
+        reindexStatements(parent_list, 0)
+        
+        node_index = nodeIndexOf(parent)
+        if node_index is not None:
+            node_index.removeTrees(removed)
+
 def replaceStatement(old, new):
     '''
     Replace old with new in the AST and CFG
@@ -0,0 +1,191 @@
+'''
+The storage of the control flow graph of a compilation.
+
+Each CfgVertex is given a dense integer id by the CfgStore of the compilation
+when it is first connected or tagged, and the edges of the graph are held as
+rows of vertex ids, rather than as sets of vertices held by each vertex. The
+rows of the vertices which have been compacted are held in compressed sparse
+row arrays, one pair of arrays for each relation. Rows which have been changed
+since the last compaction, or which belong to vertices registered since then,
+are held in an overlay of sorted lists, which compact merges into the arrays.
+Every row is sorted by vertex id, so the edges of a vertex are iterated in the
+order in which the vertices were registered.
+
+The entry point names with which vertices are tagged are held as frozensets,
+each distinct set of names being shared by all the vertices with those names.
+
+Analyses which work on whole graphs can compact the store, and use the arrays
+returned by csr, indexing arrays and bitsets by vertex id. Analyses which cache
+their results can compare the version of the store, which is incremented by
+each change to the edges, with that from which their results were computed.
+'''
+
+from array import array
+from bisect import bisect_left
+
+# The relations between vertices, each of which has its own rows
+(OUT_EDGES, IN_EDGES, COME_FROM_GOSUB_EDGES, LOOP_BACK_EDGES, LOOP_FROM_EDGES) = range(5)
+RELATIONS = (OUT_EDGES, IN_EDGES, COME_FROM_GOSUB_EDGES, LOOP_BACK_EDGES, LOOP_FROM_EDGES)
+
+# The entry points of a vertex which has none
+NO_ENTRY_POINTS = frozenset()
+
+class CfgStore(object):
+    '''
+    The vertices, edges and entry points of a control flow graph.
+    '''
+    def __init__(self):
+        self.vertices = [] # id -> vertex
+        self.version = 0   # Incremented by each change to the edges
+        # The compressed sparse rows of the vertices with ids below compacted_size
+        self.compacted_size = 0
+        self.__offsets = [array('l', [0]) for relation in RELATIONS]
+        self.__targets = [array('l') for relation in RELATIONS]
+        # id -> sorted list of target ids, replacing any compressed row
+        self.__overlay = [{} for relation in RELATIONS]
+        self.__entry_points = {} # id -> frozenset of names
+        self.__name_sets = {NO_ENTRY_POINTS: NO_ENTRY_POINTS}
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def register(self, vertex):
+        '''
+        :returns: The id allocated to vertex
+        '''
+        vertex_id = len(self.vertices)
+        self.vertices.append(vertex)
+        return vertex_id
+
+    def row(self, relation, vertex_id):
+        '''
+        :returns: A sorted sequence of the ids of the vertices related to the
+                  vertex with vertex_id, which must not be modified.
+        '''
+        overlay = self.__overlay[relation].get(vertex_id)
+        if overlay is not None:
+            return overlay
+        if vertex_id < self.compacted_size:
+            offsets = self.__offsets[relation]
+            return self.__targets[relation][offsets[vertex_id]:offsets[vertex_id + 1]]
+        return ()
+
+    def rowLength(self, relation, vertex_id):
+        overlay = self.__overlay[relation].get(vertex_id)
+        if overlay is not None:
+            return len(overlay)
+        if vertex_id < self.compacted_size:
+            offsets = self.__offsets[relation]
+            return offsets[vertex_id + 1] - offsets[vertex_id]
+        return 0
+
+    def contains(self, relation, vertex_id, target_id):
+        row = self.row(relation, vertex_id)
+        index = bisect_left(row, target_id)
+        return index < len(row) and row[index] == target_id
+
+    def __editableRow(self, relation, vertex_id):
+        overlay = self.__overlay[relation]
+        row = overlay.get(vertex_id)
+        if row is None:
+            row = overlay[vertex_id] = list(self.row(relation, vertex_id))
+        return row
+
+    def add(self, relation, vertex_id, target_id):
+        '''
+        Relate the vertex with target_id to the vertex with vertex_id, if they
+        are not already related.
+        '''
+        row = self.__editableRow(relation, vertex_id)
+        index = bisect_left(row, target_id)
+        if index == len(row) or row[index] != target_id:
+            row.insert(index, target_id)
+            self.version += 1
+
+    def remove(self, relation, vertex_id, target_id):
+        '''
+        Remove the relation to the vertex with target_id from the vertex with
+        vertex_id.
+        :raises KeyError: If the vertices are not related
+        '''
+        if not self.contains(relation, vertex_id, target_id):
+            raise KeyError(target_id)
+        row = self.__editableRow(relation, vertex_id)
+        del row[bisect_left(row, target_id)]
+        self.version += 1
+
+    def clear(self, relation, vertex_id):
+        '''
+        Remove all the relations of the given kind from the vertex with vertex_id
+        '''
+        if self.rowLength(relation, vertex_id) != 0:
+            self.__overlay[relation][vertex_id] = []
+            self.version += 1
+
+    def compact(self):
+        '''
+        Merge the overlay into the compressed sparse rows, which then cover
+        every registered vertex.
+        '''
+        size = len(self.vertices)
+        for relation in RELATIONS:
+            overlay = self.__overlay[relation]
+            if not overlay and self.compacted_size == size:
+                continue
+            offsets = array('l', [0])
+            targets = array('l')
+            for vertex_id in xrange(size):
+                targets.extend(self.row(relation, vertex_id))
+                offsets.append(len(targets))
+            self.__offsets[relation] = offsets
+            self.__targets[relation] = targets
+            overlay.clear()
+        self.compacted_size = size
+
+    def csr(self, relation):
+        '''
+        Compact the store.
+        :returns: A 2-tuple of the offsets and targets arrays of the relation.
+                  The ids related to the vertex with id v are
+                  targets[offsets[v]:offsets[v + 1]].
+        '''
+        self.compact()
+        return self.__offsets[relation], self.__targets[relation]
+
+    def entryPoints(self, vertex_id):
+        '''
+        :returns: The frozenset of the entry point names of the vertex with vertex_id
+        '''
+        return self.__entry_points.get(vertex_id, NO_ENTRY_POINTS)
+
+    def setEntryPoints(self, vertex_id, names):
+        '''
+        Set the entry point names of the vertex with vertex_id
+        '''
+        names = frozenset(names)
+        shared = self.__name_sets.get(names)
+        if shared is None:
+            shared = self.__name_sets[names] = names
+        if shared:
+            self.__entry_points[vertex_id] = shared
+        else:
+            self.__entry_points.pop(vertex_id, None)
+
+# The store to which vertices are added when they are first connected or tagged
+_current = CfgStore()
+
+def currentStore():
+    '''
+    :returns: The CfgStore of the current compilation
+    '''
+    return _current
+
+def newStore():
+    '''
+    Start the control flow graph of a new compilation, in a new CfgStore. The
+    vertices of earlier graphs remain in their own stores.
+    :returns: The new CfgStore
+    '''
+    global _current
+    _current = CfgStore()
+    return _current
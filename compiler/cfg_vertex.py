@@ -1,65 +1,177 @@
 # Control Flow Graph Node
 
+from cfg_store import (currentStore, NO_ENTRY_POINTS, OUT_EDGES, IN_EDGES, COME_FROM_GOSUB_EDGES,
+                       LOOP_BACK_EDGES, LOOP_FROM_EDGES)
+
+class EdgeSet(object):
+    '''
+    A set-like view of the vertices related to a vertex by one relation, held
+    in the CfgStore of the vertex. Iteration is over a snapshot of the related
+    vertices, in the order of their ids, so the edges may be changed while
+    they are being iterated.
+    '''
+    __slots__ = ('vertex', 'relation')
+
+    def __init__(self, vertex, relation):
+        self.vertex = vertex
+        self.relation = relation
+
+    def __ids(self):
+        graph = self.vertex._CfgVertex__graph
+        if graph is None:
+            return graph, ()
+        return graph, graph.row(self.relation, self.vertex._CfgVertex__id)
+
+    def __iter__(self):
+        graph, ids = self.__ids()
+        if not ids:
+            return iter(())
+        vertices = graph.vertices
+        return iter([vertices[i] for i in ids])
+
+    def __len__(self):
+        graph = self.vertex._CfgVertex__graph
+        if graph is None:
+            return 0
+        return graph.rowLength(self.relation, self.vertex._CfgVertex__id)
+
+    def __contains__(self, other):
+        graph = self.vertex._CfgVertex__graph
+        if graph is None or other._CfgVertex__graph is not graph:
+            return False
+        return graph.contains(self.relation, self.vertex._CfgVertex__id, other._CfgVertex__id)
+
+    def __eq__(self, other):
+        return set(self) == set(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "EdgeSet(%r)" % list(self)
+
+    def add(self, other):
+        graph = self.vertex._register(other)
+        graph.add(self.relation, self.vertex._CfgVertex__id, other._CfgVertex__id)
+
+    def update(self, others):
+        for other in list(others):
+            self.add(other)
+
+    def remove(self, other):
+        if other not in self:
+            raise KeyError(other)
+        graph = self.vertex._CfgVertex__graph
+        graph.remove(self.relation, self.vertex._CfgVertex__id, other._CfgVertex__id)
+
+    def discard(self, other):
+        if other in self:
+            self.remove(other)
+
+    def clear(self):
+        graph = self.vertex._CfgVertex__graph
+        if graph is not None:
+            graph.clear(self.relation, self.vertex._CfgVertex__id)
+
 class CfgVertex(object):
-    __counter = 0
-    
+    '''
+    A vertex of the control flow graph, the edges and entry points of which are
+    held in a CfgStore. A vertex is registered with a store, and given its id,
+    when it is first connected or tagged, or its id is requested, so vertices
+    which take no part in a control flow graph are not held by any store.
+    '''
+    # Classes with __slots__ which derive from CfgVertex must provide these slots
+    vertex_slots = ('_CfgVertex__id', '_CfgVertex__graph', 'block')
+    __slots__ = ()
+
     def __init__(self):
-        self.__in_edges  = set()
-        self.__out_edges = set()
-        self.__come_from_gosub_edges = set()
-        self.__loop_back_edges = set()
-        self.__loop_from_edges = set()
-        self.__entry_points = set()
-        
-        CfgVertex.__counter += 1
-        self.__id = CfgVertex.__counter
-        
+        self.__id = None
+        self.__graph = None
         self.block = None
-        
-    id                 = property(lambda self: self.__id)  
-    inEdges            = property(lambda self: self.__in_edges)
-    outEdges           = property(lambda self: self.__out_edges)
-    comeFromGosubEdges = property(lambda self: self.__come_from_gosub_edges)
-    loopBackEdges      = property(lambda self: self.__loop_back_edges)
-    loopFromEdges      = property(lambda self: self.__loop_from_edges)
-    entryPoints        = property(lambda self: self.__entry_points)
-    
+
+    def _register(self, other=None):
+        '''
+        Register this vertex, and other if given, with the store of whichever
+        of them is registered, or with the current store.
+        :returns: The CfgStore of the vertex
+        '''
+        graph = self.__graph
+        if graph is None:
+            graph = other.__graph if other is not None and other.__graph is not None else currentStore()
+            self.__id = graph.register(self)
+            self.__graph = graph
+        if other is not None and other.__graph is not graph:
+            assert other.__graph is None, "Vertices belong to different control flow graphs"
+            other.__id = graph.register(other)
+            other.__graph = graph
+        return graph
+
+    def __getId(self):
+        if self.__graph is None:
+            self._register()
+        return self.__id
+
+    id                 = property(__getId)
+    graph              = property(lambda self: self.__graph)
+    inEdges            = property(lambda self: EdgeSet(self, IN_EDGES))
+    outEdges           = property(lambda self: EdgeSet(self, OUT_EDGES))
+    comeFromGosubEdges = property(lambda self: EdgeSet(self, COME_FROM_GOSUB_EDGES))
+    loopBackEdges      = property(lambda self: EdgeSet(self, LOOP_BACK_EDGES))
+    loopFromEdges      = property(lambda self: EdgeSet(self, LOOP_FROM_EDGES))
+    entryPoints        = property(lambda self: self.__graph.entryPoints(self.__id)
+                                               if self.__graph is not None else NO_ENTRY_POINTS)
+
     def clearInEdges(self):
-        self.__in_edges = set()
-    
+        self.inEdges.clear()
+
     def clearOutEdges(self):
-        self.__out_edges = set()
-    
+        self.outEdges.clear()
+
     def clearComeFromGosubEdges(self):
-        self.__come_from_gosub_edges = set()
-    
+        self.comeFromGosubEdges.clear()
+
     def clearLoopBackEdges(self):
-        self.__loop_back_edges = set()
-        
+        self.loopBackEdges.clear()
+
     def clearLoopFromEdges(self):
-        self.__loop_from_edges = set()
-    
+        self.loopFromEdges.clear()
+
     def clearEntryPoints(self):
-        self.__entry_points.clear()
-        
+        if self.__graph is not None:
+            self.__graph.setEntryPoints(self.__id, NO_ENTRY_POINTS)
+
     def addInEdge(self, from_vertex):
         self.inEdges.add(from_vertex)
-        
+
     def addOutEdge(self, to_vertex):
         self.outEdges.add(to_vertex)
-        
+
     def addComeFromGosubEdge(self, from_vertex):
         self.comeFromGosubEdges.add(from_vertex)
-    
+
     def addLoopBackEdge(self, to_vertex):
         self.loopBackEdges.add(to_vertex)
-        
+
     def addLoopFromEdge(self, to_vertex):
         self.loopFromEdges.add(to_vertex)
-        
+
     def addEntryPoint(self, name):
-        self.entryPoints.add(name)
-        
-    inDegree  = property(lambda self: len(self.inEdges) + len(self.comeFromGosubEdges) + len(self.loopFromEdges))
-    outDegree = property(lambda self: len(self.outEdges) + len(self.loopBackEdges))
-        
\ No newline at end of file
+        graph = self._register()
+        entry_points = graph.entryPoints(self.__id)
+        if name not in entry_points:
+            graph.setEntryPoints(self.__id, entry_points | frozenset((name,)))
+
+    def removeEntryPoints(self, names):
+        if self.__graph is not None:
+            self.__graph.setEntryPoints(self.__id, self.__graph.entryPoints(self.__id).difference(names))
+
+    def __degree(self, *relations):
+        graph = self.__graph
+        if graph is None:
+            return 0
+        return sum(graph.rowLength(relation, self.__id) for relation in relations)
+
+    inDegree  = property(lambda self: self.__degree(IN_EDGES, COME_FROM_GOSUB_EDGES, LOOP_FROM_EDGES))
+    outDegree = property(lambda self: self.__degree(OUT_EDGES, LOOP_BACK_EDGES))
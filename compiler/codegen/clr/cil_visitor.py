@@ -94,6 +94,9 @@ class CilVisitor(Visitor):
         
         self.__cil_debug = True
         
+        # The symbols of variables and arrays, by symbol table and symbol id
+        self.__symbols = {}
+        
         # Do we allow arrays to be re-DIMed; BBC BASIC does not
         self.__allow_redimension = False 
         
@@ -115,7 +118,11 @@ class CilVisitor(Visitor):
         name = variable.identifier
         logging.debug("identifier = %s", name)
         symbol_node = findNode(variable, hasSymbolTableLookup)
-        symbol = symbol_node.symbolTable.lookup(name)
+        # Each symbol table is only searched once for each identifier
+        key = (symbol_node.symbolTable, variable.symbol_id)
+        symbol = self.__symbols.get(key)
+        if symbol is None:
+            symbol = self.__symbols[key] = symbol_node.symbolTable.lookup(name)
         assert symbol is not None
         return symbol
 
@@ -26,7 +26,6 @@ from emitters import *
 import cts
 from cts import typeof
 from algorithms import representative
-from flow.traversal import depthFirstSearch
 
 # TODO: This block to import OwlRuntime exists in multiple locations
 # Load the OWL Runtime library so we may both call and reference
@@ -66,8 +65,13 @@ def ctsIdentifier(symbol):
 
 
 class AssemblyGenerator(object):
-    def __init__(self, line_mapper):
+    def __init__(self, line_mapper, token_spans=None):
+        '''
+        :param line_mapper: The LineMapper of the program
+        :param token_spans: The TokenSpans of a program parsed with compact positions, or None
+        '''
         self.line_mapper = line_mapper
+        self.token_spans = token_spans
         self.owl_to_clr_method_names = {} # A map of OWL basic names to CLR names
         self.clr_to_owl_method_names = {} # A map of CLR names to OWL basic names
         self.method_builders = {}         # A map of CLR names to MethodBuilders
@@ -463,14 +467,15 @@ class AssemblyGenerator(object):
         # Create the visitor which holds the code generator 
         cv = CilVisitor(self, type_builder, method_builder, self.line_mapper, self.doc)
         
-        # Declare LOCAL variables and attach load and store emitters to the symbols
-        for node in depthFirstSearch(entry_point_node):
-            if isinstance(node, Local):
-                symbol_table = node.symbolTable
-                for symbol in symbol_table.symbols.values():
-                    local_builder = cv.generator.DeclareLocal(cts.symbolType(symbol))
-                    local_builder.SetLocalSymInfo(symbol.name) # Provide symbol name for debugger
-                    self.createAndAttachLocalEmitters(local_builder, symbol)
+        # Declare LOCAL variables and attach load and store emitters to the symbols,
+        # finding the LOCAL statements among the statements of the method's basic blocks
+        for basic_block in basic_blocks:
+            for statement in basic_block.statements:
+                if isinstance(statement, Local):
+                    for symbol in statement.symbolTable.symbols.values():
+                        local_builder = cv.generator.DeclareLocal(cts.symbolType(symbol))
+                        local_builder.SetLocalSymInfo(symbol.name) # Provide symbol name for debugger
+                        self.createAndAttachLocalEmitters(local_builder, symbol)
         
         # TODO: Declare PRIVATE variables and attach load and store emitters to the symbols
         
@@ -483,15 +488,32 @@ class AssemblyGenerator(object):
         # Generate the code for blocks and statements in sequence
         for basic_block in basic_blocks:
             for statement in basic_block.statements:
-                if statement.startLine and statement.startColumn and statement.endLine and statement.endColumn:
-                    cv.generator.MarkSequencePoint(self.doc, statement.startLine, statement.startColumn,
-                                                            statement.endLine,   statement.endColumn)
+                position = self.sourcePosition(statement)
+                if position is not None:
+                    start_line, start_column, end_line, end_column = position
+                    cv.generator.MarkSequencePoint(self.doc, start_line, start_column,
+                                                            end_line,   end_column)
                 cv.checkMark(statement) # TODO: Could push this out a level to be per block
                 cv.visit(statement)
                 assert statement.block.is_label_marked
             self.transferControlToNextBlock(cv.generator, basic_block)
         logging.debug("COMPLETE\n\n\n")
         
+    def sourcePosition(self, statement):
+        '''
+        :returns: A 4-tuple of the one-based start line, start column, end line and
+                  end column of statement, or None if its position is not known
+        '''
+        if self.token_spans is not None:
+            if statement.span is None:
+                return None
+            position = self.token_spans.position(statement.span, self.line_mapper.source_map)
+        else:
+            position = (statement.startLine, statement.startColumn, statement.endLine, statement.endColumn)
+        if all(position):
+            return position
+        return None
+
     def createAndAttachLocalEmitters(self, local_builder, symbol):
         '''
         Generate a two methods for generating CIL to load and store the value of the global variable (field)
@@ -111,7 +111,7 @@ class CorrelationVisitor(Visitor):
             print "id1 = ", id1
             print "id2 = ", id2
             # TODO: Check that the symbols are equal, not just the names
-            if for_stmt.identifier.identifier == next_stmt.identifiers[0].identifier:
+            if for_stmt.identifier.symbol_id == next_stmt.identifiers[0].symbol_id:
                 connectLoop(next_stmt, for_stmt)
                 break    
     
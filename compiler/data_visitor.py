@@ -1,8 +1,11 @@
 import logging
 import re
 from visitor import Visitor
+from pass_fusion import FusiblePass
+from simplify_visitor import SimplificationVisitor
+from syntax.ast import Data, Rem
 
-class DataVisitor(Visitor):
+class DataVisitor(Visitor, FusiblePass):
     '''
     Extra DATA from DATA statements and hidden DATA within REM statements.
     BBC BASIC allows any line to be RESTOREd to and will attempt to READ data
@@ -22,6 +25,8 @@ class DataVisitor(Visitor):
     It is NOT possible to READ into a REMed data block from a previous DATA
     statement; the REMed line must be RESTOREd to directly
     '''
+    requires = (SimplificationVisitor,)
+    
     def __init__(self):
         self.data = []
         self.index = {} # physical 0-based line number -> data[index]
@@ -42,16 +47,21 @@ class DataVisitor(Visitor):
             items.append(item)
         return items
     
-    def visitAstNode(self, node):
-        node.forEachChild(self.visit)
+    def extract(self, node_index):
+        "Extract the DATA of the Data and Rem statements in the NodeIndex, in program order"
+        for statement in node_index.instances(Data, Rem):
+            if isinstance(statement, Data):
+                self.enterData(statement)
+            else:
+                self.enterRem(statement)
     
-    def visitData(self, statement):
+    def enterData(self, statement):
        logging.debug("DATA statement : %s" % statement.data)
        self.index[statement.lineNum] = len(self.data)
        items = self.parse(statement.data)
        self.data.extend(items)
        
-    def visitRem(self, statement):
+    def enterRem(self, statement):
         logging.debug("REM statement : %s" % statement.data)
         # Find the index of the first comma
         comma_index = statement.data.find(',')
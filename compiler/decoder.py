@@ -20,24 +20,74 @@
 #line numbers for bb4w still need testing properly.
 #if input file is plane text it must be terminated by an EOL
 import struct, re, getopt, sys
+from abc import ABCMeta, abstractmethod
 
 # The list of BBC BASIC V tokens:
 # Base tokens, starting at 0x7f
 
 class Decoder(object):
+    """
+    The abstract base of the decoders of each format of program file, which
+    fileType() chooses between. Each decoder supplies the lines of the
+    program through records().
+    """
+    __metaclass__ = ABCMeta
+
+    # True for decoders of tokenised programs, which can also supply the
+    # undetokenised body of each line through rawRecords() and split()
+    tokenised = False
     
     def __init__(self, data):
         self.data = data
         self.lines = []
         
-    #data = property(lambda self: self.__data)
+    @abstractmethod
+    def records(self):
+        """
+        A generator which lazily yields (line number, line body) pairs from
+        the program data, in which the body is plain text. Decoders walk a
+        single offset cursor over self.data, so the data is never re-sliced
+        as decoding proceeds.
+        """
+
+    def decode(self):
+        self.lines = list(self.records())
+        return self.lines
+
+class TokenisedDecoder(Decoder):
+    """
+    The abstract base of the decoders of tokenised programs, which detokenise
+    the body of each line supplied by rawRecords() using the token tables of
+    their format.
+    """
+    tokenised = True
+    tokenTable = None      # The keyword of each token byte
+    extensionTables = None # The table of the tokens following each extension prefix byte
+    special = None         # A pattern matching the bytes which are not plain text
+
+    def records(self):
+        for lineNumber, lineData in self.rawRecords():
+            yield lineNumber, self.detokenise(lineData)
+
+    @abstractmethod
+    def rawRecords(self):
+        """
+        A generator which lazily yields (line number, line body) pairs from
+        the program data, in which the body is still tokenised.
+        """
+
+    def detokenise(self, lineData):
+        return DetokeniseLine(lineData, self.tokenTable, self.extensionTables, self.special)
+
+    def split(self, lineData):
+        return SplitLine(lineData, self.tokenTable, self.extensionTables, self.special)
         
 class PlainTextDecoder(Decoder):
     
     def __init__(self, data):
         super(PlainTextDecoder, self).__init__(data)
         
-    def decode(self):
+    def records(self):
         split_lines = self.data.split(self.lineEnd)
         
         # Remove any trailing empty line
@@ -64,9 +114,7 @@ class PlainTextDecoder(Decoder):
                 
             logical_line_number += 10
                             
-            self.lines.append((line_number, line_body))
-            
-        return self.lines
+            yield line_number, line_body
 
 class PlainTextCrDecoder(PlainTextDecoder):
     lineEnd = '\x0d'
@@ -96,131 +144,67 @@ class PlainTextCrLfDecoder(PlainTextDecoder):
     def __init__(self, data):
         super(PlainTextCrLfDecoder, self).__init__(data)
 
-class BbcBasicAcornDecoder(Decoder):
+class BbcBasicAcornDecoder(TokenisedDecoder):
     lineEnd = '\x0d'
     fileTypeName = 'BBC BASIC (Acorn)'
     
     def __init__(self, data):
         super(BbcBasicAcornDecoder, self).__init__(data)
     
-    def decode(self):
+    def rawRecords(self):
+        #  {<cr> <linehi> <linelo> <len> <text>} <cr> <ff>
+        data = self.data
+        end = len(data)
         lenLineEnd = len(self.lineEnd)
+        offset = 0
         while True:
-            if len(self.data) < 2:
+            if end - offset < 2:
                 raise Exception, "Bad program"
-            if self.data[1] == '\xff':
+            if data[offset + 1] == '\xff':
                 break
-            #  {<cr> <linehi> <linelo> <len> <text>} <cr> <ff>
-            lineNumber=(ord(self.data[2]) + (ord(self.data[1]) * 256))
-            length=ord(self.data[3])
-            lineData = self.data[4:length]
-            self.lines.append([lineNumber, self.detokenise(lineData)])
-            self.data = self.data[length:]
-            if len(self.data) <= len(self.lineEnd):
+            if end - offset < 4:
+                raise Exception, "Bad program"
+            lineNumber = (ord(data[offset + 1]) << 8) | ord(data[offset + 2])
+            length = ord(data[offset + 3])
+            if length < 4:
+                raise Exception, "Bad line length at line %d" % lineNumber
+            yield lineNumber, data[offset + 4:offset + length]
+            offset += length
+            if end - offset <= lenLineEnd:
                 # may need to check what data is in last chars
                 # all tests have been ending tokens/CR/LF
                 break
-        return self.lines
-    
-    def detokenise(self, lineData):
-        # Acorn encoding
-        # This regular expression is essentially:
-        # Match a quoted string OR
-        #
-        # (Optional extension token) followed by
-        # (REM token followed by the rest of the line)
-        #     -- this ensures we don't detokenise the REM statement itself
-        # OR
-        # (Line number following token, with 3 characters in the range 64-127)
-        # OR
-        # (any token)
-        return re.sub(r'"(?:(?:[^"]+|"")*)"(?!")|( ?)([\xc6-\xc8])?(\xf4.*|\x8d[\x40-\x7f]{3}|[\x7f-\xff])',
-                      BbcBasicAcornDecoder.replaceFunc, lineData)
-    
-    @staticmethod
-    def replaceFunc(match):
-        if match.group().startswith('"'):
-            return match.group()
-        else:
-            prefix, ext, token = match.groups()
-            if len(prefix) == 0:
-                prefix = ' '
-            tokenOrd = ord(token[0])
-            if ext: # An extended opcode, CASE/WHILE/SYS etc
-                if ext == '\xc6':
-                    return cfnTokens[tokenOrd-0x8e]
-                if ext == '\xc7':
-                    return comTokens[tokenOrd-0x8e]
-                if ext == '\xc8':
-                    return stmtTokens[tokenOrd-0x8e]
-                raise Exception, "Bad token"
-            else: # Normal token, plus any extra characters
-                if token[0] == '\x8d': # line number following token
-                    #decode the 24 bit line number
-                    return str(DecodeLineNo(token[1:]))
-                else:
-                    return prefix + tokens[tokenOrd - 127] + token[1:]
-
-class BbcBasic8086(Decoder):
+
+class BbcBasic8086Decoder(TokenisedDecoder):
     lineEnd = '\x0d'
     fileTypeName = 'BBC BASIC (80/86)'
     
     def __init__(self, data):
-        super(BbcBasic8086, self).__init__(data)
+        super(BbcBasic8086Decoder, self).__init__(data)
         
-    def decode(self):
+    def rawRecords(self):
         # TODO this needs testing 
         # i have read somewhere that bb4w uses different tokens
         # and also has diff line number formatting
         # (http://bb4w.wikispaces.com/Format)
         # {<len> <linelo> <linehi> <text> <cr>} <00> <ff> <ff>
+        data = self.data
+        end = len(data)
         lenLineEnd = len(self.lineEnd)
-        
-        while True:
-            # TODO check if order of bytes is correct
-            lineNumber=(ord(self.data[1]) + (ord(self.data[2]) * 256)) # line number bytes in different order
-            length=ord(self.data[0])
-            if lineNumber == -1:
+        offset = 0
+        while end - offset >= 3:
+            length = ord(data[offset])
+            if length == 0:
+                # The <00> <ff> <ff> terminator
                 break
-            lineData = self.data[3:length]
-            self.lines.append([lineNumber, self.detokenise(lineData)])
-            self.data = self.data[length:]
-            if len(self.data) <= len(self.lineEnd):
-                # may need to check what data is in last chars
-                # all tests have been ending tokens/CR/LF
-                break
-        return self.lines
-    
-    def detokenise(self, lineData):
-        # This uses BB4W encoding
-        # This regular expression is essentially:
-        # Match a quoted string OR
-        #
-        # (REM token followed by the rest of the line)
-        #     -- this ensures we don't detokenise the REM statement itself
-        # OR
-        # (Line number following token, with 3 characters in the range 64-127)
-        # OR
-        # (any token 127-255)
-        # OR
-        # (any token 0-15) TODO check if 16 is needed (EXIT) i think
-        return re.sub(r'"(?:(?:[^"]+|"")*)"(?!")|( ?)(\xf4.*|\x8d[\x40-\x7f]{3}|[\x7f-\xff]|[\x00-\x0f])',
-                      BbcBasic8086Decoder.replaceFunc, line)
-    
-    @staticmethod
-    def replaceFunc(match):
-        if match.group().startswith('"'):
-            return match.group()
-        else:
-            prefix, token = match.groups()
-            if len(prefix) == 0:
-                prefix = ' '
-            tokenOrd = ord(token[0])
-            if token[0] == '\x8d': # line number following token
-                #decode the 24 bit line number
-                return str(DecodeLineNo(token[1:]))
-            else:
-                return prefix + bb4wTokens[tokenOrd ^ 128] + token[1:]
+            if length < 3 + lenLineEnd:
+                raise Exception, "Bad line length at offset %d" % offset
+            lineNumber = ord(data[offset + 1]) | (ord(data[offset + 2]) << 8)
+            yield lineNumber, data[offset + 3:offset + length - lenLineEnd]
+            offset += length
+
+# Retained for compatibility with earlier releases
+BbcBasic8086 = BbcBasic8086Decoder
 
 def fileType(data):
     '''
@@ -302,6 +286,144 @@ bb4wTokens=["AND","DIV","EOR","MOD","OR","ERROR","LINE","OFF",
         "","CIRCLE","ELLIPSE","FILL","MOUSE","ORIGIN","QUIT","RECTANGLE",
         "SWAP","SYS","TINT","WAIT","INSTALL","","PRIVATE","BY","EXIT"]
 
+def BuildTokenTable(tokenList, firstOrd):
+    """Returns a 256-entry list mapping each byte value to the text of its
+       token, or None.  Tokens are numbered upwards from firstOrd, wrapping
+       around from 0xff to 0x00."""
+    table = [None] * 256
+    for index, text in enumerate(tokenList):
+        table[(firstOrd + index) & 0xff] = text
+    return table
+
+def BuildSpecialPattern(table):
+    """Returns a compiled character class matching a double quote or any
+       byte which has an entry in the token table.  Bytes which do not match
+       are copied to the output unchanged."""
+    special = ['"'] + [re.escape(chr(i)) for i in range(256) if table[i] is not None]
+    return re.compile('[' + ''.join(special) + ']')
+
+acornTokenTable = BuildTokenTable(tokens, 0x7f)
+acornExtensionTables = [None] * 256
+acornExtensionTables[0xc6] = BuildTokenTable(cfnTokens, 0x8e)
+acornExtensionTables[0xc7] = BuildTokenTable(comTokens, 0x8e)
+acornExtensionTables[0xc8] = BuildTokenTable(stmtTokens, 0x8e)
+acornSpecial = BuildSpecialPattern(acornTokenTable)
+
+# The BB4W tokens run from 0x80 up to 0x10, which is EXIT
+bb4wTokenTable = BuildTokenTable(bb4wTokens, 0x80)
+bb4wSpecial = BuildSpecialPattern(bb4wTokenTable)
+
+noExtensionTables = [None] * 256
+
+# Acorn encoding uses the base token table and the tables for the 0xc6 (ESCFN),
+# 0xc7 (ESCCOM) and 0xc8 (ESCSTMT) extension prefixes
+BbcBasicAcornDecoder.tokenTable = acornTokenTable
+BbcBasicAcornDecoder.extensionTables = acornExtensionTables
+BbcBasicAcornDecoder.special = acornSpecial
+
+# BB4W encoding has no extension prefixes
+BbcBasic8086Decoder.tokenTable = bb4wTokenTable
+BbcBasic8086Decoder.extensionTables = noExtensionTables
+BbcBasic8086Decoder.special = bb4wSpecial
+
+def ClosingQuote(lineData, start):
+    """Returns the index of the double quote closing the string which opens
+       at start, or -1 if the string is unterminated.  A pair of double quotes
+       is an escaped quote within the string."""
+    find = lineData.find
+    index = start + 1
+    while True:
+        index = find('"', index)
+        if index == -1:
+            return -1
+        if lineData[index + 1:index + 2] != '"':
+            return index
+        index += 2
+
+# The kinds of piece into which SplitLine divides a tokenised line
+TEXT_PIECE, KEYWORD_PIECE, EXTENSION_PIECE, LINE_NUMBER_PIECE, REM_PIECE = range(5)
+
+def SplitLine(lineData, table, extensionTables, special):
+    """Split the body of a single tokenised line into a list of (kind, text)
+       pairs in one pass.
+
+       TEXT_PIECE text is a run of plain text, including any quoted strings,
+       copied from the line unchanged.  KEYWORD_PIECE and EXTENSION_PIECE text
+       is the keyword for a base or extension token.  LINE_NUMBER_PIECE text
+       is a decoded line number.  REM_PIECE text is the remainder of the line
+       following a REM token, verbatim.  Any single space before a token is
+       dropped from the preceding text."""
+    pieces = []
+    append = pieces.append
+    search = special.search
+    length = len(lineData)
+    start = 0 # Start of the pending run of plain text
+    pos = 0
+    while True:
+        match = search(lineData, pos)
+        if match is None:
+            break
+        index = match.start()
+        char = lineData[index]
+        if char == '"':
+            close = ClosingQuote(lineData, index)
+            # An unterminated quote is just a character
+            pos = close + 1 if close != -1 else index + 1
+            continue
+        end = index
+        if end > start and lineData[end - 1] == ' ':
+            end -= 1
+        if end > start:
+            append((TEXT_PIECE, lineData[start:end]))
+        tokenOrd = ord(char)
+        extensionTable = extensionTables[tokenOrd]
+        if extensionTable is not None and index + 1 < length and table[ord(lineData[index + 1])] is not None:
+            # An extended opcode, CASE/WHILE/SYS etc
+            text = extensionTable[ord(lineData[index + 1])]
+            if text is None:
+                raise Exception, "Bad token"
+            append((EXTENSION_PIECE, text))
+            pos = index + 2
+        elif char == '\x8d' and index + 3 < length and IsEncodedLineNo(lineData, index + 1):
+            # decode the 24 bit line number
+            append((LINE_NUMBER_PIECE, str(DecodeLineNo(lineData[index + 1:index + 4]))))
+            pos = index + 4
+        elif char == '\xf4':
+            # REM - the remainder of the line is not detokenised
+            pos = lineData.find('\n', index)
+            if pos == -1:
+                pos = length
+            append((REM_PIECE, lineData[index + 1:pos]))
+        else:
+            text = table[tokenOrd]
+            if text is None:
+                raise Exception, "Bad token"
+            append((KEYWORD_PIECE, text))
+            pos = index + 1
+        start = pos
+    if start < length:
+        append((TEXT_PIECE, lineData[start:]))
+    return pieces
+
+def DetokeniseLine(lineData, table, extensionTables, special):
+    """Detokenise the body of a single line, from the pieces of SplitLine.
+
+       Runs of plain text, and quoted strings, are copied to the output
+       unchanged.  Each token replaces any single space before it, and is
+       itself preceded by one space - except for extension tokens and
+       line numbers, which are not.  The REM token is followed by the rest of
+       the line, verbatim."""
+    prefixes = ('', ' ', '', '', ' ' + table[0xf4]) # By kind of piece
+    return ''.join([prefixes[kind] + text
+                    for kind, text in SplitLine(lineData, table, extensionTables, special)])
+
+def IsEncodedLineNo(lineData, index):
+    """True if the three bytes at index are an encoded line number."""
+    for char in lineData[index:index + 3]:
+        if not '\x40' <= char <= '\x7f':
+            return False
+    return True
+
 def DecodeLineNo(lineNo):
     """Returns a line number from a 24bit encoded line number"""
     byte0=ord(lineNo[0])
@@ -319,10 +441,15 @@ def ReadLines(data):
     decoder = fileType(data)
     lines = decoder.decode()
     return lines
+
+def IterLines(data):
+    """Lazily yields (line number, detokenised line) pairs from a binary
+       BBC BASIC format file, in linear time."""
+    return fileType(data).records()
     
 def decode(data, output):
     """Decode binary data 'data' and write the result to 'output'."""
-    lines = ReadLines(data)
+    lines = IterLines(data)
     for lineNumber, lineData in lines:
         output.write(str(lineNumber) + ' ')
         # Normalise line endings to \n
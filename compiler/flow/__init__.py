@@ -8,10 +8,17 @@ from longjump_converter import convertLongjumpsToExceptions
 from subroutine_converter import convertSubroutinesToProcedures
 from basic_block_identifier import identifyBasicBlocks
 from basic_block_orderer import orderBasicBlocks
+from dominators import dominatorTree, postDominatorTree
+from loop_forest import findLoops
+from dead_code_eliminator import eliminateDeadCode
 
 __all__ = ["locateEntryPoints",
            "createForwardControlFlowGraph",
            "convertLongjumpsToExceptions",
            "convertSubroutinesToProcedures",
-           "identifyBasicBlocks"]
+           "identifyBasicBlocks",
+           "dominatorTree",
+           "postDominatorTree",
+           "findLoops",
+           "eliminateDeadCode"]
 
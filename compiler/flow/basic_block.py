@@ -20,6 +20,9 @@ class BasicBlock(CfgVertex):
         self.topological_order = None # Integer giving ordinal position in method
         self.label = None # A label into which can be branched to, to enter this basic block
         self.is_label_marked = False # A flag for whether the label has been marked
+        self.dominator_trees = {} # Trees rooted at this block, keyed by whether they are post-dominator trees
+        self.loop = None # The innermost Loop containing this block
+        self.loop_depth = 0 # The number of loops containing this block
         
     ''' The first statement in the BasicBlock, or None'''
     entryPoint = property(lambda self: self.statements[0] if len(self.statements) > 0 else None)
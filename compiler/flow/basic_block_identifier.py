@@ -6,7 +6,7 @@ logger = logging.getLogger('flow.basic_block_identifier')
 logger.setLevel(logging.WARNING)
 
 from connectors import connect
-from traversal import depthFirstSearch
+from traversal import depthFirstEvents, ENTER
 from basic_block import BasicBlock
 
 def identifyBasicBlocks(entry_points, options):
@@ -43,24 +43,18 @@ def coarsenControlFlowGraph(entry_point):
     :returns: The entry block BasicBlock instance corresponding to entry_point
     '''
     logger.debug("entry_point = %s", entry_point)
-    block = assignBlockAndContinue(entry_point)
-    return block
-
-# TODO: Decorate as a tail-call    
-def assignBlockAndContinue(vertex, block=None):
-    '''
-    Assign vertex to block and continue with successor vertices
-    '''
-    if not vertex.block:           
-        block = ((vertex.inDegree == 1) and block) or BasicBlock()
-        block.statements.append(vertex)
-        vertex.block = block
-        logger.debug("%s with in-degree %s and out-degree %s at %s in %s", vertex, str(vertex.inDegree), str(vertex.outDegree), str(vertex.lineNum), vertex.block)
-        for target in vertex.outEdges:
-            successor_block = assignBlockAndContinue(target, block if vertex.outDegree == 1 else None)
-            if block is not successor_block:
-                connect(block, successor_block)             
-    return vertex.block
-           
-    
-        
\ No newline at end of file
+    unassigned = lambda vertex: not vertex.block
+    for event, vertex, predecessor in depthFirstEvents(entry_point, enter=unassigned):
+        if event is ENTER:
+            # Continue the block of the predecessor if it has a single successor and
+            # this vertex has a single predecessor, otherwise start a new block
+            if predecessor is not None and vertex.inDegree == 1 and predecessor.outDegree == 1:
+                block = predecessor.block
+            else:
+                block = BasicBlock()
+            block.statements.append(vertex)
+            vertex.block = block
+            logger.debug("%s with in-degree %s and out-degree %s at %s in %s", vertex, str(vertex.inDegree), str(vertex.outDegree), str(vertex.lineNum), vertex.block)
+        elif predecessor is not None and predecessor.block is not vertex.block:
+            connect(predecessor.block, vertex.block)
+    return entry_point.block
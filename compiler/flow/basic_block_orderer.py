@@ -6,7 +6,8 @@ Created on 9 Feb 2010
 import logging
 logger = logging.getLogger('flow.basic_block_orderer')
 
-from traversal import approximateTopologicalOrder
+from traversal import depthFirstEvents, EXIT
+from loop_forest import Loop, findLoops, blockSuccessors
 
 def orderBasicBlocks(basic_blocks, options):
     '''
@@ -14,16 +15,105 @@ def orderBasicBlocks(basic_blocks, options):
                          flow enters the graph of each program, function or procedure. The keys are
                          the entry point names.
     :param options: Command line options
-    :returns: A dictionary of lists of basic blocks in approximate topological order. Keys are entry_point names
+    :returns: A dictionary of lists of basic blocks in approximate topological order, in which the
+              blocks of each loop are contiguous. Keys are entry_point names
     '''
     ordered_blocks = {}
     for name, basic_block in basic_blocks.items():
         logger.debug(name)
-        order = approximateTopologicalOrder(basic_block)
+        order = layoutBlocks(findLoops(basic_block))
         print "order = ", order
         for i, block in enumerate(order):
             block.topological_order = i
         ordered_blocks[name] = order
     return ordered_blocks
 
-        
\ No newline at end of file
+def layoutBlocks(forest):
+    '''
+    Lay out the blocks of a loop nesting forest so the blocks of each loop are
+    contiguous, and each block is followed by one of its successors wherever
+    possible, so control can fall through to it. Within each loop the blocks,
+    and the nested loops, are placed in reverse postorder from the header.
+    Where it avoids a branch on every iteration, a loop is rotated to place
+    its header after the block which branches back to it.
+    :param forest: The LoopNestingForest of the blocks reachable from an entry block
+    :returns: A list of the blocks, beginning with the entry block
+    '''
+    entry_block = forest.root.header
+    layouts = {}
+    exits = {}
+    # Lay out each loop after the loops nested within it, and the root last
+    for loop in reversed([forest.root] + forest.loops):
+        order, exits[loop] = regionOrder(loop, exits)
+        layout = []
+        for member in order:
+            if isinstance(member, Loop):
+                layout.extend(layouts.pop(member))
+                del exits[member]
+            else:
+                layout.append(member)
+        if loop.header is not entry_block and isRotatable(loop, layout):
+            layout.append(layout.pop(0))
+        layouts[loop] = layout
+    return layouts[forest.root]
+
+def memberOf(block, loop):
+    '''
+    :returns: block if it is in loop but no nested loop, the loop nested
+              immediately within loop which contains block, or None if block
+              is not within loop.
+    '''
+    inner = block.loop
+    if inner is loop:
+        return block
+    while inner is not None and inner.parent is not loop:
+        inner = inner.parent
+    return inner
+
+def regionOrder(loop, exits):
+    '''
+    Order the blocks of loop which are in no nested loop, and the loops nested
+    immediately within it, in reverse postorder of the edges between them, from
+    the header, ignoring the edges back to the header. The first successor of
+    each is searched last, so it follows if it is not reached by another path.
+    :param exits: A dictionary of the blocks outside each nested loop which are
+                  successors of its blocks
+    :returns: A 2-tuple of the ordered list, and a list of the blocks outside
+              loop which are successors of its blocks
+    '''
+    start = memberOf(loop.header, loop)
+    successors = {}
+    loop_exits = []
+    outside = set()
+    for member in loop.blocks + loop.children:
+        targets = []
+        for successor in exits[member] if isinstance(member, Loop) else blockSuccessors(member):
+            target = memberOf(successor, loop)
+            if target is None:
+                if successor not in outside:
+                    outside.add(successor)
+                    loop_exits.append(successor)
+            elif target is not member and target is not start and target not in targets:
+                targets.append(target)
+        targets.reverse()
+        successors[member] = targets
+    order = [member for event, member, predecessor in depthFirstEvents(start, successors.__getitem__)
+             if event is EXIT]
+    order.reverse()
+    # Members of irreducible loops may only be reached through the header
+    if len(order) != len(successors):
+        reached = set(order)
+        order.extend(member for member in loop.blocks + loop.children if member not in reached)
+    return order, loop_exits
+
+def isRotatable(loop, layout):
+    '''
+    :returns: True if the header of loop, which is first in layout, branches
+              out of the loop, and the last block of layout branches back to it,
+              so moving the header to the end allows the last block to fall
+              through to it on every iteration.
+    '''
+    header = layout[0]
+    return (not loop.is_root and len(layout) > 1 and header is loop.header
+            and header in layout[-1].outEdges
+            and any(successor not in loop for successor in header.outEdges))
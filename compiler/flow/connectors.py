@@ -16,4 +16,24 @@ def connect(from_statement, to_statement):
 def connectLoop(from_statement, to_statement):
     from_statement.addLoopBackEdge(to_statement)
     to_statement.addLoopFromEdge(from_statement)
+
+def disconnect(statement):
+    '''
+    Remove statement from the control flow graph, removing its edges in both
+    directions, and its entry point tags.
+    '''
+    for successor in statement.outEdges:
+        successor.inEdges.discard(statement)
+    for predecessor in statement.inEdges:
+        predecessor.outEdges.discard(statement)
+    for target in statement.loopBackEdges:
+        target.loopFromEdges.discard(statement)
+    for source in statement.loopFromEdges:
+        source.loopBackEdges.discard(statement)
+    statement.clearOutEdges()
+    statement.clearInEdges()
+    statement.clearLoopBackEdges()
+    statement.clearLoopFromEdges()
+    statement.clearComeFromGosubEdges()
+    statement.clearEntryPoints()
     
\ No newline at end of file
@@ -1,11 +1,13 @@
 from visitor import Visitor
-from ast_utils import replaceStatement
-from syntax.ast import LiteralInteger, CallProcedure, ReturnFromProcedure
+from ast_utils import replaceStatement, nodeIndexOf
+from syntax.ast import LiteralInteger, CallProcedure, Return, ReturnFromProcedure
 import errors
 
 class ConvertSubVisitor(Visitor):
     """
-    Replaces RETURN with ENDPROC
+    Replaces RETURN with ENDPROC, and GOSUB with a procedure call. Only the
+    Gosub and Return statements need be visited, which are found from the
+    node index by convertSubroutinesToProcedures.
     """
     
     def __init__(self):
@@ -25,4 +27,7 @@ class ConvertSubVisitor(Visitor):
     def visitReturn(self, ret):
         # Convert each RETURN to an ENDPROC by changing the class
         ret.__class__ = ReturnFromProcedure
+        node_index = nodeIndexOf(ret)
+        if node_index is not None:
+            node_index.retype(ret, Return)
         
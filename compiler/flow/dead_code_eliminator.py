@@ -0,0 +1,134 @@
+'''
+Elimination of unreachable code, and of the procedures and functions which are
+never called, so that neither is type checked nor has code generated for it.
+'''
+
+import sys
+import logging
+
+from syntax.ast import AstStatement, CallProcedure, UserFunc, EvalFunc, LoadLibrary, Install
+from ast_utils import findNode, removeStatements
+from node_index import nodeIndex, subtree
+from connectors import disconnect
+from traversal import depthFirstEvents, ENTER
+
+logger = logging.getLogger('flow.dead_code_eliminator')
+
+MAIN_ENTRY_POINT = '__owl__main'
+
+def eliminateDeadCode(parse_tree, entry_points, options):
+    '''
+    Trace the control flow graph from the main entry point of the program, and
+    from the entry point of each procedure or function called by a statement
+    which has been reached, and remove the statements which were not reached
+    from the control flow graph and the AST. Entry points which were not reached
+    are removed from entry_points. Procedures and functions may also be called
+    by name at run time, by EVAL or from a library loaded with LIBRARY or
+    INSTALL, so if the program uses any of these every entry point is kept.
+    :param parse_tree: The root AstNode of an abstract syntax tree representing the program.
+    :param entry_points: A dictionary of entry point names to entry point AstStatement nodes.
+    :param options: Command line options.
+    :returns: A 2-tuple of the number of AST nodes removed, and the number of
+              procedures and functions removed.
+    '''
+    logger.info("Eliminating dead code")
+    if options.verbose:
+        sys.stderr.write("Eliminating unreachable code and unused procedures and functions... ")
+
+    index = nodeIndex(parse_tree)
+    live, reached = reachableStatements(entry_points, rootEntryPoints(entry_points, index),
+                                        callGraph(index))
+    dead_entry_points = [name for name in entry_points if name not in reached]
+    for name in dead_entry_points:
+        del entry_points[name]
+
+    # Statements which are not held in statement lists, such as Channel, are not
+    # part of the control flow graph
+    dead = [statement for statement in index.instances(AstStatement)
+            if statement.parent_index is not None and statement not in live]
+    for statement in dead:
+        disconnect(statement)
+    removable = removableStatements(dead, live)
+    removed = [statement for statement in removable if not hasRemovableAncestor(statement, removable)]
+    node_count = sum(len(subtree(statement)) for statement in removed)
+    removeStatements(removed)
+
+    logger.info("Removed %d nodes of %d unreachable statements, and %d procedures and functions",
+                node_count, len(dead), len(dead_entry_points))
+    if options.verbose:
+        sys.stderr.write("removed %d nodes and %d methods\n" % (node_count, len(dead_entry_points)))
+    return node_count, len(dead_entry_points)
+
+def callGraph(index):
+    '''
+    :param index: The NodeIndex of the program
+    :returns: A dictionary of the names of the procedures and functions called
+              by each statement which calls any.
+    '''
+    calls = {}
+    for call in index.instances(CallProcedure, UserFunc):
+        statement = findNode(call, lambda node: isinstance(node, AstStatement))
+        if statement is not None:
+            calls.setdefault(statement, []).append(call.name)
+    return calls
+
+def rootEntryPoints(entry_points, index):
+    '''
+    :param entry_points: A dictionary of entry point names to entry point AstStatement nodes.
+    :param index: The NodeIndex of the program
+    :returns: A list of the names of the entry points from which the program is
+              traced: the main entry point, or every entry point if there is no
+              main entry point, or if procedures and functions may be called by
+              name at run time.
+    '''
+    if MAIN_ENTRY_POINT not in entry_points or index.instances(EvalFunc, LoadLibrary, Install):
+        return entry_points.keys()
+    return [MAIN_ENTRY_POINT]
+
+def reachableStatements(entry_points, roots, calls):
+    '''
+    :param entry_points: A dictionary of entry point names to entry point AstStatement nodes.
+    :param roots: The names of the entry points from which to trace the program
+    :param calls: A dictionary of the names of the procedures and functions called by statements
+    :returns: A 2-tuple of the set of statements reached, and the set of names of the entry
+              points reached, from the roots.
+    '''
+    live = set()
+    reached = set(roots)
+    pending = list(roots)
+    unreached = lambda vertex: vertex not in live
+    while pending:
+        name = pending.pop()
+        for event, statement, predecessor in depthFirstEvents(entry_points[name], enter=unreached):
+            if event is ENTER:
+                live.add(statement)
+                for callee in calls.get(statement, ()):
+                    if callee in entry_points and callee not in reached:
+                        reached.add(callee)
+                        pending.append(callee)
+    return live, reached
+
+def removableStatements(dead, live):
+    '''
+    :returns: The set of the dead statements which hold no live statement. An
+              unreachable IF..ENDIF may hold a line which is the target of a GOTO.
+    '''
+    holding_live = set()
+    for statement in live:
+        node = statement.parent
+        while node is not None and node not in holding_live:
+            holding_live.add(node)
+            node = node.parent
+    return set(statement for statement in dead if statement not in holding_live)
+
+def hasRemovableAncestor(statement, removable):
+    '''
+    :returns: True if statement is held by a removable statement, and so is
+              removed with it.
+    '''
+    node = statement.parent
+    while node is not None:
+        if node in removable:
+            return True
+        node = node.parent
+    return False
@@ -0,0 +1,223 @@
+'''
+Dominator and post-dominator trees, and dominance frontiers, of the graph of
+basic blocks reachable from an entry block.
+
+The trees are computed by the iterative algorithm of Cooper, Harvey and
+Kennedy, "A Simple, Fast Dominance Algorithm", over the blocks numbered in
+reverse postorder. Post-dominators are computed in the same way over the
+reversed graph, from a virtual exit which is the successor of every block
+without successors.
+
+The trees of each entry block are cached on it, and recomputed when they are
+next requested after the edges of the control flow graph have changed.
+'''
+
+import logging
+from array import array
+
+from traversal import depthFirstEvents, depthFirstSearch, EXIT
+
+logger = logging.getLogger('flow.dominators')
+
+# The number of the root of a tree, and of a block without an immediate dominator
+ROOT = 0
+UNDEFINED = -1
+
+# The root of a post-dominator tree, which is not a block
+VIRTUAL_EXIT = None
+
+class DominatorTree(object):
+    '''
+    The dominator tree, or post-dominator tree, of the blocks reachable from
+    an entry block. A block dominates another if every path from the entry
+    block to the other passes through it, and post-dominates another if every
+    path from the other to an exit passes through it. Blocks from which no exit
+    can be reached are not in the post-dominator tree.
+    '''
+    def __init__(self, entry_block, post=False):
+        '''
+        :param entry_block: The BasicBlock through which control flow enters the graph
+        :param post: True for the post-dominator tree, rooted at the virtual exit
+        '''
+        self.entry_block = entry_block
+        self.post = post
+        self.graph = entry_block.graph
+        self.version = graphVersion(entry_block)
+
+        if post:
+            region = list(depthFirstSearch(entry_block))
+            members = set(region)
+            exits = [block for block in region if len(block.outEdges) == 0]
+            successors = lambda block: exits if block is VIRTUAL_EXIT else [p for p in block.inEdges if p in members]
+            predecessors = lambda block: list(block.outEdges) or [VIRTUAL_EXIT]
+            root = VIRTUAL_EXIT
+        else:
+            successors = lambda block: block.outEdges
+            predecessors = lambda block: block.inEdges
+            root = entry_block
+
+        # Number the blocks in reverse postorder, so each block is numbered
+        # after its immediate dominator
+        order = [v for event, v, predecessor in depthFirstEvents(root, successors) if event is EXIT]
+        order.reverse()
+        self.nodes = order
+        self.numbers = dict((node, number) for number, node in enumerate(order))
+        self.predecessors = [[self.numbers[p] for p in predecessors(node) if p in self.numbers]
+                             if node is not VIRTUAL_EXIT else [] for node in order]
+        self.idom = self.immediateDominators()
+        self.children = [[] for node in order]
+        for number in xrange(1, len(order)):
+            self.children[self.idom[number]].append(number)
+        self.numberTree()
+        self.frontiers = None
+
+    def immediateDominators(self):
+        '''
+        :returns: An array of the number of the immediate dominator of each block,
+                  by number, in which the root is its own immediate dominator.
+        '''
+        idom = array('l', [UNDEFINED]) * len(self.nodes)
+        idom[ROOT] = ROOT
+
+        def intersect(finger1, finger2):
+            while finger1 != finger2:
+                while finger1 > finger2:
+                    finger1 = idom[finger1]
+                while finger2 > finger1:
+                    finger2 = idom[finger2]
+            return finger1
+
+        changed = True
+        while changed:
+            changed = False
+            for number in xrange(1, len(self.nodes)):
+                new_idom = UNDEFINED
+                for predecessor in self.predecessors[number]:
+                    if idom[predecessor] != UNDEFINED:
+                        new_idom = predecessor if new_idom == UNDEFINED else intersect(predecessor, new_idom)
+                if idom[number] != new_idom:
+                    idom[number] = new_idom
+                    changed = True
+        return idom
+
+    def numberTree(self):
+        '''
+        Number the tree on entry to and exit from each block in a depth first
+        traversal, so dominance can be tested by comparing the numbers.
+        '''
+        self.entered = array('l', [0]) * len(self.nodes)
+        self.exited = array('l', [0]) * len(self.nodes)
+        counter = 0
+        for event, number, parent in depthFirstEvents(ROOT, lambda number: self.children[number]):
+            if event is EXIT:
+                self.exited[number] = counter
+            else:
+                self.entered[number] = counter
+            counter += 1
+
+    def isCurrent(self):
+        '''
+        :returns: True if the control flow graph has not changed since the tree was computed
+        '''
+        return self.graph is self.entry_block.graph and self.version == graphVersion(self.entry_block)
+
+    @property
+    def blocks(self):
+        '''
+        The blocks of the tree, in reverse postorder of the graph
+        '''
+        return [node for node in self.nodes if node is not VIRTUAL_EXIT]
+
+    def __contains__(self, block):
+        return block is not VIRTUAL_EXIT and block in self.numbers
+
+    def immediateDominator(self, block):
+        '''
+        :returns: The immediate dominator of block, or None if block is the
+                  entry block, or is immediately post-dominated by the virtual exit.
+        :raises KeyError: If block is not in the tree
+        '''
+        number = self.numbers[block]
+        return self.nodes[self.idom[number]] if number != ROOT else None
+
+    def dominated(self, block):
+        '''
+        :returns: A list of the blocks immediately dominated by block
+        '''
+        return [self.nodes[number] for number in self.children[self.numbers[block]]]
+
+    def dominates(self, block, other):
+        '''
+        :returns: True if block dominates other. Each block dominates itself.
+        '''
+        number, other_number = self.numbers[block], self.numbers[other]
+        return (self.entered[number] <= self.entered[other_number]
+                and self.exited[other_number] <= self.exited[number])
+
+    def strictlyDominates(self, block, other):
+        return block is not other and self.dominates(block, other)
+
+    def frontier(self, block):
+        '''
+        :returns: A list of the blocks in the dominance frontier of block, in
+                  reverse postorder. These are the blocks which block does not
+                  strictly dominate, but which have a predecessor which block
+                  dominates. The post-dominance frontier of a block is the set
+                  of blocks on which it is control dependent.
+        '''
+        if self.frontiers is None:
+            self.frontiers = self.dominanceFrontiers()
+        return [self.nodes[number] for number in self.frontiers[self.numbers[block]]]
+
+    def dominanceFrontiers(self):
+        '''
+        :returns: A list of the sorted numbers of the blocks in the dominance
+                  frontier of each block, by number.
+        '''
+        frontiers = [set() for node in self.nodes]
+        for number, predecessors in enumerate(self.predecessors):
+            # The root is also entered from outside the graph, and is in the
+            # frontier of every block on a path back to it, including itself
+            if number == ROOT:
+                for runner in predecessors:
+                    frontiers[runner].add(ROOT)
+                    while runner != ROOT:
+                        runner = self.idom[runner]
+                        frontiers[runner].add(ROOT)
+            elif len(predecessors) >= 2:
+                for runner in predecessors:
+                    while runner != self.idom[number]:
+                        frontiers[runner].add(number)
+                        runner = self.idom[runner]
+        return [sorted(frontier) for frontier in frontiers]
+
+def graphVersion(block):
+    '''
+    :returns: The version of the store holding the edges of block, or None
+              if block has no edges.
+    '''
+    return block.graph.version if block.graph is not None else None
+
+def cachedTree(entry_block, post):
+    trees = entry_block.dominator_trees
+    tree = trees.get(post)
+    if tree is None or not tree.isCurrent():
+        logger.debug("Computing %s tree of %s", "post-dominator" if post else "dominator", entry_block)
+        tree = trees[post] = DominatorTree(entry_block, post)
+    return tree
+
+def dominatorTree(entry_block):
+    '''
+    :param entry_block: The BasicBlock through which control flow enters a program,
+                        procedure or function, as returned by identifyBasicBlocks
+    :returns: The DominatorTree of the blocks reachable from entry_block
+    '''
+    return cachedTree(entry_block, False)
+
+def postDominatorTree(entry_block):
+    '''
+    :param entry_block: The BasicBlock through which control flow enters a program,
+                        procedure or function, as returned by identifyBasicBlocks
+    :returns: The post-dominator DominatorTree of the blocks reachable from entry_block
+    '''
+    return cachedTree(entry_block, True)
@@ -1,12 +1,18 @@
 # Functions for analysing the CFG graph
 
 import syntax.ast
+from traversal import depthFirstEvents, ENTER
 
 
 def tagNode(tag, node):
-    if tag not in node.entryPoints:
-        node.addEntryPoint(tag)
-        tagFollowingStatements(node, tag)
+    """
+    Tag node, and all the statements reachable from it which do not already
+    have the tag, with tag
+    """
+    untagged = lambda vertex: tag not in vertex.entryPoints
+    for event, vertex, predecessor in depthFirstEvents(node, enter=untagged):
+        if event is ENTER:
+            vertex.addEntryPoint(tag)
 
 def tagSuccessors(entry_point, line_mapper):
     """
@@ -44,13 +50,19 @@ def deTagSuccessors(node):
     """
     tags = node.entryPoints
     if tags is not None:
-        deTagFollowingStatements(node, tags)
+        # Copy the tags, which are removed from node itself if it can be reached
+        deTagFollowingStatements(node, frozenset(tags))
     
 def deTagFollowingStatements(node, tags):
     for successor in node.outEdges:
         deTagNode(tags, successor)
         
 def deTagNode(tags, node):
-    if tags.issubset(node.entryPoints):
-        node.entryPoints.difference_update(tags)
-        deTagFollowingStatements(node, tags)
\ No newline at end of file
+    """
+    Remove tags from node, and from all the statements reachable from it
+    through statements which have all the tags
+    """
+    tagged = lambda vertex: tags.issubset(vertex.entryPoints)
+    for event, vertex, predecessor in depthFirstEvents(node, enter=tagged):
+        if event is ENTER:
+            vertex.removeEntryPoints(tags)
@@ -4,6 +4,8 @@ Creation of the forward control flow graph
 
 import logging
 
+from ast_utils import indexSuccessors
+from cfg_store import newStore
 from flowgraph_visitor import FlowgraphForwardVisitor
 
 logger = logging.getLogger('flow.flow_graph_creator')
@@ -11,4 +13,7 @@ logger = logging.getLogger('flow.flow_graph_creator')
 def createForwardControlFlowGraph(parse_tree, line_mapper, options):
     logger.debug("flowgraph")
     logger.info("Creating Control Flow Graph...")
+    indexSuccessors(parse_tree)
+    graph = newStore()
     parse_tree.accept(FlowgraphForwardVisitor(line_mapper))
+    graph.compact()
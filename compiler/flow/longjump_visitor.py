@@ -2,7 +2,6 @@
 
 from visitor import Visitor
 import errors
-from utility import underscoresToCamelCase
 from syntax.ast import Goto, LongJump
 from ast_utils import elideNode
 import flow_analysis
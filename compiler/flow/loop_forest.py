@@ -0,0 +1,193 @@
+'''
+The loop nesting forest of the graph of basic blocks reachable from an entry
+block, found by Havlak's algorithm, "Nesting of Reducible and Irreducible
+Loops", which finds both natural loops and irreducible regions with more than
+one entry. Loops are found whether they are built with GOTO or are FOR..NEXT,
+REPEAT..UNTIL or WHILE..ENDWHILE loops, the loop back edges of which are
+included as edges between the blocks of their closing and opening statements.
+
+Each block is annotated with the innermost Loop containing it, and its loop
+depth, which is zero for blocks in no loop.
+'''
+
+import logging
+
+from traversal import depthFirstEvents, ENTER, EXIT
+
+logger = logging.getLogger('flow.loop_forest')
+
+# The kinds of block in Havlak's algorithm
+NONHEADER = 'nonheader'
+REDUCIBLE = 'reducible'
+SELF = 'self'
+IRREDUCIBLE = 'irreducible'
+
+class Loop(object):
+    '''
+    A loop, or the root of a loop nesting forest, which contains the blocks in
+    no loop, and the outermost loops.
+    '''
+    def __init__(self, header, parent=None, reducible=True):
+        '''
+        :param header: The first block of the loop to be reached from the entry block
+        :param parent: The Loop immediately containing this loop
+        :param reducible: False if the loop can be entered other than through its header
+        '''
+        self.header = header
+        self.parent = parent
+        self.reducible = reducible
+        self.blocks = [header] # The blocks of the loop which are not in nested loops
+        self.children = []     # The loops nested immediately within the loop
+        self.depth = 0
+
+    is_root = property(lambda self: self.parent is None)
+
+    def __contains__(self, block):
+        '''
+        :returns: True if block is in this loop or a nested loop
+        '''
+        loop = block.loop
+        while loop is not None:
+            if loop is self:
+                return True
+            loop = loop.parent
+        return False
+
+    def allBlocks(self):
+        '''
+        :returns: A list of the blocks of the loop and of its nested loops
+        '''
+        blocks = []
+        pending = [self]
+        while pending:
+            loop = pending.pop()
+            blocks.extend(loop.blocks)
+            pending.extend(loop.children)
+        return blocks
+
+class LoopNestingForest(object):
+    '''
+    The loops of the graph of basic blocks reachable from an entry block.
+    '''
+    def __init__(self, root, loops):
+        '''
+        :param root: The root Loop, headed by the entry block
+        :param loops: The loops, outermost first
+        '''
+        self.root = root
+        self.loops = loops
+
+def blockSuccessors(block):
+    '''
+    :returns: A list of the successors of block, including the blocks of the
+              statements to which its statements loop back.
+    '''
+    successors = list(block.outEdges)
+    for statement in block.statements:
+        for target in statement.loopBackEdges:
+            if target.block is not None and target.block not in successors:
+                successors.append(target.block)
+    return successors
+
+def findLoops(entry_block):
+    '''
+    Find the loops of the graph of blocks reachable from entry_block, and
+    annotate each block with its loop and loop_depth.
+    :param entry_block: The BasicBlock through which control flow enters a program,
+                        procedure or function, as returned by identifyBasicBlocks
+    :returns: A LoopNestingForest
+    '''
+    # Number the blocks in depth first preorder, noting the last descendant of each
+    nodes = []
+    numbers = {}
+    last = []
+    predecessors = []
+    for event, block, predecessor in depthFirstEvents(entry_block, blockSuccessors):
+        if event is ENTER:
+            numbers[block] = len(nodes)
+            nodes.append(block)
+            last.append(None)
+            predecessors.append([])
+        elif event is EXIT:
+            last[numbers[block]] = len(nodes) - 1
+        if event is not EXIT and predecessor is not None:
+            predecessors[numbers[block]].append(numbers[predecessor])
+
+    isAncestor = lambda w, v: w <= v <= last[w]
+
+    back_predecessors = [[] for node in nodes]
+    non_back_predecessors = [set() for node in nodes]
+    for w, node_predecessors in enumerate(predecessors):
+        for v in node_predecessors:
+            if isAncestor(w, v):
+                back_predecessors[w].append(v)
+            else:
+                non_back_predecessors[w].add(v)
+
+    union_find = range(len(nodes))
+    def find(x):
+        root = x
+        while union_find[root] != root:
+            root = union_find[root]
+        while union_find[x] != root:
+            union_find[x], x = root, union_find[x]
+        return root
+
+    kinds = [NONHEADER] * len(nodes)
+    loops = [None] * len(nodes)
+    found = []
+    for w in reversed(xrange(len(nodes))):
+        body = [] # The blocks and loop headers of the loop headed by w, in order
+        in_body = set()
+        for v in back_predecessors[w]:
+            if v == w:
+                kinds[w] = SELF
+            else:
+                v = find(v)
+                if v not in in_body:
+                    body.append(v)
+                    in_body.add(v)
+        if body:
+            kinds[w] = REDUCIBLE
+        worklist = list(body)
+        while worklist:
+            x = worklist.pop()
+            for y in list(non_back_predecessors[x]):
+                y = find(y)
+                if not isAncestor(w, y):
+                    # The loop is entered other than through w
+                    kinds[w] = IRREDUCIBLE
+                    non_back_predecessors[w].add(y)
+                elif y != w and y not in in_body:
+                    body.append(y)
+                    in_body.add(y)
+                    worklist.append(y)
+        if body or kinds[w] == SELF:
+            loop = loops[w] = Loop(nodes[w], reducible=kinds[w] != IRREDUCIBLE)
+            found.append(loop)
+            for x in body:
+                union_find[x] = w
+                if loops[x] is not None:
+                    loops[x].parent = loop
+                    loop.children.append(loops[x])
+                else:
+                    loop.blocks.append(nodes[x])
+
+    # The outermost loops were found last
+    found.reverse()
+    root = Loop(entry_block)
+    root.blocks = []
+    for number, node in enumerate(nodes):
+        if find(number) == number and loops[number] is None:
+            root.blocks.append(node)
+    for loop in found:
+        if loop.parent is None:
+            loop.parent = root
+            root.children.append(loop)
+        loop.depth = loop.parent.depth + 1
+    for loop in [root] + found:
+        for block in loop.blocks:
+            block.loop = loop
+            block.loop_depth = loop.depth
+    logger.debug("%d loops in %d blocks from %s", len(found), len(nodes), entry_block)
+    return LoopNestingForest(root, found)
@@ -4,10 +4,11 @@ Convert subroutines with named PROCedures
 
 import logging
 
-from syntax.ast import DefineProcedure
+from syntax.ast import DefineProcedure, Gosub, Return
 from ast_utils import insertStatementBefore
 from convert_sub_visitor import ConvertSubVisitor
 from flow_analysis import tagSuccessors, deTagSuccessors
+from node_index import nodeIndex
 
 logger = logging.getLogger('flow.subroutine_converter')
 
@@ -35,4 +36,5 @@ def convertSubroutinesToProcedures(parse_tree, entry_points, line_mapper, option
     entry_points.update(entry_points_to_add)
     
     csv = ConvertSubVisitor()
-    parse_tree.accept(csv)
+    for statement in nodeIndex(parse_tree).instances(Gosub, Return):
+        csv.visit(statement)
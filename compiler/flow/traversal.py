@@ -3,10 +3,19 @@ Algorithms for traversal of the control flow graph
 '''
 
 import logging
+from array import array
 from itertools import chain
 
 logger = logging.getLogger('flow.traversal')
 
+# The events of a depth first search
+ENTER = 'enter'     # A vertex is reached and entered, before its successors are searched
+EXIT = 'exit'       # The successors of an entered vertex have all been searched
+REVISIT = 'revisit' # A vertex is reached but not entered, usually because it was entered before
+
+def outEdges(vertex):
+    return vertex.outEdges
+
 def depthFirstSearch(vertex, visited = None):
     '''
     A generator which performs depth first search from the supplied vertex through
@@ -26,67 +35,161 @@ def depthFirstSearch(vertex, visited = None):
             yield v
             to_visit.extend(v.outEdges)
 
+def depthFirstEvents(vertex, successors=outEdges, enter=None):
+    '''
+    A generator which performs depth first search from the supplied vertex through
+    the control flow graph, producing events in the same order as a recursive
+    search would, but using an explicit stack so that the depth of the search is
+    not limited by the recursion limit. The successors of a vertex are not found
+    until the ENTER event for the vertex has been handled.
+    :param vertex: A CFG Vertex from which depth first search will be performed
+    :param successors: A function returning the successors of a vertex, by default
+                       its out edges
+    :param enter: An optional function called with each vertex when it is reached,
+                  returning True if the search should enter the vertex. By default
+                  each vertex is entered when it is first reached.
+    :yields: 3-tuples of an event, which is one of ENTER, EXIT and REVISIT, the vertex,
+             and the vertex from which it was reached, or None for the start vertex.
+    '''
+    if enter is None:
+        entered = set()
+        def enter(v):
+            if v in entered:
+                return False
+            entered.add(v)
+            return True
+    if not enter(vertex):
+        yield REVISIT, vertex, None
+        return
+    yield ENTER, vertex, None
+    stack = [(vertex, iter(successors(vertex)))]
+    while stack:
+        v, remaining = stack[-1]
+        for successor in remaining:
+            if enter(successor):
+                yield ENTER, successor, v
+                stack.append((successor, iter(successors(successor))))
+                break
+            yield REVISIT, successor, v
+        else:
+            stack.pop()
+            yield EXIT, v, stack[-1][0] if stack else None
+
+# The states of a vertex in the search for strongly connected components
+UNVISITED = -1 # The vertex is to be searched
+DONE = -2      # The vertex has been placed in a component, or is not to be searched
+
 class ApproximateToplogicalOrderer(object):
-    
+    '''
+    Orders vertices so that, ignoring the edges which close cycles, each vertex
+    precedes its successors. The strongly connected components reachable from
+    the start vertex are found by an iterative form of Tarjan's algorithm, and
+    each component of more than one vertex is then ordered in the same way,
+    starting from its vertex with the most in edges, so that the cycles nested
+    within it are also ordered. The components waiting to be ordered are held
+    on a stack, rather than being ordered by recursion, and the order is built
+    by appending each vertex as it is reached.
+
+    The vertices are numbered, and their successors held in compressed sparse
+    rows of numbers, so that the search state is held in arrays.
+    '''
     def __init__(self, vertex, vertices_to_consider):
+        self.vertices = list(vertices_to_consider)
+        numbers = dict((v, i) for i, v in enumerate(self.vertices))
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+        for v in self.vertices:
+            self.targets.extend(numbers[successor] for successor in chain(v.outEdges, v.loopBackEdges)
+                                if successor in numbers)
+            self.offsets.append(len(self.targets))
+        self.in_degrees = array('l', (v.inDegree for v in self.vertices))
+        size = len(self.vertices)
+        self.index = array('l', [DONE]) * size
+        self.low = array('l', [0]) * size
+        self.on_stack = bytearray(size)
+
         self.order = []
-        self.stack = []
-        self.cur_dfsnum = 0
-        self.index = {}
-        self.low = {}
-        self.vertices_to_consider = vertices_to_consider
-           
-        for v in self.vertices_to_consider:
-            self.index[v] = "To be done"
-            
-        # Special case the start vertex to prevent infinite recursion
-        self.index[vertex] = "Done"
-        for successor in chain(vertex.outEdges, vertex.loopBackEdges):
-            if successor in self.vertices_to_consider:
-                if self.index[successor] == "To be done":
-                    self.visit(successor)
-        self.order.insert(0, vertex)
-        
-    def visit(self, cur_vertex):
-        self.index[cur_vertex] = self.cur_dfsnum
-        self.low[cur_vertex] = self.cur_dfsnum
-        self.cur_dfsnum += 1
-        self.stack.append(cur_vertex)
-        
-        for successor in chain(cur_vertex.outEdges, cur_vertex.loopBackEdges):
-            if successor in self.vertices_to_consider:
-                if self.index[successor] == "To be done":
-                    self.visit(successor)
-                    self.low[cur_vertex] = min(self.low[cur_vertex], self.low[successor])
-                elif self.index[successor] == "Done":
-                    pass
-                
-                #else:
-                elif successor in self.stack:
-                    self.low[cur_vertex] = min(self.low[cur_vertex], self.index[successor])
-                    
-        if self.low[cur_vertex] == self.index[cur_vertex]:
-            # We found a strongly connected component
-            scc = []
-            while True:
-                popped = self.stack.pop()
-                scc.append(popped)
-                self.index[popped] = "Done"
-                if popped == cur_vertex:
-                    break
-                
-            if len(scc) == 1:
-                self.order.insert(0, cur_vertex)
-            else:
-                self.order = approximateTopologicalOrder(self.chooseFirst(scc), scc) + self.order
-        
+        pending = [(numbers[vertex], range(size))]
+        while pending:
+            task = pending.pop()
+            if isinstance(task, int):
+                self.order.append(self.vertices[task])
+                continue
+            first, members = task
+            # Components are found in reverse topological order, so the first
+            # to be ordered is pushed last, followed by the first vertex itself
+            for scc in self.components(first, members):
+                pending.append(scc[0] if len(scc) == 1 else (self.chooseFirst(scc), scc))
+            pending.append(first)
+
+    def components(self, first, members):
+        '''
+        Search from the successors of first for the strongly connected
+        components of members, excluding first.
+        :returns: A list of the components, each a list of vertex numbers in
+                  the order in which they left the stack, in reverse
+                  topological order.
+        '''
+        index, low, on_stack = self.index, self.low, self.on_stack
+        offsets, targets = self.offsets, self.targets
+        for v in members:
+            index[v] = UNVISITED
+        index[first] = DONE
+        components = []
+        stack = []
+        counter = 0
+        for root in targets[offsets[first]:offsets[first + 1]]:
+            if index[root] != UNVISITED:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            path = [root]                    # The vertices being searched
+            positions = [offsets[root]]      # The next successor of each
+            while path:
+                v = path[-1]
+                position = positions[-1]
+                end = offsets[v + 1]
+                while position < end:
+                    successor = targets[position]
+                    position += 1
+                    if index[successor] == UNVISITED:
+                        positions[-1] = position
+                        index[successor] = low[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack[successor] = 1
+                        path.append(successor)
+                        positions.append(offsets[successor])
+                        break
+                    if on_stack[successor] and index[successor] < low[v]:
+                        low[v] = index[successor]
+                else:
+                    path.pop()
+                    positions.pop()
+                    if low[v] == index[v]:
+                        # We found a strongly connected component
+                        scc = []
+                        while True:
+                            popped = stack.pop()
+                            on_stack[popped] = 0
+                            index[popped] = DONE
+                            scc.append(popped)
+                            if popped == v:
+                                break
+                        components.append(scc)
+                    if path and low[v] < low[path[-1]]:
+                        low[path[-1]] = low[v]
+        return components
+
     def chooseFirst(self, scc):
         '''
         Returns the vertex with the most in edges which are not in scc. This function
         is used for computing a likely starting point for the SCC.
-        :param scc: A list of vertices comprising a strong-connected-component.
+        :param scc: A list of vertex numbers comprising a strong-connected-component.
         '''
-        sizes = [v.inDegree for v in scc]
+        sizes = [self.in_degrees[v] for v in scc]
         index = sizes.index(max(sizes))
         return scc[index]
 
@@ -101,10 +204,7 @@ def approximateTopologicalOrder(vertex, vertices_to_consider=None):
     :returns A sequence of basic blocks in approximate toplogical order
     '''
     logger.debug("approximateTopologicalOrder(%s, %s)", str(vertex), str(vertices_to_consider))
-    vertices_under_consideration = set(depthFirstSearch(vertex)) if vertices_to_consider is None else vertices_to_consider
+    vertices_under_consideration = depthFirstSearch(vertex) if vertices_to_consider is None else vertices_to_consider
     ato = ApproximateToplogicalOrderer(vertex, vertices_under_consideration)
-    assert set(ato.order) == set(vertices_under_consideration)
+    assert len(ato.order) == len(ato.vertices)
     return ato.order
-
-               
-                
\ No newline at end of file
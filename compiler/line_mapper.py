@@ -1,43 +1,64 @@
+from array import array
+
 class LineMapper(object):
-    def __init__(self, physical_to_logical_map, line_to_stmt_map):
-        self.physical_to_logical_map = physical_to_logical_map
+    def __init__(self, source_map, line_to_stmt_map):
+        '''
+        :param source_map: The SourceMap of the program, or None if physical and
+                           logical line numbers are the same
+        :param line_to_stmt_map: A mapping from physical line numbers to the first
+                                 statement on each line
+        '''
+        self.source_map = source_map
         self.line_to_stmt_map = line_to_stmt_map
-        
+        # Index the first physical line with each logical line number, so
+        # GOTO, GOSUB and RESTORE targets can be found without a search
+        self.__logical_to_physical = {}
+        if source_map is not None:
+            for physical_line_number, logical_line_number in enumerate(source_map.physical_to_logical_map):
+                if logical_line_number not in self.__logical_to_physical:
+                    self.__logical_to_physical[logical_line_number] = physical_line_number
+        # The physical lines containing statements, in ascending order
+        self.__statement_lines = array('i', sorted([line for line in line_to_stmt_map.keys() if line is not None]))
+        # Statements found by statementOnLine, by logical line number
+        self.__target_statements = {}
+
     def physicalToLogical(self, physical_line_number):
-        if self.physical_to_logical_map is not None and physical_line_number is not None:
-            return self.physical_to_logical_map[physical_line_number]
+        if self.source_map is not None and physical_line_number is not None:
+            return self.source_map.physicalToLogical(physical_line_number)
         else:
             return physical_line_number
-    
+
     def logicalToPhysical(self, logical_line_number):
-        if self.physical_to_logical_map is not None:
-            
-            return self.physical_to_logical_map.index(logical_line_number)
+        '''
+        :returns: The first physical line with the logical line number, or None
+                  if there is no such line.
+        '''
+        if self.source_map is not None:
+            return self.__logical_to_physical.get(logical_line_number)
         else:
             return logical_line_number
-        
+
     def logicalStatement(self, logical_line_number):
         physical_line_number = self.logicalToPhysical(logical_line_number)
         #print "physical_line_number = %s" % physical_line_number
-        if self.line_to_stmt_map.has_key(physical_line_number):
-            return self.line_to_stmt_map[physical_line_number]
-        return None
-    
+        return self.line_to_stmt_map.get(physical_line_number)
+
     def firstStatement(self):
-        statement_lines = sorted([line for line in self.line_to_stmt_map.keys() if line is not None])
-        #for s in statement_lines:
-        #    print "%s : %s" % (s, lnv.line_to_stmt[s])
-        first_statement_line = statement_lines[0]
+        first_statement_line = self.__statement_lines[0]
         #print "first_statement_line = %s" % first_statement_line
         first_statement = self.line_to_stmt_map[first_statement_line]
         return first_statement
-    
+
     def statementOnLine(self, integer_node):
         '''
         :param integer_node: A LiteralInteger node containing a logical line number
         :returns: The first AstStatement node on that logical source code line
         '''
         logical_line_number = integer_node.value
-        statement = self.logicalStatement(logical_line_number)
-        #print "logical_line_number = %d, statement = %s" % (logical_line_number, statement)
-        return statement
\ No newline at end of file
+        try:
+            return self.__target_statements[logical_line_number]
+        except KeyError:
+            statement = self.logicalStatement(logical_line_number)
+            #print "logical_line_number = %d, statement = %s" % (logical_line_number, statement)
+            self.__target_statements[logical_line_number] = statement
+            return statement
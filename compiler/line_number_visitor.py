@@ -1,11 +1,14 @@
 from visitor import Visitor
 from ast_utils import *
+from pass_fusion import FusiblePass, SKIP_CHILDREN
+from simplify_visitor import SimplificationVisitor
 
-class LineNumberVisitor(Visitor):
+class LineNumberVisitor(Visitor, FusiblePass):
     """
     This visitor builds a map from logical line numbers to the first statement
     to appear on that line. It is used for resolving the targets of GOTO, GOSUB, etc.
     """
+    requires = (SimplificationVisitor,)
     
     # TODO: This could be made into a much more useful in-order traversal visitor
     
@@ -24,34 +27,14 @@ class LineNumberVisitor(Visitor):
     def firstStatementOnLine(self, line_number):
         return self.line_to_stmt[line_number]
             
-    def visitAstNode(self, node):
-        "Visit all children in order"
-        node.forEachChild(self.visit)
-                    
-    def visitAstStatement(self, statement):
+    def enterAstStatement(self, statement):
         self.registerStatement(statement)
-            
-    def visitIf(self, iff):
-        """
-        Process an IF statement. The true clause always precedes
-        the false clause so we process that first
-        """
-        self.registerStatement(iff)
+        return SKIP_CHILDREN
         
-        if iff.trueClause is not None:
-            if isinstance(iff.trueClause, list):
-                for node in iff.trueClause:
-                    self.visit(node)
-            else:
-                self.visit(iff.trueClause)
-       
-        if iff.falseClause is not None:
-            if isinstance(iff.falseClause, list):
-                for node in iff.falseClause:
-                    self.visit(node)
-            else:
-                self.visit(iff.falseClause)
-                   
+    def enterIf(self, iff):
+        "Register the IF statement, and continue into its clauses"
+        self.registerStatement(iff)
+            
     # TODO: Need BASIC IV and BASIC V statements here.
     
     
@@ -10,32 +10,33 @@ import sys
 import os   
 import re
 import atexit
-import StringIO
 from optparse import OptionParser
 
-from decoder import decode
+from decoder import fileType
 import syntax.parser
 import xml_visitor
-from source_debugging import SourceDebuggingVisitor
-import parent_visitor
+from source_debugging import SourceDebuggingVisitor, TextSeparators
+from source_map import SourceMap
 import separation_visitor
 import simplify_visitor
 import line_number_visitor
+from node_index import NodeIndex, NodeIndexer
 from flow import locateEntryPoints
 from flow import createForwardControlFlowGraph
 from flow import convertLongjumpsToExceptions
 from flow import convertSubroutinesToProcedures
 from flow import identifyBasicBlocks
 from flow import orderBasicBlocks
+from flow import eliminateDeadCode
 from typing.typecheck import typecheck
 import data_visitor
 import gml_visitor
 from xml_blocks import dumpXmlBlocks
 from line_mapper import LineMapper
+from pass_fusion import runPasses
 import symbol_table_visitor
 from symbol_tables import SymbolTable
 import correlation_visitor
-from algorithms import all_indices
 import process
 
 def readFile(filename):
@@ -46,58 +47,51 @@ def readFile(filename):
     f.close()
     return data
 
-def detokenize(data, options):
-    logging.debug("detokenize")
-    if options.verbose:
-        sys.stderr.write("Detokenizing...")
-    
-    detokenized = StringIO.StringIO()
-    decode(data, detokenized)
-    if options.verbose:
-        sys.stderr.write("done\n")
-    
-    detokenHandle = StringIO.StringIO(detokenized.getvalue())
-    return detokenHandle
+LINE_NUMBER_REGEX = re.compile(r'(\s*\d+\s*)(.*)')
 
-def indexLineNumbers(detokenHandle, options):
+def indexLineNumbers(data, options):
+    '''
+    Detokenize the program, if necessary, and index its lines in a single pass.
+    :returns: A 2-tuple of the program text, from which the line numbers have
+              been removed, and a SourceMap describing its lines.
+    '''
     logging.debug("indexLineNumbers")
     if options.verbose:
-        sys.stderr.write("Mapping physical to logical line numbers... ")
-    
-    line_number_regex = re.compile(r'(\s*\d+\s*)(.*)') # TODO: Factor this out of here and decoder
-    physical_line = 0
-    logical_line = 0
-    physical_to_logical_map = []
+        sys.stderr.write("Detokenizing and mapping physical to logical line numbers... ")
+
+    source_map = SourceMap()
     line_bodies = []
-    line_number_prefixes = []
-    #line_offsets = [] # Offsets to the start of the line
-    while True:
-        #line_offsets.append(detokenHandle.tell())
-        line = detokenHandle.readline()
-        if not line:
-            break
-        m = line_number_regex.match(line)
-        if not m:
-            raise CompileException("Missing line number at physical line %d (after logical line %d)" % (physical_line, logical_line))
-        
-        logical_line_string = m.group(1)
-        logical_line = int(logical_line_string)
-        line_number_prefix_length = len(logical_line_string)
-        line_number_prefixes.append(line_number_prefix_length)
-        physical_to_logical_map.append(logical_line)
-        line_bodies.append(m.group(2))
-        physical_line += 1
-    
+    offset = 0
+    for line_number, line_data in fileType(data).records():
+        line_number_string = str(line_number)
+        body = line_data.strip()
+        prefix_length = len(line_number_string) + 1
+        if '\n' in body:
+            # Line breaks within a line start further physical lines, each of
+            # which must begin with a line number of its own
+            continuation_lines = body.split('\n')
+            body = continuation_lines.pop(0)
+        else:
+            continuation_lines = ()
+        if not body:
+            # The whitespace following the line number extends to the newline
+            prefix_length += 1
+        source_map.addLine(int(line_number_string), offset, prefix_length)
+        line_bodies.append(body)
+        offset += len(body) + 1
+        for line in continuation_lines:
+            m = LINE_NUMBER_REGEX.match(line + '\n')
+            if not m:
+                raise CompileException("Missing line number at physical line %d (after logical line %d)" % (len(source_map), source_map.lastLogicalLine()))
+            body = m.group(2)
+            source_map.addLine(int(m.group(1)), offset, len(m.group(1)))
+            line_bodies.append(body)
+            offset += len(body) + 1
+
     data = '\n'.join(line_bodies)
-    detokenHandle.close()
-    cr_indices = all_indices(data, '\n')
-    line_indices = [index + 1 for index in cr_indices]
-    line_offsets = [0]
-    line_offsets.extend(line_indices)
-    #for i, offset in enumerate(line_offsets):
-    #    print "%d ==> %s" % (i, data[offset:offset + 5])
-    #print data
-    return data, physical_to_logical_map, line_offsets , line_number_prefixes
+    if options.verbose:
+        sys.stderr.write("done\n")
+    return data, source_map
 
 def warnOnMissingNewline(data):
     logging.debug("warnOnMissingNewline")
@@ -106,45 +100,16 @@ def warnOnMissingNewline(data):
         data += '\n'  
     return data
 
-def setSourceDebugging(data, line_offsets, line_number_prefixes, parse_tree):
-    logging.debug("Set source debugging")
-    # Read through the data and set character column information
-    sdv = SourceDebuggingVisitor(data, line_offsets, line_number_prefixes)
-    parse_tree.accept(sdv)
-
-def setParents(parse_tree, options):
-    logging.debug("setParents")
-    if options.verbose:
-        sys.stderr.write("Setting parents... ")
-    
-    parse_tree.accept(parent_visitor.ParentVisitor())
-    if options.verbose:
-        sys.stderr.write("done\n")
-
-def splitComplexNodes(parse_tree, options):
-    logging.debug("splitComplexNodes")
-    if options.verbose:
-        sys.stderr.write("Separating complex Abstract Syntax Tree nodes... ")
-    
-    parse_tree.accept(separation_visitor.SeparationVisitor())
-    if options.verbose:
-        sys.stderr.write("done\n")
-
-def simplifyAst(parse_tree, options):
-    logging.debug("simplifyAst")
-    if options.verbose:
-        sys.stderr.write("Simplifying Abstract Syntax Tree... ")
-    
-    parse_tree.accept(simplify_visitor.SimplificationVisitor())
-    if options.verbose:
-        sys.stderr.write("done\n")
-
-def createLineMapper(parse_tree, physical_to_logical_map):
-    logging.debug("createLineMapper")
-    lnv = line_number_visitor.LineNumberVisitor()
-    parse_tree.accept(lnv)
-    line_mapper = LineMapper(physical_to_logical_map, lnv.line_to_stmt)
-    return line_mapper
+def parseTokenStream(data, options):
+    '''
+    Parse a tokenised program directly from its tokens, without detokenising it.
+    :returns: A 2-tuple of the parse tree and the TokenStreamLexer, which holds
+              the SourceMap and statement separator positions.
+    '''
+    logging.debug("parseTokenStream")
+    token_lexer = syntax.parser.buildTokenStreamLexer(options)
+    parse_tree = syntax.parser.parse(fileType(data), options, lexer=token_lexer)
+    return parse_tree, token_lexer
 
 def dumpXmlAst(parse_tree, output_filename, options):
     logging.debug("dumpXmlAst")
@@ -202,16 +167,37 @@ def buildSymbolTables(entry_points, options):
         print
     return stv
             
-def extractData(parse_tree, options):
+def prepareAst(parse_tree, separators, source_map, options):
     """
-    Extract all information from DATA statements
+    Set source debugging information, separate and simplify the AST, and
+    extract its line numbers, in as few traversals of the AST as possible,
+    indexing its nodes by class as the line numbers are extracted. The DATA
+    is then extracted from the node index. The parents of the AST have
+    already been set by the parser, and any positions left to move by reparse
+    are moved first. Source debugging information is not set if the program
+    has compact positions.
+    :returns: A 2-tuple of the LineMapper and the DataVisitor
     """
-    # All DATA is stored as strings, and is converted at run-time by the
-    # READ statement
-    logging.debug("extracting DATA")
+    logging.debug("prepareAst")
+    if options.verbose:
+        sys.stderr.write("Preparing Abstract Syntax Tree... ")
+    
+    syntax.parser.applyPositionShifts(parse_tree)
+    passes = []
+    if getattr(parse_tree, 'token_spans', None) is None:
+        passes.append(SourceDebuggingVisitor(separators, source_map))
+    lnv = line_number_visitor.LineNumberVisitor()
+    parse_tree.node_index = NodeIndex()
+    passes.extend([separation_visitor.SeparationVisitor(),
+                   simplify_visitor.SimplificationVisitor(),
+                   lnv,
+                   NodeIndexer(parse_tree.node_index)])
+    traversals = runPasses(parse_tree, passes)
     dv = data_visitor.DataVisitor()
-    parse_tree.accept(dv)
-    return dv   
+    dv.extract(parse_tree.node_index)
+    if options.verbose:
+        sys.stderr.write("done in %d traversals\n" % len(traversals))
+    return LineMapper(source_map, lnv.line_to_stmt), dv
     
 def dumpXmlCfg(parse_tree, filename, options):
     logging.debug("dumpXmlCfg")   
@@ -252,6 +238,14 @@ def main(argv=None):
         parser.add_option("-v", "--verbose", action='store_true', dest='verbose', default=False)
         parser.add_option("-i", "--il", action='store_true', dest='create_il', default=False)
         parser.add_option("-p", "--peverify", action='store_true', dest='peverify', default=False)
+        parser.add_option("-d", "--detokenize", action='store_true', dest='detokenize', default=False)
+        parser.add_option("-t", "--table-dir", dest='table_dir', default=None)
+        parser.add_option("--debug-parser", action='store_true', dest='debug_parser', default=False)
+        parser.add_option("-l", "--lexer", type='choice', choices=['ply', 'trie'], dest='lexer', default='ply')
+        parser.add_option("-j", "--parse-jobs", type='int', dest='parse_jobs', default=1)
+        parser.add_option("--compact-positions", action='store_true', dest='compact_positions', default=False)
+        parser.add_option("--ast-cache", dest='ast_cache', default=None)
+        parser.add_option("--no-dead-code-elimination", action='store_false', dest='eliminate_dead_code', default=True)
 
         (options, args) = parser.parse_args()
         if len(args) != 1:
@@ -271,27 +265,27 @@ def compile(filename, options):
         clr.AddReference('System.Xml')
         from System.Xml import XmlTextWriter, Formatting
     
-    if not options.use_clr:
-        # TODO: Use non-recursive code for the flowgraph
-        sys.setrecursionlimit(2000)
-    
     data = readFile(filename)
-    detokenHandle = detokenize(data, options)
-    data, physical_to_logical_map, line_offsets, line_number_prefixes = indexLineNumbers(detokenHandle, options)
-    data = warnOnMissingNewline(data)
-
-    parse_tree = syntax.parser.parse(data, options)
-    setSourceDebugging(data, line_offsets, line_number_prefixes, parse_tree)
-    setParents(parse_tree, options)
-    splitComplexNodes(parse_tree, options)
-    simplifyAst(parse_tree, options)
-    line_mapper = createLineMapper(parse_tree, physical_to_logical_map)
-    dv = extractData(parse_tree, options)
+    if fileType(data).tokenised and not options.detokenize:
+        # Lex tokenised programs directly from their tokens
+        parse_tree, token_lexer = parseTokenStream(data, options)
+        source_map = token_lexer.source_map
+        separators = token_lexer.separators
+    else:
+        data, source_map = indexLineNumbers(data, options)
+        data = warnOnMissingNewline(data)
+        parse_tree = syntax.parser.cachedParse(data, options)
+        separators = TextSeparators(data)
+    # Compact positions are resolved when they are needed
+    token_spans = getattr(parse_tree, 'token_spans', None)
+    line_mapper, dv = prepareAst(parse_tree, separators, source_map, options)
     createForwardControlFlowGraph(parse_tree, line_mapper, options)
     entry_points = locateEntryPoints(parse_tree, line_mapper, options)  
     convertLongjumpsToExceptions(parse_tree, line_mapper, options)
     convertSubroutinesToProcedures(parse_tree, entry_points, line_mapper, options)
     correlateLoops(entry_points, options)
+    if options.eliminate_dead_code:
+        eliminateDeadCode(parse_tree, entry_points, options)
     basic_blocks = identifyBasicBlocks(entry_points, options)
     ordered_basic_blocks = orderBasicBlocks(basic_blocks, options)
     typecheck(parse_tree, entry_points, options)
@@ -307,7 +301,7 @@ def compile(filename, options):
 
     if options.use_clr:
         from codegen.clr.generate import AssemblyGenerator
-        ag = AssemblyGenerator(line_mapper)
+        ag = AssemblyGenerator(line_mapper, token_spans)
         exe_filename = ag.generateAssembly(source_path, output_name, stv.globalSymbols, dv, ordered_basic_blocks)
         if options.peverify:
             # Run PEVerify on the resulting executable
@@ -359,9 +353,6 @@ def compile(filename, options):
     # Trace back from RETURN statements - if only one
     # GOSUB is reached - move the code in the GOSUB to the call site
     # of the GOSUB
-    # Locate nodes with no inbound edges and trace unreachable code
-    # from them. Remove unreachable code from the CFG and the AST. This
-    # will need to be traced from program and procedure entry points
         
     # TODO: Replace Goto -> ReturnFromProcedure with ReturnFromProcedure
     #elimiateCommonSubexpressions(parse_tree    opti
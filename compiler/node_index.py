@@ -0,0 +1,199 @@
+'''
+An index of the nodes of the AST by their class, so that passes which are only
+concerned with a few kinds of node, such as the conversion of GOSUB and RETURN,
+can find them without traversing the whole AST.
+
+The index is attached to the Program as its node_index attribute. It is built
+while the AST is prepared, by a NodeIndexer sharing the traversal of the other
+passes which follow simplification, and the functions of ast_utils which
+insert, remove and replace statements, or elide nodes, keep it up to date.
+'''
+
+from bisect import bisect_left, insort
+from operator import itemgetter
+
+from visitor import Visitor
+from pass_fusion import FusiblePass
+from simplify_visitor import SimplificationVisitor
+
+class NodeIndex(object):
+    '''
+    The nodes of an AST, by their class. Each node has a number, and the nodes
+    are numbered in the order of a depth-first traversal of the AST. Nodes
+    which are inserted into the AST are given fractional numbers between those
+    of the nodes on either side of them.
+    '''
+    def __init__(self):
+        self.__nodes = {} # class -> {node: number}
+        self.__numbers = [] # The numbers of the nodes, in order
+
+    def __len__(self):
+        return len(self.__numbers)
+
+    def number(self, node):
+        '''
+        :returns: The number of node, or None if it is not indexed
+        '''
+        nodes = self.__nodes.get(node.__class__)
+        return nodes.get(node) if nodes is not None else None
+
+    def add(self, node):
+        '''
+        Index node, which is not indexed, after the nodes already indexed
+        '''
+        numbers = self.__numbers
+        number = numbers[-1] + 1 if numbers else 0
+        nodes = self.__nodes.get(node.__class__)
+        if nodes is None:
+            nodes = self.__nodes[node.__class__] = {}
+        nodes[node] = number
+        numbers.append(number)
+
+    def remove(self, node):
+        '''
+        Remove node from the index, if it is indexed
+        '''
+        nodes = self.__nodes.get(node.__class__)
+        if nodes is not None:
+            number = nodes.pop(node, None)
+            if number is not None:
+                del self.__numbers[bisect_left(self.__numbers, number)]
+
+    def insertBefore(self, root, node):
+        '''
+        Index the nodes of the subtree rooted at root, which has been inserted
+        into the AST before node, between node and the indexed node preceding
+        it, or after the nodes already indexed if node is not indexed. Nodes of
+        the subtree which are already indexed are renumbered.
+        '''
+        new_nodes = subtree(root)
+        upper = self.number(node)
+        if upper is None:
+            self.__append(new_nodes)
+            return
+        position = bisect_left(self.__numbers, upper)
+        lower = self.__numbers[position - 1] if position > 0 else upper - 1
+        self.__spread(new_nodes, lower, upper)
+
+    def insertAfter(self, root, node):
+        '''
+        Index the nodes of the subtree rooted at root, which has been inserted
+        into the AST after node, between the subtree rooted at node and the
+        indexed node following it, or after the nodes already indexed if node
+        is not indexed.
+        '''
+        new_nodes = subtree(root)
+        lower = self.number(node)
+        if lower is None:
+            self.__append(new_nodes)
+            return
+        for descendant in subtree(node):
+            number = self.number(descendant)
+            if number is not None:
+                lower = max(lower, number)
+        position = bisect_left(self.__numbers, lower) + 1
+        upper = self.__numbers[position] if position < len(self.__numbers) else lower + 1
+        self.__spread(new_nodes, lower, upper)
+
+    def __append(self, new_nodes):
+        "Index new_nodes after the nodes already indexed"
+        for new_node in new_nodes:
+            self.remove(new_node)
+            self.add(new_node)
+
+    def __spread(self, new_nodes, lower, upper):
+        "Number new_nodes evenly between lower and upper"
+        step = (upper - lower) / float(len(new_nodes) + 1)
+        for offset, new_node in enumerate(new_nodes):
+            self.remove(new_node)
+            number = lower + step * (offset + 1)
+            self.__nodes.setdefault(new_node.__class__, {})[new_node] = number
+            insort(self.__numbers, number)
+
+    def retype(self, node, old_class):
+        '''
+        Move node, the class of which has been changed from old_class, to the
+        index of its new class, keeping its place in the order.
+        '''
+        nodes = self.__nodes.get(old_class)
+        if nodes is not None and node in nodes:
+            number = nodes.pop(node)
+            self.__nodes.setdefault(node.__class__, {})[node] = number
+
+    def removeTree(self, root):
+        '''
+        Remove the nodes of the subtree rooted at root from the index.
+        '''
+        for node in subtree(root):
+            self.remove(node)
+
+    def removeTrees(self, roots):
+        '''
+        Remove the nodes of the subtrees rooted at each of roots from the
+        index, renumbering the remaining nodes once, rather than once for each
+        node removed.
+        '''
+        removed = set()
+        for root in roots:
+            for node in subtree(root):
+                nodes = self.__nodes.get(node.__class__)
+                if nodes is not None:
+                    number = nodes.pop(node, None)
+                    if number is not None:
+                        removed.add(number)
+        if removed:
+            self.__numbers = [number for number in self.__numbers if number not in removed]
+
+    def instances(self, *kinds):
+        '''
+        :param kinds: Node classes, the subclasses of which are included
+        :returns: A list of the indexed nodes which are instances of any of
+                  the kinds, in the order of their numbers.
+        '''
+        numbered = []
+        for cls, nodes in self.__nodes.iteritems():
+            if issubclass(cls, kinds):
+                numbered.extend(nodes.iteritems())
+        numbered.sort(key=itemgetter(1))
+        return [node for node, number in numbered]
+
+def subtree(root):
+    '''
+    :returns: A list of the nodes of the subtree rooted at root, in the order
+              in which forEachChild would reach them.
+    '''
+    result = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if node is None:
+            continue
+        result.append(node)
+        children = []
+        node.forEachChild(children.append)
+        children.reverse()
+        pending.extend(children)
+    return result
+
+class NodeIndexer(Visitor, FusiblePass):
+    '''
+    A pass which adds each node of the AST to a NodeIndex.
+    '''
+    requires = (SimplificationVisitor,)
+
+    def __init__(self, index):
+        self.index = index
+
+    def enterAstNode(self, node):
+        self.index.add(node)
+
+def nodeIndex(root):
+    '''
+    :returns: The NodeIndex of the AST rooted at root, which is built by
+              traversing the AST if it was not built as the AST was prepared.
+    '''
+    index = getattr(root, 'node_index', None)
+    if index is None:
+        index = root.node_index = NodeIndex()
+        root.accept(NodeIndexer(index))
+    return index
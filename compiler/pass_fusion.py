@@ -0,0 +1,241 @@
+# Running several passes over the AST in shared traversals
+
+import logging
+
+from visitor import VisitorMeta, visitorMethod, methodCache
+
+# Returned by an enter hook to prevent the hooks of its pass being called
+# for the descendants of the node
+SKIP_CHILDREN = object()
+
+class Pass(object):
+    """
+    A mixin for visitors which are run over the whole AST by runPasses.
+
+    Passes which must have been run over the whole AST before this pass can
+    start are listed in requires, as classes. Any pass listed earlier in the
+    schedule than this one is run first at each node, whether or not it is
+    required.
+    """
+    __metaclass__ = VisitorMeta
+    requires = ()
+
+class FusiblePass(Pass):
+    """
+    A mixin for passes which can share a single traversal of the AST with other
+    passes, rather than visiting the AST themselves.
+
+    The traversal calls a pre-order hook of each pass as it enters a node, and
+    a post-order hook as it leaves the node. The hooks for a node are found by
+    appending the class name to 'enter' or 'leave', so the hooks for an If node
+    are enterIf and leaveIf. If a pass has no hook for the class of a node, the
+    hooks for its superclasses are searched in method resolution order. An
+    enter hook may return SKIP_CHILDREN so that no hooks of its pass are called
+    for the descendants of the node.
+
+    A pass which sets rewrites may replace the node being left with a new node
+    by returning it from a leave hook, or, if the node is held in a list, with
+    any number of nodes by returning a list of them. The replacement is spliced
+    into the parent of the node only once the hooks of every pass have left the
+    node, so the traversal continues with the next sibling, and neither the
+    node nor its replacement is visited again. No pass can share a traversal
+    with an earlier pass which rewrites the AST.
+
+    Accepted as a visitor, a FusiblePass traverses the subtree on its own.
+    """
+    rewrites = False
+
+    def visitAstNode(self, node):
+        "Run this pass alone over the subtree rooted at node"
+        FusedTraversal([self]).run(node)
+
+# The enter and leave hooks, for each pair of pass class and node class.
+# Discarded, like the visitor methods, when any pass class is changed.
+_hook_cache = methodCache()
+
+def hooks(pass_class, node_class):
+    """
+    :returns: A 2-tuple of the enter and leave hooks of pass_class for
+              nodes of node_class, either of which may be None.
+    """
+    key = (pass_class, node_class)
+    try:
+        return _hook_cache[key]
+    except KeyError:
+        pass
+    result = []
+    for prefix in ('enter', 'leave'):
+        hook = None
+        for klass in node_class.__mro__:
+            hook = visitorMethod(pass_class, prefix + klass.__name__)
+            if hook is not None:
+                break
+        result.append(hook)
+    result = _hook_cache[key] = tuple(result)
+    return result
+
+class FusedTraversal(object):
+    """
+    A single depth-first traversal of the AST, calling the hooks of several
+    FusiblePasses at each node, in the order of the passes.
+    """
+    def __init__(self, passes):
+        self.passes = list(passes)
+        # The enter hooks and leave hooks of the passes, by node class
+        self.__enters = {}
+        self.__leaves = {}
+        # The number of nodes spliced in place of the child most recently left
+        self.__width = 1
+
+    def run(self, root):
+        """
+        Traverse the subtree rooted at root, using an explicit stack rather than
+        recursion, so the depth of the AST is not limited by the recursion limit.
+        """
+        indices = tuple(xrange(len(self.passes)))
+        active = self.__enter(root, indices)
+        # Each frame holds a node, the list or node and the index or name through which
+        # it was reached, the indices of the passes which entered it, and its children
+        stack = [(root, None, None, indices, self.__children(root) if active else None, active)]
+        while stack:
+            node, container, key, indices, children, active = stack[-1]
+            child = next(children, None) if children is not None else None
+            if child is not None:
+                child_container, child_key, child = child
+                child_active = self.__enter(child, active)
+                stack.append((child, child_container, child_key, active,
+                              self.__children(child) if child_active else None, child_active))
+                continue
+            stack.pop()
+            replacement = self.__leave(node, indices)
+            if replacement is not None:
+                assert container is not None, "The root of the AST cannot be replaced"
+                if isinstance(replacement, list):
+                    assert isinstance(container, list), "Only a node in a list can be replaced by a list"
+                    container[key:key + 1] = replacement
+                    self.__width = len(replacement)
+                    for index, new_node in enumerate(replacement):
+                        self.__adopt(new_node, node, key + index)
+                elif isinstance(container, list):
+                    container[key] = replacement
+                    self.__adopt(replacement, node, key)
+                else:
+                    setattr(container, key, replacement)
+                    self.__adopt(replacement, node, None)
+
+    def __findHooks(self, node_class):
+        node_hooks = [hooks(p.__class__, node_class) for p in self.passes]
+        enters = self.__enters[node_class] = [enter for enter, leave in node_hooks]
+        leaves = [leave for enter, leave in node_hooks]
+        self.__leaves[node_class] = leaves if [leave for leave in leaves if leave is not None] else None
+        return enters
+
+    def __enter(self, node, indices):
+        """
+        Call the enter hooks of the passes with the given indices for node.
+        :returns: The indices of the passes which continue to the children of node
+        """
+        passes = self.passes
+        enters = self.__enters.get(node.__class__) or self.__findHooks(node.__class__)
+        active = indices
+        for i in indices:
+            enter = enters[i]
+            if enter is not None and enter(passes[i], node) is SKIP_CHILDREN:
+                # Only allocate a new tuple of indices when a pass is skipping the children
+                active = tuple(j for j in active if j != i)
+        return active
+
+    def __leave(self, node, indices):
+        """
+        Call the leave hooks of the passes with the given indices for node.
+        :returns: The node to replace node, or None
+        """
+        passes = self.passes
+        leaves = self.__leaves[node.__class__]
+        result = None
+        if leaves is not None:
+            for i in indices:
+                leave = leaves[i]
+                if leave is not None:
+                    replacement = leave(passes[i], node)
+                    if replacement is not None:
+                        assert passes[i].rewrites, "%s cannot replace nodes" % passes[i].__class__.__name__
+                        result = replacement
+        return result
+
+    def __children(self, node):
+        """
+        A generator of the children of node, in the order of forEachChild. The
+        children of a list in which a child has been replaced by a list of nodes
+        are re-indexed as they are reached.
+        :yields: 3-tuples of the list or node holding each child, its index or
+                 name within that, and the child
+        """
+        for name in node._child_order:
+            child = getattr(node, name)
+            if isinstance(child, list):
+                index = 0
+                shifted = False
+                while index < len(child):
+                    subchild = child[index]
+                    if subchild is not None:
+                        if shifted:
+                            subchild.parent_index = index
+                        yield child, index, subchild
+                        # Step over any nodes spliced in place of the child
+                        width = self.__width
+                        if width != 1:
+                            self.__width = 1
+                            shifted = True
+                        index += width
+                    else:
+                        index += 1
+            elif child is not None:
+                yield node, name, child
+
+    def __adopt(self, replacement, node, index):
+        "Give the replacement the parent references of the node it replaces, at index"
+        replacement.parent = getattr(node, 'parent', None)
+        replacement.parent_property = getattr(node, 'parent_property', None)
+        replacement.parent_index = index
+
+def schedule(passes):
+    """
+    Divide passes into as few traversals of the AST as their requirements
+    allow, keeping their order. A FusiblePass shares the traversal of the
+    preceding passes unless it requires one of them, or one of them rewrites
+    the AST. Any other pass visits the AST on its own.
+    :returns: A list of lists of passes, one for each traversal
+    """
+    traversals = []
+    current = None
+    for index, p in enumerate(passes):
+        for later in passes[index + 1:]:
+            if isinstance(later, p.requires):
+                raise ValueError("%s requires %s, which is scheduled after it"
+                                 % (p.__class__.__name__, later.__class__.__name__))
+        fusible = (isinstance(p, FusiblePass) and current is not None
+                   and not [q for q in current if isinstance(q, p.requires) or q.rewrites])
+        if fusible:
+            current.append(p)
+        else:
+            current = [p]
+            traversals.append(current)
+            if not isinstance(p, FusiblePass):
+                current = None
+    return traversals
+
+def runPasses(root, passes):
+    """
+    Run passes over the AST rooted at root, fusing them into as few traversals
+    as possible.
+    :returns: The list of lists of passes run in each traversal
+    """
+    traversals = schedule(passes)
+    for traversal in traversals:
+        logging.debug("traversal: %s", ", ".join(p.__class__.__name__ for p in traversal))
+        if isinstance(traversal[0], FusiblePass):
+            FusedTraversal(traversal).run(root)
+        else:
+            root.accept(traversal[0])
+    return traversals
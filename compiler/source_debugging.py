@@ -1,33 +1,93 @@
 import logging
 import re
-from bisect import bisect_right
+from bisect import bisect_left
 
 from visitor import Visitor
+from syntax.ast import MarkerStatement
+from pass_fusion import FusiblePass, SKIP_CHILDREN
 
-class SourceDebuggingVisitor(Visitor):
+class TextSeparators(object):
+    '''
+    Locates statement separators by searching the source text.
+    '''
+    def __init__(self, data):
+        '''
+        :param data: The source file as a string
+        '''
+        self.__data = data
+        self.__separator_regex = re.compile(r'\s*([\n:]|ELSE)')
+
+    def find(self, start_pos, end_pos):
+        '''
+        :returns: The position of the whitespace preceding the first statement separator
+                  within the half-open range [start_pos, end_pos), or None.
+        '''
+        # TODO: Some possible issue here with line end markers (because of normalised line endings), ignoring the contents of REMs, DATA and LiteralStrings
+        #       and line continuation
+        # Search for new-lines or COLONs within the search string
+        m = self.__separator_regex.search(self.__data, start_pos, end_pos)
+        if m is not None:
+            return m.start()
+        return None
+
+    def describe(self, start_pos, end_pos):
+        return "in >>>%s<<<" % self.__data[start_pos:end_pos]
+
+class TokenSeparators(object):
+    '''
+    Locates statement separators from the positions of the COLON, ELSE and EOL
+    tokens, as recorded by a lexer which has no source text to search. Separators
+    within strings, REMs and DATA are not tokens, so are never located.
+    '''
+    def __init__(self):
+        self.__whitespace_starts = []
+        self.__positions = []
+        self.__lengths = []
+
+    def add(self, whitespace_start, pos, length):
+        '''
+        Record a separator. Separators must be added in source order.
+        :param whitespace_start: The end of the token preceding the separator
+        :param pos: The position of the separator
+        :param length: The length of the separator
+        '''
+        self.__whitespace_starts.append(whitespace_start)
+        self.__positions.append(pos)
+        self.__lengths.append(length)
+
+    def find(self, start_pos, end_pos):
+        '''
+        :returns: The position of the whitespace preceding the first statement separator
+                  within the half-open range [start_pos, end_pos), or None.
+        '''
+        index = bisect_left(self.__positions, start_pos)
+        if index == len(self.__positions):
+            return None
+        if self.__positions[index] + self.__lengths[index] > end_pos:
+            return None
+        return max(start_pos, self.__whitespace_starts[index])
+
+    def describe(self, start_pos, end_pos):
+        return "between positions %d and %d" % (start_pos, end_pos)
+
+class SourceDebuggingVisitor(Visitor, FusiblePass):
     '''
     A visitor for computing start and end character columns based upon
     file offsets attached to each AstStatement node and offsets to the beginning
     of each line. The operation of this visitor assumes that a depth-first traversal
     of the AST will visit all statements in source program order.
     '''
-    def __init__(self, data, line_offsets, line_number_prefixes):
+    def __init__(self, separators, source_map):
         '''
-        :param data: The source file as a string
-        :param line_offsets: an array of line offsets
-        :param line_number_prexies: an array of the lengths of the line-number and
-                                    whitespace prefix to each source line
+        :param separators: A TextSeparators or TokenSeparators for locating statement separators
+        :param source_map: A SourceMap giving the offset and line-number prefix length
+                           of each source line
         '''
-        self.__data = data
-        self.__line_offsets = line_offsets
-        self.__line_number_prefixes = line_number_prefixes
+        self.__separators = separators
+        self.__source_map = source_map
         self.__previous_statement = None
-        self.__separator_regex = re.compile(r'\s*([\n:]|ELSE)')
 
-    def visitAstNode(self, node):
-        node.forEachChild(self.visit)
-    
-    def visitAstStatement(self, statement):
+    def enterAstStatement(self, statement):
         '''
         Get the startPos of the visited statement. Use this value, together with the
         probably innaccurate endPos of the *previous* statement to locate the end of
@@ -37,21 +97,15 @@ class SourceDebuggingVisitor(Visitor):
         self.setPreviousStatementColumns(statement)
         self.__previous_statement = statement
         # There is no need to visit the children of most statements
+        return SKIP_CHILDREN
     
-    def visitIf(self, statement):
+    def enterIf(self, statement):
         #print statement
         self.setPreviousStatementColumns(statement)
         # If statements, don't need adjusting, so we unset self.__previous_statement
         self.__previous_statement = None
-        # We must visit the children of IF statements
-        if statement.trueClause is not None:
-            #print "visiting trueClause"
-            self.visit(statement.trueClause)
-
-        if statement.falseClause is not None:
-            #print "visiting falseClause"
-            self.visit(statement.falseClause)
-        
+    
+    def leaveIf(self, statement):
         # Set up the columns for this IF statement itself
         self.setStartAndEndColumns(statement)
     
@@ -85,15 +139,12 @@ class SourceDebuggingVisitor(Visitor):
         assert search_start_pos is not None
         assert search_end_pos is not None
         if search_start_pos < search_end_pos - 1:
-            # TODO: Some possible issue here with line end markers (because of normalised line endings), ignoring the contents of REMs, DATA and LiteralStrings
-            #       and line continuation
-            # Search for new-lines or COLONs within the search string
-            m = self.__separator_regex.search(self.__data, search_start_pos, search_end_pos)
-            if m is not None:
-                statement.endPos = m.start()
-            else:
-                print "Error: Could not locate statement separator in >>>%s<<<" % self.__data[search_start_pos:search_end_pos]
-        #print ">>>%s<<<" % self.__data[statement.startPos:statement.endPos]
+            separator_pos = self.__separators.find(search_start_pos, search_end_pos)
+            if separator_pos is not None:
+                statement.endPos = separator_pos
+            # A DEF or REPEAT is not separated from a statement following it on the same line
+            elif not isinstance(statement, MarkerStatement):
+                print "Error: Could not locate statement separator %s" % self.__separators.describe(search_start_pos, search_end_pos)
     
     def setStartAndEndColumns(self, statement):
         '''
@@ -108,17 +159,4 @@ class SourceDebuggingVisitor(Visitor):
         :param pos: An zero-based offset from the beginning of the source file
         :returns: A one-based character column from the beginning of the line
         '''
-        # TODO: Could make this faster by passing in a range on lines to check
-        #print "pos =", pos
-        index = bisect_right(self.__line_offsets, pos) - 1
-        #print "index =", index
-        line_start_pos = self.__line_offsets[index]
-        #print "line_start_pos =", line_start_pos
-        prefix_length = self.__line_number_prefixes[index]
-        #print "prefix_length =", prefix_length
-        column = pos - line_start_pos + prefix_length + 1 # One based
-        #print "column =", column
-        #print
-        return column
-        
-        
\ No newline at end of file
+        return self.__source_map.column(pos)
@@ -0,0 +1,74 @@
+from array import array
+from bisect import bisect_right
+
+class SourceMap(object):
+    '''
+    The mapping between positions in the program text passed to the parser and
+    the lines of the source program. For each physical line the offset of its
+    first character within the text, the length of the line number and whitespace
+    prefix which was removed from it, and its logical (BBC BASIC) line number are
+    held in parallel integer arrays, indexed by zero-based physical line number.
+    '''
+    def __init__(self):
+        self.line_offsets = array('i')
+        self.line_number_prefixes = array('i')
+        self.physical_to_logical_map = array('i')
+        # True while the logical line numbers are strictly ascending
+        self.ascending = True
+
+    def addLine(self, logical_line, offset, prefix_length):
+        '''
+        Record the next physical line. Lines must be added in source order.
+        :param logical_line: The BBC BASIC line number of the line
+        :param offset: The offset to the start of the line body within the program text
+        :param prefix_length: The length of the line number and whitespace prefix
+                              which precedes the line body in the source
+        '''
+        if self.physical_to_logical_map and logical_line <= self.physical_to_logical_map[-1]:
+            self.ascending = False
+        self.physical_to_logical_map.append(logical_line)
+        self.line_offsets.append(offset)
+        self.line_number_prefixes.append(prefix_length)
+
+    def __len__(self):
+        return len(self.physical_to_logical_map)
+
+    def lastLogicalLine(self):
+        '''
+        :returns: The logical line number of the most recently added line, or zero.
+        '''
+        if self.physical_to_logical_map:
+            return self.physical_to_logical_map[-1]
+        return 0
+
+    def physicalToLogical(self, physical_line):
+        '''
+        :param physical_line: A zero-based physical line number
+        :returns: The logical line number of that line
+        '''
+        return self.physical_to_logical_map[physical_line]
+
+    def physicalLine(self, pos):
+        '''
+        :param pos: A zero-based offset into the program text
+        :returns: The zero-based physical line number containing pos
+        '''
+        return bisect_right(self.line_offsets, pos) - 1
+
+    def position(self, pos):
+        '''
+        :param pos: A zero-based offset into the program text
+        :returns: A 2-tuple of the zero-based physical line number containing pos,
+                  and the one-based character column of pos within the source line,
+                  including its line number prefix.
+        '''
+        index = bisect_right(self.line_offsets, pos) - 1
+        column = pos - self.line_offsets[index] + self.line_number_prefixes[index] + 1
+        return index, column
+
+    def column(self, pos):
+        '''
+        :param pos: A zero-based offset into the program text
+        :returns: A one-based character column from the beginning of the source line
+        '''
+        return self.position(pos)[1]
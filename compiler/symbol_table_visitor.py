@@ -21,6 +21,11 @@ class SymbolTableVisitor(Visitor):
         self.__global_symbols = SymbolTable("global symbol table",
                                             protection=SymbolTable.writable,
                                             parent=SystemSymbolTable.getInstance())
+        # The remaining successors of each statement being visited, most recent last
+        self.__successors = []
+        # The symbol tables and symbol ids of the variables already added, so
+        # that each variable is only looked up once in each symbol table
+        self.__added = set()
     
     def _getGlobalSymbols(self):
         return self.__global_symbols
@@ -28,9 +33,20 @@ class SymbolTableVisitor(Visitor):
     globalSymbols = property(_getGlobalSymbols)
     
     def followSuccessors(self, statement):
-        # Visit successors - depth first through CFG
-        for out_edge in statement.outEdges:
-            if out_edge.symbolTable is None:
+        """
+        Visit successors - depth first through CFG. Each visitor method ends by
+        following the successors of its statement, so rather than recursing the
+        outermost call visits them in the same order from a stack of the
+        remaining successors of each statement.
+        """
+        self.__successors.append(iter(statement.outEdges))
+        if len(self.__successors) > 1:
+            return
+        while self.__successors:
+            out_edge = next(self.__successors[-1], None)
+            if out_edge is None:
+                self.__successors.pop()
+            elif out_edge.symbolTable is None:
                 self.visit(out_edge)
                 
     def checkPredecessorsAndRefer(self, statement):
@@ -55,8 +71,11 @@ class SymbolTableVisitor(Visitor):
     
     def tryAddVariable(self, symbol_table, variable):
         if (isinstance(variable, Variable)):
-            symbol_info = SymbolInfo(variable.identifier, variable.actualType)
-            symbol_table.tryAdd(symbol_info)
+            key = (symbol_table, variable.symbol_id)
+            if key not in self.__added:
+                self.__added.add(key)
+                symbol_info = SymbolInfo(variable.identifier, variable.actualType)
+                symbol_table.tryAdd(symbol_info)
         else:
             assert 0, "%s is not a variable" % variable
             # TODO: What?
@@ -13,6 +13,8 @@ from typing.type_system import (VoidOwlType, IntegerOwlType, ChannelOwlType,
                                 PendingOwlType, ArrayOwlType, ObjectOwlType)
     
 class AstStatement(AstNode, CfgVertex):
+    # The statement which follows this one, set by ast_utils.indexSuccessors
+    __slots__ = CfgVertex.vertex_slots + ('linear_successor',)
     formal_type = TypeOption(VoidOwlType())
     actual_type = formal_type
     start_line = IntegerOption() # One-based line number for source level debugging
@@ -21,23 +23,49 @@ class AstStatement(AstNode, CfgVertex):
     end_pos = IntegerOption()   # Zero-based file offset
     start_column = IntegerOption() # One based column number for source level debugging
     end_column = IntegerOption() # One based column number for source level debugging
+    span = IntegerOption() # Span number in the TokenSpans of the program, with compact positions
         
 class Program(AstNode):
     #formal_type = TypeOption(None)
     statements = Node()
             
+def unrollStatement(statement):
+    """
+    :returns: A list of statement followed by the statements which follow it on
+              the same line within any MarkerStatements, which are detached from
+              their markers. Empty if statement is None.
+    """
+    statements = []
+    while statement is not None:
+        statements.append(statement)
+        if isinstance(statement, MarkerStatement):
+            following = statement.followingStatement
+            statement.followingStatement = None
+            statement = following
+        else:
+            statement = None
+    return statements
+
+# A flat list of statements. Empty statements are dropped, and the statement
+# following a MarkerStatement is moved to immediately after it, as the list is
+# built, and each statement added has its parent references set.
 class StatementList(AstNode):
     formal_type = TypeOption(None)
     statements = [Node()]
 
     def prepend(self, statement):
-        self.statements.insert(0, statement)
+        self.statements[0:0] = unrollStatement(statement)
+        self._adoptAll(self.statements, 'statements')
 
     def append(self, statement):
-        self.statements.append(statement)
+        start = len(self.statements)
+        self.statements.extend(unrollStatement(statement))
+        self._adoptAll(self.statements, 'statements', start)
         
     def extend(self, statement_list):
+        start = len(self.statements)
         self.statements.extend(statement_list.statements)
+        self._adoptAll(self.statements, 'statements', start)
         
 class MarkerStatement(AstStatement):
     following_statement = Node()
@@ -56,6 +84,7 @@ class DimList(AstNode):
     items = [Node()]
     
     def append(self, node):
+        self._adopt(node, 'items', len(self.items))
         self.items.append(node)
 
 class AllocateArray(AstStatement):
@@ -122,12 +151,13 @@ class Palette(AstStatement):
 
 class Case(AstStatement):
     condition    = Node(ScalarOwlType())
-    when_clauses = Node()
+    when_clauses = [Node()]
     
 class WhenClauseList(AstNode):
     clauses = [Node()]
     
     def append(self, when_clause):
+        self._adopt(when_clause, 'clauses', len(self.clauses))
         self.clauses.append(when_clause)
 
 class WhenClause(AstNode):
@@ -230,7 +260,7 @@ class Goto(AstStatement):
 class OnGoto(AstStatement):
     switch = Node(formalType=IntegerOwlType())
     target_logical_lines = Node()
-    out_of_range_clause = Node()
+    out_of_range_clause = [Node()]
 
 class Gosub(AstStatement):
     target_logical_line = Node(formalType=IntegerOwlType())
@@ -251,6 +281,7 @@ class InputList(AstNode):
     items = [Node()]
 
     def append(self, item):
+        self._adopt(item, 'items', len(self.items))
         self.items.append(item)
 
 class InputItem(AstNode):
@@ -264,8 +295,8 @@ class Install(AstStatement):
 
 class If(AstStatement):
     condition = Node(formalType=IntegerOwlType())
-    true_clause = Node()
-    false_clause = Node()
+    true_clause = [Node()]
+    false_clause = [Node()]
 
 class LoadLibrary(AstStatement):
     filename = Node(formalType=StringOwlType())
@@ -366,6 +397,7 @@ class PrintList(AstNode):
     items = [Node()]
 
     def append(self, item):
+        self._adopt(item, 'items', len(self.items))
         self.items.append(item)
 
 class PrintItem(AstNode):
@@ -488,24 +520,30 @@ class VariableList(AstNode):
     variables = [Node()]
 
     def append(self, variable):
+        self._adopt(variable, 'variables', len(self.variables))
         self.variables.append(variable)
 
 class Value(AstNode):
     is_l_value = BoolOption(False)
 
 class Variable(Value):
+    # The id of the identifier in the InternTable of the program
+    __slots__ = ('symbol_id',)
     identifier = StringOption()
 
 class WritableList(AstNode):
     writables = [Node()]
 
     def append(self, writable):
+        self._adopt(writable, 'writables', len(self.writables))
         self.writables.append(writable)
 
 class Array(AstNode):
+    __slots__ = ('symbol_id',)
     identifier = StringOption()
 
 class Indexer(Value):
+    __slots__ = ('symbol_id',)
     identifier = StringOption()
     indices = Node()
 
@@ -522,6 +560,7 @@ class VduList(AstNode):
     items = [Node()]
 
     def append(self, item):
+        self._adopt(item, 'items', len(self.items))
         self.items.append(item)
 
 class VduItem(AstNode):
@@ -544,18 +583,21 @@ class ExpressionList(AstNode):
     expressions = [Node()]
     
     def append(self, expr):
+        self._adopt(expr, 'expressions', len(self.expressions))
         self.expressions.append(expr)
 
 class ActualArgList(AstNode):
     arguments = [Node()]
     
     def append(self, arg):
+        self._adopt(arg, 'arguments', len(self.arguments))
         self.arguments.append(arg)
 
 class FormalArgList(AstNode):
     arguments = [Node()]
 
     def append(self, arg):
+        self._adopt(arg, 'arguments', len(self.arguments))
         self.arguments.append(arg)
 
 class FormalArgument(AstNode):
@@ -0,0 +1,601 @@
+'''
+A compact binary serialization of ASTs, with which parsed programs are cached.
+
+The serialized form begins with a magic string and a format version, followed
+by marshalled tables of the node classes, strings, types, integers and sets of
+attributes referred to by the nodes, and of the attributes of the Program. The
+nodes follow in post-order, so each refers back to its children. Each node is
+written as
+
+    the number of its layout in the table of layouts, a layout being a class
+    and a mask of the options which differ from their defaults,
+    the values of those options,
+    its symbol id, if it is a Variable, Array or Indexer,
+    a number for each of its children, followed by the numbers of the
+    children in a list of children,
+    the number of the set of attributes held in its instance dictionary, if
+    it has any,
+
+where the mask has a further bit set if the node has attributes, and each
+number is an unsigned varint. A node is referred to by
+the number of nodes written since it, counting the node itself, which is usually
+a single byte, and zero stands for an empty child. The number for a child is
+twice that reference, or for a list of children twice its length plus one,
+since the passes which simplify the AST change which children of a class are
+held in lists. Option values are tagged, and integer values are taken in turn
+from the table of integers.
+
+The table of layouts holds the names of the children and options of each class
+as well as its name, so that an AST serialized with different node classes is
+rejected rather than misread. Each layout is restored by a function generated
+for it, which reads just the options set in its mask. The parent references of
+the nodes are restored as they are linked to their parents, so the AST is
+identical to that returned by the parser. Only the tokens which begin or end a
+span are kept in the TokenSpans table of the Program, whose positions are
+encoded as varints of their differences.
+'''
+
+import gc
+import sys
+import marshal
+import re
+import struct
+from itertools import imap
+from operator import add
+
+from . import ast
+from .ast_meta import AstNode
+from .intern_table import InternTable, SYMBOL_NODES, LITERAL_NODES
+from .token_spans import TokenSpans
+from cfg_vertex import CfgVertex
+from typing import type_system
+
+MAGIC = 'OWLAST'
+
+# Increment when the layout of the serialized form changes
+FORMAT_VERSION = 3
+
+# The tags of option values
+(TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STRING, TAG_TYPE, TAG_NODE) = range(8)
+
+# The attributes of the Program which are serialized in the tables
+PROGRAM_ATTRIBUTES = ('intern_table', 'token_spans')
+
+# The attributes of the Program which are rebuilt by the compiler, rather than serialized
+TRANSIENT_ATTRIBUTES = ('node_index',)
+
+# The types of the values of attributes held in instance dictionaries
+MARSHALLED_TYPES = (type(None), bool, int, long, float, basestring)
+
+DOUBLE = struct.Struct('<d')
+
+# The varints of more than one byte in a string of varints
+MULTI_BYTE_VARINT = re.compile('[\x80-\xff]+[\x00-\x7f]')
+
+class SerializationError(Exception):
+    '''Raised for an AST which cannot be serialized, or data which cannot be loaded.'''
+    pass
+
+def writeVarint(out, value):
+    '''Append the unsigned varint encoding of value to the bytearray out.'''
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def readVarint(data, pos):
+    '''
+    :returns: A 2-tuple of the unsigned varint at pos in the bytearray data, and the
+              position following it.
+    '''
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def writeVarints(values):
+    '''
+    :returns: A string holding the unsigned varint encodings of the values.
+    '''
+    out = bytearray()
+    for value in values:
+        writeVarint(out, value)
+    return str(out)
+
+def readVarints(encoded):
+    '''
+    :param encoded: A string returned by writeVarints()
+    :returns: A sequence of the values of the varints in encoded.
+    '''
+    data = bytearray(encoded)
+    values = []
+    pos = 0
+    # The runs of varints of a single byte between the longer ones are copied whole
+    for match in MULTI_BYTE_VARINT.finditer(encoded):
+        values.extend(data[pos:match.start()])
+        value, pos = readVarint(data, match.start())
+        values.append(value)
+    if pos == 0:
+        return data
+    values.extend(data[pos:])
+    return values
+
+def zigzag(value):
+    '''
+    :returns: The signed value mapped to an unsigned one, so small magnitudes stay small.
+    '''
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def accumulate(totals, differences, signed=False):
+    '''
+    Append the running totals of differences to the array totals, where the
+    differences are zigzag encoded if signed.
+    '''
+    append = totals.append
+    total = 0
+    if signed:
+        for difference in differences:
+            total += (difference >> 1) ^ -(difference & 1)
+            append(total)
+    else:
+        for difference in differences:
+            total += difference
+            append(total)
+
+def encodeTokenSpans(table):
+    '''
+    :param table: A TokenSpans table
+    :returns: A tuple of strings encoding the spans of table, and the positions of
+              only those tokens which begin or end a span, since no others are
+              referred to. The tokens are renumbered in order, so their starts and
+              lines are encoded as varints of the differences between successive
+              values, and their ends as the differences from their starts.
+    '''
+    count = len(table)
+    firsts = [first % count for first in table.span_firsts] if count else []
+    lasts = [last % count for last in table.span_lasts] if count else []
+    tokens = sorted(set(firsts) | set(lasts))
+    numbers = dict((token, number) for number, token in enumerate(tokens))
+    starts = [table.token_starts[token] for token in tokens]
+    lines = [table.token_lines[token] for token in tokens]
+    firsts = [numbers[first] for first in firsts]
+    return (writeVarints(start - previous for start, previous in zip(starts, [0] + starts)),
+            writeVarints(table.token_ends[token] - table.token_starts[token] for token in tokens),
+            writeVarints(line - previous for line, previous in zip(lines, [0] + lines)),
+            writeVarints(zigzag(first - previous) for first, previous in zip(firsts, [0] + firsts)),
+            writeVarints(numbers[last] - first for first, last in zip(firsts, lasts)),
+            table.span_to_starts.tostring())
+
+def decodeTokenSpans(encoded):
+    '''
+    :param encoded: A tuple returned by encodeTokenSpans()
+    :returns: A TokenSpans table with the spans and token positions encoded.
+    '''
+    starts, lengths, lines, firsts, lasts, to_starts = encoded
+    table = TokenSpans()
+    accumulate(table.token_starts, readVarints(starts))
+    table.token_ends.extend(imap(add, table.token_starts, readVarints(lengths)))
+    accumulate(table.token_lines, readVarints(lines))
+    accumulate(table.span_firsts, readVarints(firsts), signed=True)
+    table.span_lasts.extend(imap(add, table.span_firsts, readVarints(lasts)))
+    table.span_to_starts.fromstring(to_starts)
+    return table
+
+def postOrder(root):
+    '''
+    :returns: The nodes of the subtree rooted at root in post-order, including
+              any nodes held in options, which precede the nodes holding them.
+    '''
+    # The reverse of the pre-order in which the last dependency of each node is
+    # visited first
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        for name in node._child_names:
+            child = getattr(node, name)
+            if isinstance(child, list):
+                stack.extend(subchild for subchild in child if isinstance(subchild, AstNode))
+            elif isinstance(child, AstNode):
+                stack.append(child)
+        for name in node._option_names:
+            value = getattr(node, name)
+            if isinstance(value, AstNode):
+                stack.append(value)
+    order.reverse()
+    return order
+
+def inlineWriteVarint(expression, indent):
+    '''
+    :returns: Source lines which append the varint encoding of expression to
+              out, appending varints of one byte inline.
+    '''
+    return [indent + line % {'expression': expression} for line in (
+        "value = %(expression)s",
+        "if value < 0x80:",
+        "    out.append(value)",
+        "else:",
+        "    writeVarint(out, value)")]
+
+def writerSource(cls):
+    '''
+    :returns: The source of a function which appends the serialized form of a
+              node of cls to out, after the nodes it refers to have been
+              numbered in node_numbers by the Writer. The options and children
+              of the class are unrolled into straight-line code.
+    '''
+    lines = ["def write(node, writer, out, node_numbers):",
+             "    number = len(node_numbers)",
+             "    mask = 0"]
+    for bit, name in enumerate(cls._option_names):
+        lines += ["    if node.%s is not default_%s:" % (name, name),
+                  "        mask |= %d" % (1 << bit)]
+    attributes_bit = 1 << len(cls._option_names)
+    lines += ["    attributes = node.__dict__",
+              "    if attributes:",
+              "        attributes = writer.nodeAttributes(attributes)",
+              "        if attributes:",
+              "            mask |= %d" % attributes_bit]
+    lines += inlineWriteVarint("writer.number((cls, mask), writer.layout_numbers, writer.layouts)", '    ')
+    for bit, name in enumerate(cls._option_names):
+        # Integers are written inline
+        lines += ["    if mask & %d:" % (1 << bit),
+                  "        if node.%s.__class__ is int:" % name,
+                  "            out.append(%d)" % TAG_INT,
+                  "            writer.ints.append(node.%s)" % name,
+                  "        else:",
+                  "            writer.writeValue(node.%s)" % name]
+    if issubclass(cls, SYMBOL_NODES):
+        lines += inlineWriteVarint("node.symbol_id", '    ')
+    for name in cls._child_names:
+        lines += ["    child = node.%s" % name,
+                  "    if child is None:",
+                  "        out.append(0)",
+                  "    elif isinstance(child, list):"]
+        lines += inlineWriteVarint("2 * len(child) + 1", '        ')
+        lines += ["        for subchild in child:"]
+        lines += inlineWriteVarint("number - node_numbers[id(subchild)] if subchild is not None else 0",
+                                   '            ')
+        lines += ["    else:"]
+        lines += inlineWriteVarint("2 * (number - node_numbers[id(child)])", '        ')
+    lines += ["    if mask & %d:" % attributes_bit]
+    lines += inlineWriteVarint("writer.number(attributes, writer.attribute_numbers, writer.attributes)",
+                               '        ')
+    lines += ["    node_numbers[id(node)] = number"]
+    return '\n'.join(lines) + '\n'
+
+# The writing function of each node class, generated on first use
+_writers = {}
+
+def nodeWriter(cls):
+    '''
+    :returns: The function which writes nodes of cls.
+    :raises SerializationError: If cls is not a node class of the ast module.
+    '''
+    try:
+        return _writers[cls]
+    except KeyError:
+        pass
+    if getattr(ast, cls.__name__, None) is not cls:
+        raise SerializationError("Cannot serialize the node class %s" % cls.__name__)
+    namespace = {'cls': cls, 'writeVarint': writeVarint}
+    for name in cls._option_names:
+        namespace['default_' + name] = cls.option_infos[name].value
+    exec writerSource(cls) in namespace
+    result = _writers[cls] = namespace['write']
+    return result
+
+class Writer(object):
+    '''
+    Serializes an AST, numbering its layouts, strings and types as they are found.
+    '''
+    def __init__(self):
+        self.out = bytearray()
+        self.layout_numbers = {}
+        self.layouts = []
+        self.string_numbers = {}
+        self.strings = []
+        self.type_numbers = {}
+        self.types = []
+        self.ints = []
+        self.attribute_numbers = {}
+        self.attributes = []
+        self.node_numbers = {}
+
+    def number(self, value, numbers, values):
+        try:
+            return numbers[value]
+        except KeyError:
+            number = numbers[value] = len(values)
+            values.append(value)
+            return number
+
+    def writeValue(self, value):
+        out = self.out
+        if value is None:
+            out.append(TAG_NONE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif isinstance(value, (int, long)):
+            out.append(TAG_INT)
+            self.ints.append(value)
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out.extend(DOUBLE.pack(value))
+        elif isinstance(value, basestring):
+            out.append(TAG_STRING)
+            writeVarint(out, self.number(value, self.string_numbers, self.strings))
+        elif isinstance(value, type_system.OwlType):
+            # Only types which are the singleton instance of their class can be restored
+            type_class = value.__class__
+            if getattr(type_system, type_class.__name__, None) is not type_class or type_class() is not value:
+                raise SerializationError("Cannot serialize the type %r" % value)
+            out.append(TAG_TYPE)
+            writeVarint(out, self.number(type_class.__name__, self.type_numbers, self.types))
+        elif isinstance(value, AstNode):
+            out.append(TAG_NODE)
+            writeVarint(out, len(self.node_numbers) - self.node_numbers[id(value)])
+        else:
+            raise SerializationError("Cannot serialize the value %r" % (value,))
+
+    def nodeAttributes(self, attributes):
+        '''
+        :param attributes: The instance dictionary of a node
+        :returns: A tuple of the items of attributes which are serialized with the node
+        '''
+        attributes = tuple((name, value) for name, value in sorted(attributes.items())
+                           if name not in PROGRAM_ATTRIBUTES and name not in TRANSIENT_ATTRIBUTES)
+        for name, value in attributes:
+            if not isinstance(value, MARSHALLED_TYPES):
+                raise SerializationError("Cannot serialize the attribute %s = %r" % (name, value))
+        return attributes
+
+    def write(self, root):
+        out = self.out
+        node_numbers = self.node_numbers
+        for node in postOrder(root):
+            nodeWriter(node.__class__)(node, self, out, node_numbers)
+        intern_table = getattr(root, 'intern_table', None)
+        spellings = None
+        if intern_table is not None:
+            spellings = [self.number(spelling, self.string_numbers, self.strings)
+                         for spelling in intern_table.spellings]
+        token_spans = getattr(root, 'token_spans', None)
+        if token_spans is not None:
+            token_spans = encodeTokenSpans(token_spans)
+        layouts = [(cls.__name__, cls._option_names, cls._child_names, mask) for cls, mask in self.layouts]
+        attributes = [dict(items) for items in self.attributes]
+        tables = marshal.dumps((layouts, self.strings, self.types, self.ints, attributes, spellings, token_spans))
+        header = bytearray(MAGIC)
+        writeVarint(header, FORMAT_VERSION)
+        writeVarint(header, len(tables))
+        return str(header) + tables + str(self.out)
+
+def dumps(root):
+    '''
+    :param root: The root of an AST, usually a Program.
+    :returns: A string holding the serialized AST.
+    :raises SerializationError: If the AST holds a value which cannot be serialized.
+    '''
+    return Writer().write(root)
+
+def inlineVarint(name, indent):
+    '''
+    :returns: Source lines which read the varint at pos in data into the
+              variable called name, reading varints of one or two bytes inline.
+    '''
+    return [indent + line % {'name': name} for line in (
+        "%(name)s = data[pos]",
+        "pos += 1",
+        "if %(name)s >= 0x80:",
+        "    if data[pos] < 0x80:",
+        "        %(name)s = %(name)s & 0x7f | data[pos] << 7",
+        "        pos += 1",
+        "    else:",
+        "        %(name)s, pos = readVarint(data, pos - 1)")]
+
+def restorerSource(cls, mask):
+    '''
+    :returns: The source of a function which restores a node of cls, with the
+              options and attributes given by mask, from the serialized form at
+              pos in data, appends it to the list of nodes and returns the
+              position following it. The options and children of the class are
+              unrolled into straight-line code.
+    '''
+    lines = ["def restore(data, pos, nodes, reader, nextInt, strings, attributes, symbol_ids):",
+             "    base = len(nodes)",
+             "    node = new(cls)",
+             "    node.parent = None",
+             "    node._AstNode__symbol_table = None"]
+    if issubclass(cls, CfgVertex):
+        # As set by CfgVertex.__init__
+        lines += ["    node.%s = None" % name for name in CfgVertex.vertex_slots]
+    for bit, name in enumerate(cls._option_names):
+        if not mask & (1 << bit):
+            lines.append("    node.%s = default_%s" % (name, name))
+            continue
+        # Integers, and strings among the first 128 of the table, are read inline
+        lines += ["    if data[pos] == %d:" % TAG_INT,
+                  "        node.%s = nextInt()" % name,
+                  "        pos += 1",
+                  "    elif data[pos] == %d and data[pos + 1] < 0x80:" % TAG_STRING,
+                  "        node.%s = strings[data[pos + 1]]" % name,
+                  "        pos += 2",
+                  "    else:",
+                  "        node.%s, pos = reader.readValue(pos)" % name]
+    if issubclass(cls, SYMBOL_NODES):
+        lines += inlineVarint('number', '    ')
+        lines.append("    node.symbol_id = symbol_ids[number]")
+    elif issubclass(cls, LITERAL_NODES):
+        lines.append("    node.value = reader.literal(node.value)")
+    for name in cls._child_names:
+        property_name = cls._property_names[name]
+        lines += inlineVarint('number', '    ')
+        lines += ["    if number & 1:",
+                  "        children = node.%s = [None] * (number >> 1)" % name,
+                  "        for index in xrange(number >> 1):"]
+        lines += inlineVarint('number', '            ')
+        lines += ["            if number:",
+                  "                child = children[index] = nodes[base - number]",
+                  "                child.parent = node",
+                  "                child.parent_property = %r" % property_name,
+                  "                child.parent_index = index",
+                  "    elif number:",
+                  "        child = node.%s = nodes[base - (number >> 1)]" % name,
+                  "        child.parent = node",
+                  "        child.parent_property = %r" % property_name,
+                  "        child.parent_index = None",
+                  "    else:",
+                  "        node.%s = None" % name]
+    if mask & (1 << len(cls._option_names)):
+        lines += inlineVarint('number', '    ')
+        lines.append("    node.__dict__.update(attributes[number])")
+    lines += ["    nodes.append(node)",
+              "    return pos"]
+    return '\n'.join(lines) + '\n'
+
+# The restoring function of each layout, generated on first use
+_restorers = {}
+
+def restorer(cls, mask):
+    '''
+    :returns: The function which restores nodes of cls with the given mask.
+    '''
+    try:
+        return _restorers[cls, mask]
+    except KeyError:
+        pass
+    namespace = {'new': object.__new__, 'cls': cls, 'readVarint': readVarint}
+    for name in cls._option_names:
+        namespace['default_' + name] = cls.option_infos[name].value
+    exec restorerSource(cls, mask) in namespace
+    result = _restorers[cls, mask] = namespace['restore']
+    return result
+
+class Reader(object):
+    '''
+    Loads a serialized AST, restoring each node with the function generated
+    for its layout.
+    '''
+    def __init__(self, data, intern_table=None):
+        if not data.startswith(MAGIC):
+            raise SerializationError("Not a serialized AST")
+        self.data = bytearray(data)
+        version, pos = readVarint(self.data, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise SerializationError("Unsupported serialized AST version %d" % version)
+        length, pos = readVarint(self.data, pos)
+        tables = marshal.loads(data[pos:pos + length])
+        self.pos = pos + length
+        layouts, self.strings, type_names, ints, self.attributes, self.spellings, self.token_spans = tables
+        self.nextInt = iter(ints).next
+        self.restorers = [restorer(self.nodeClass(name, option_names, child_names), mask)
+                          for name, option_names, child_names, mask in layouts]
+        self.types = [getattr(type_system, name)() for name in type_names]
+        self.intern_table = intern_table if intern_table is not None else InternTable()
+        if self.spellings is not None:
+            # The identifiers refer to the spellings, and take the symbol ids, of the InternTable
+            self.symbol_ids = []
+            for number in self.spellings:
+                symbol_id, self.strings[number] = self.intern_table.intern(self.strings[number])
+                self.symbol_ids.append(symbol_id)
+        else:
+            # Without their spellings the symbol ids are restored as they were serialized
+            self.symbol_ids = xrange(sys.maxint)
+        self.literal = self.intern_table.literal
+        self.nodes = []
+
+    def nodeClass(self, name, option_names, child_names):
+        '''
+        :returns: The node class called name, which must have the given options and children
+        '''
+        cls = getattr(ast, name, None)
+        if not (isinstance(cls, type) and issubclass(cls, AstNode)):
+            raise SerializationError("Unknown node class %s" % name)
+        if cls._option_names != tuple(option_names) or cls._child_names != tuple(child_names):
+            raise SerializationError("The node class %s has changed" % name)
+        return cls
+
+    def readValue(self, pos):
+        '''
+        :returns: A 2-tuple of the tagged value at pos, and the position following it
+        '''
+        data = self.data
+        tag = data[pos]
+        pos += 1
+        if tag == TAG_NONE:
+            return None, pos
+        elif tag == TAG_FALSE:
+            return False, pos
+        elif tag == TAG_TRUE:
+            return True, pos
+        elif tag == TAG_INT:
+            return self.nextInt(), pos
+        elif tag == TAG_FLOAT:
+            return DOUBLE.unpack_from(buffer(data), pos)[0], pos + DOUBLE.size
+        value = data[pos]
+        pos += 1
+        if value >= 0x80:
+            value, pos = readVarint(data, pos - 1)
+        if tag == TAG_STRING:
+            return self.strings[value], pos
+        elif tag == TAG_TYPE:
+            return self.types[value], pos
+        elif tag == TAG_NODE:
+            return self.nodes[len(self.nodes) - value], pos
+        raise SerializationError("Unknown value tag %d" % tag)
+
+    def read(self):
+        data = self.data
+        pos = self.pos
+        end = len(data)
+        nodes = self.nodes
+        restorers = self.restorers
+        nextInt = self.nextInt
+        strings = self.strings
+        attributes = self.attributes
+        symbol_ids = self.symbol_ids
+        while pos < end:
+            number = data[pos]
+            pos += 1
+            if number >= 0x80:
+                number, pos = readVarint(data, pos - 1)
+            pos = restorers[number](data, pos, nodes, self, nextInt, strings, attributes, symbol_ids)
+        if not nodes:
+            raise SerializationError("The serialized AST is empty")
+        root = nodes[-1]
+        if self.spellings is not None:
+            root.intern_table = self.intern_table
+        if self.token_spans is not None:
+            root.token_spans = decodeTokenSpans(self.token_spans)
+        return root
+
+def loads(data, intern_table=None):
+    '''
+    :param data: A string returned by dumps()
+    :param intern_table: The InternTable in which the identifiers and literal
+                         values of the AST are interned, so that ASTs loaded
+                         into the same table can be joined. By default the
+                         AST is interned in a new table.
+    :returns: The root of the AST, with the InternTable and a TokenSpans table
+              if they were serialized.
+    :raises SerializationError: If the data were not serialized by this
+                                version of dumps(), or with other node classes.
+    '''
+    # Restoring the nodes creates many objects, each of which would otherwise
+    # count towards a garbage collection
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return Reader(data, intern_table).read()
+    finally:
+        if gc_enabled:
+            gc.enable()
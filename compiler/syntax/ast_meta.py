@@ -1,10 +1,17 @@
 import re
 import sys
+import keyword
 
 from utility import underscoresToCamelCase, hasprop
 from node import Node
 from options import Option, TypeOption, IntegerOption
 from visitor import Visitable
+
+# The names used by generated constructors, which cannot be their parameters
+CONSTRUCTOR_NAMES = frozenset(['node', 'new', 'cls', 'missing', 'next_init', 'others', 'isinstance', 'list'])
+
+def _isParameter(property_name):
+    return not (keyword.iskeyword(property_name) or property_name in CONSTRUCTOR_NAMES)
         
 class AstMeta(type):
     def __new__(cls, name, bases, dict):  
@@ -24,131 +31,213 @@ class AstMeta(type):
             dict["_description"] = dict['__doc__']
         else:
             dict["_description"] = name
+        
+        # Each child, child list and option is stored in a slot of the same
+        # name, so their declarations are moved out of the class
+        inherited = set(dict["child_infos"]) | set(dict["option_infos"])
+        declared = cls._declarations(dict)
+        slots = list(dict.get("__slots__", ()))
+        for info_name in declared:
+            del dict[info_name]
+            if info_name not in inherited:
+                slots.append(info_name)
+        dict["__slots__"] = tuple(slots)
+        dict["_declared_names"] = tuple(declared)
                 
         return type.__new__(cls, name, bases, dict)
         
-    def __init__(cls, name, bases, dict):
-        """
-        Configure the class that is being created by introspecting its
-        'declaration' and creating getters, setters and properties for its
-        data members.
-        """
-        cls._createChildProperties(name, bases, dict)
-        cls._createChildListProperties(name, bases, dict)
-        cls._createOptionProperties(name, bases, dict)
-        super(AstMeta, cls).__init__(name, bases, dict)
-    
-    # TODO: These methods have a lot of common code.
-    
-    def _createChildProperties(cls, name, bases, dict):    
+    @staticmethod
+    def _declarations(dict):
         """
         Introspect the class being created to look for class members which
-        contain 'declarative' Node objects. Move these declarations into the
-        child_infos class member, and create getters, setters and properties
-        to provide access to each of the child members.
+        contain 'declarative' Node, [Node] and Option objects, and move these
+        declarations into the child_infos and option_infos class members.
+        :returns: The names of the declarations
         """
-        node_infos = {}           
+        node_infos = {}
+        list_infos = {}
+        option_infos = {}
         for info_name, v in dict.items():
             if isinstance(v, Node):
-               node_infos[info_name] = v
-                
-        removal = []
-        for info_name in node_infos.keys():
-           property_name = underscoresToCamelCase(info_name)
-           if info_name != property_name:
-               removal.append(info_name)
-           def _getProperty(self, info_name=info_name):
-               return self._children[info_name]
-           def _setProperty(self, value, info_name=info_name):
-               self._children[info_name] = value
-           if not hasprop(cls, property_name):
-               setattr(cls, property_name, property(_getProperty, _setProperty))
-                        
-        for info_name in removal:
-            delattr(cls, info_name)
-            
-        cls.child_infos.update(node_infos)
-    
-    def _createChildListProperties(cls, name, bases, dict):    
+                node_infos[info_name] = v
+            elif isinstance(v, list) and len(v) > 0 and isinstance(v[0], Node):
+                list_infos[info_name] = v
+            elif isinstance(v, Option):
+                option_infos[info_name] = v
+        dict["child_infos"].update(node_infos)
+        dict["child_infos"].update(list_infos)
+        dict["option_infos"].update(option_infos)
+        return node_infos.keys() + list_infos.keys() + option_infos.keys()
+        
+    def __init__(cls, name, bases, dict):
         """
-        Introspect the class being created to look for class members which
-        contain 'declarative' [Node] objects. Move these declarations into the
-        child_infos class member, and create getters, setters and properties
-        to provide access to each of the child members.
+        Configure the class that is being created by creating properties
+        for its data members, which are stored in slots.
         """
-        list_infos = {}
-        for info_name, v in dict.items():
-            if isinstance(v, list) and isinstance(v[0], Node):
-               list_infos[info_name] = v
-                
-        removal = []
-        for info_name in list_infos.keys():
-           property_name = underscoresToCamelCase(info_name)
-           if info_name != property_name:
-               removal.append(info_name)
-           def _getProperty(self, info_name=info_name):
-               return self._children[info_name]
-           def _setProperty(self, value, info_name=info_name):
-               self._children[info_name] = value
-           if not hasprop(cls, property_name):
-               setattr(cls, property_name, property(_getProperty, _setProperty))
-                        
-        for info_name in removal:
-            delattr(cls, info_name)
-    
-        cls.child_infos.update(list_infos)
-    
-    def _createOptionProperties(cls, name, bases, dict):
+        cls._createProperties()
+        
+        # The names of the children and options in the order of the children
+        # and options dictionaries of each node, and the order in which the
+        # children are visited by forEachChild, which is the iteration order
+        # of a dictionary built in that order
+        cls._child_names = tuple(cls.child_infos)
+        cls._option_names = tuple(cls.option_infos)
+        order = {}
+        for info_name in cls._child_names:
+            order[info_name] = None
+        cls._child_order = tuple(order)
+        # The camel case property of each child and option, and the reverse
+        cls._property_names = {}
+        cls._info_names = {}
+        for info_name in cls._child_names + cls._option_names:
+            property_name = underscoresToCamelCase(info_name)
+            cls._property_names[info_name] = property_name
+            cls._info_names[property_name] = info_name
+        # The camel case properties of the children, which are linked to the
+        # node when they are passed to its constructor
+        cls._child_properties = frozenset(cls._property_names[info_name] for info_name in cls._child_names)
+        # The properties and slots which may be passed to the constructor
+        cls._initialisers = frozenset(attribute for base in cls.__mro__ for attribute in base.__dict__
+                                      if hasprop(cls, attribute))
+        # The constructor generated for the class on first use
+        cls._constructor = None
+        super(AstMeta, cls).__init__(name, bases, dict)
+    
+    def _createProperties(cls):
         """
-        Introspect the class being created to look for class members which
-        contain 'declarative' Option objects. Move these declarations into the
-        option_infos class member, and create getters, setters and properties
-        to provide access to each of the child members.
+        Create a camel case property for each child, child list and option
+        declared by the class, which is the slot in which it is stored.
         """
-        
-        infos = {}
-        for info_name, v in dict.items():
-            if isinstance(v, Option):
-               infos[info_name] = v
-                
-        removal = []
-        for info_name in infos.keys():
-           property_name = underscoresToCamelCase(info_name)
-           if info_name != property_name:
-               removal.append(info_name)
-           def _getProperty(self, info_name=info_name):
-               return self._options[info_name]
-           def _setProperty(self, value, info_name=info_name):
-               self._options[info_name] = value
-           if not hasprop(cls, property_name):
-               setattr(cls, property_name, property(_getProperty, _setProperty))
-                        
-        for info_name in removal:
-            delattr(cls, info_name)
-            
-        cls.option_infos.update(infos)
+        for info_name in cls._declared_names:
+            property_name = underscoresToCamelCase(info_name)
+            if not hasprop(cls, property_name):
+                setattr(cls, property_name, getattr(cls, info_name))
     
     def __call__(cls, *args, **kwargs):
         """
         Called when instances of classes with this metaclass. i.e. AstNodes.
         Consume keyword arguments with the same name as child properties and options then
-        set the appropriate attributes.
-        """        
+        set the appropriate attributes. The parent references of children are set
+        as they are attached, so an AST built by constructors needs no separate
+        pass to set its parents.
+        """
+        if not args:
+            constructor = cls._constructor
+            if constructor is None:
+                constructor = cls._generateConstructor()
+            return constructor(**kwargs)
+        
         # First create the object
         obj = type.__call__(cls, *args)
-                
+        cls._initialise(obj, kwargs)
+        return obj
+    
+    def _initialise(cls, obj, kwargs):
+        """
+        Set the properties of a new node from keyword arguments.
+        """
         for kwarg in kwargs:
-            if hasprop(cls, kwarg):
-                setattr(obj, kwarg, kwargs[kwarg])
+            if kwarg in cls._initialisers:
+                value = kwargs[kwarg]
+                setattr(obj, kwarg, value)
+                if kwarg in cls._child_properties:
+                    if isinstance(value, list):
+                        obj._adoptAll(value, kwarg)
+                    else:
+                        obj._adopt(value, kwarg)
             else:
                 raise AttributeError("No such property initialiser as '%s' on '%s'" % (kwarg, cls.__name__))
         
         # TODO: Should remove consumed kwargs here
-            
-        return obj
+    
+    def _constructorSource(cls):
+        """
+        :returns: The source of a function which constructs a node of the class
+                  from keyword arguments, as AstNode.__init__ followed by
+                  _initialise would, with a parameter for each child and option.
+        """
+        parameters = []
+        lines = ["    node = new(cls)",
+                 "    node.parent = None",
+                 "    node._AstNode__symbol_table = None"]
+        if cls._nextInit() is not None:
+            lines.append("    next_init(node)")
+        for info_name in cls._child_names:
+            property_name = cls._property_names[info_name]
+            default = "[]" if isinstance(cls.child_infos[info_name], list) else "None"
+            if not _isParameter(property_name):
+                # Initialised by name with the other properties
+                lines.append("    node.%s = %s" % (info_name, default))
+                continue
+            parameters.append("%s=missing" % property_name)
+            lines += ["    if %s is missing:" % property_name,
+                      "        node.%s = %s" % (info_name, default),
+                      "    else:",
+                      "        node.%s = %s" % (info_name, property_name),
+                      "        if isinstance(%s, list):" % property_name,
+                      "            node._adoptAll(%s, %r)" % (property_name, property_name),
+                      "        elif %s is not None:" % property_name,
+                      "            %s.parent = node" % property_name,
+                      "            %s.parent_property = %r" % (property_name, property_name),
+                      "            %s.parent_index = None" % property_name]
+        for info_name in cls._option_names:
+            property_name = cls._property_names[info_name]
+            if not _isParameter(property_name):
+                lines.append("    node.%s = default_%s" % (info_name, info_name))
+                continue
+            parameters.append("%s=default_%s" % (property_name, info_name))
+            lines.append("    node.%s = %s" % (info_name, property_name))
+        lines += ["    if others:",
+                  "        cls._initialise(node, others)",
+                  "    return node"]
+        parameters.append("**others")
+        return "def construct(%s):\n%s\n" % (", ".join(parameters), "\n".join(lines))
+    
+    def _generateConstructor(cls):
+        """
+        Generate the constructor of the class, which is regenerated if its
+        child_infos are changed by setChildInfo.
+        :returns: The constructor
+        """
+        if cls.__init__.im_func is not AstNode.__init__.im_func:
+            # Classes with their own initialiser are constructed as usual
+            def construct(**kwargs):
+                obj = type.__call__(cls)
+                cls._initialise(obj, kwargs)
+                return obj
+        else:
+            namespace = {'new': object.__new__, 'cls': cls, 'missing': object(),
+                         'next_init': cls._nextInit()}
+            for info_name, option in cls.option_infos.items():
+                namespace['default_' + info_name] = option.value
+            exec cls._constructorSource() in namespace
+            construct = namespace['construct']
+        cls._constructor = staticmethod(construct)
+        return construct
+    
+    def _nextInit(cls):
+        """
+        :returns: The initialiser which AstNode.__init__ calls through super(),
+                  or None if it is that of object.
+        """
+        mro = cls.__mro__
+        for base in mro[mro.index(AstNode) + 1:]:
+            if '__init__' in base.__dict__:
+                return None if base is object else base.__dict__['__init__']
+        
+    def setChildInfo(cls, info_name, info):
+        """
+        Replace the declaration of a child of the class, such as with that of a
+        node which is elided from the AST.
+        """
+        cls.child_infos[info_name] = info
+        cls._constructor = None
             
 class AstNode(Visitable):
     __metaclass__ = AstMeta
+    # Attributes which later passes add to some nodes are kept in an instance
+    # dictionary, which is only allocated when the first is set
+    __slots__ = ('parent', 'parent_property', 'parent_index', '__symbol_table', '__dict__')
     
     formal_type = TypeOption()
     actual_type = TypeOption()
@@ -160,34 +249,33 @@ class AstNode(Visitable):
         self.__symbol_table = None
         
         # Initialise children
-        self._children = {}
         for info_name, info in self.child_infos.items():
             if isinstance(info, Node):
-                self._children[info_name] = None
+                setattr(self, info_name, None)
             elif isinstance(info, list):
-                self._children[info_name] = []
+                setattr(self, info_name, [])
         
-        self._options = {}
         for info_name, option in self.option_infos.items():
-            self._options[info_name] = option.value
+            setattr(self, info_name, option.value)
         super(AstNode, self).__init__()
         
     # Children accessor
     
     def _getChildren(self):
-        return self._children
+        return dict((info_name, getattr(self, info_name)) for info_name in self._child_names)
     
     children = property(_getChildren)
     
     # Options accessor
     
     def _getOptions(self):
-        return self._options
+        return dict((info_name, getattr(self, info_name)) for info_name in self._option_names)
     
     options = property(_getOptions)
     
     def forEachChild(self, f):
-        for child in self.children.values():
+        for info_name in self._child_order:
+            child = getattr(self, info_name)
             if isinstance(child, list):
                 for subchild in child:
                     f(subchild)
@@ -202,12 +290,30 @@ class AstNode(Visitable):
             if isinstance(child, list):
                 for index, subchild in enumerate(child):
                     if subchild is search_child:
-                        return (underscoresToCamelCase(name), index)
+                        return (self._property_names[name], index)
             else:
                 if child is search_child:
-                   return (underscoresToCamelCase(name), None)
+                   return (self._property_names[name], None)
         return (None, None) 
     
+    def _adopt(self, child, property_name, index=None):
+        """
+        Set the parent references of child, which is held by this node in the
+        property called property_name, at index if that property is a list.
+        """
+        if child is not None:
+            child.parent = self
+            child.parent_property = property_name # The property through which the parent can be accessed.
+            child.parent_index = index
+    
+    def _adoptAll(self, children, property_name, start=0):
+        """
+        Set the parent references of the children in the list held by this node
+        in the property called property_name, from index start onwards.
+        """
+        for index in xrange(start, len(children)):
+            self._adopt(children[index], property_name, index)
+    
     def _getDescription(self):
         return self._description or self.__class__.__name__
     
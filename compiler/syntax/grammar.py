@@ -5,17 +5,51 @@ import ply.yacc as yacc
 # Get the token map from the lexer.  This is required.
 from .lexer import tokens
 from .ast import *
-
-
-def setDebuggingPositions(p):
-    if p is not None and p[0] is not None:
-        # If it hasn't already been set by more specialised code
-        if p[0].startLine is None:
-            #print "Assigning line numbers"
-            p[0].startLine, p[0].endLine = p.linespan(1)
-            # Note: endPos here will be *before* the last token - it can be refined later
-            p[0].startPos, p[0].endPos = p.lexspan(1)
-        #print p[0].startLine, p[0].endLine, p[0].startPos, p[0].endPos
+from .token_spans import SpanRecordingLexer
+
+
+def setDebuggingPositions(p, node=None, last=None, end=None):
+    '''
+    Set the source positions of a statement, unless they have already been set
+    by more specialised code, and its line number if that has not been set. With
+    compact positions the statement is given a span of the tokens recorded by the
+    SpanRecordingLexer. Otherwise its positions are those tracked by the parser,
+    in which the end position is the start of the last token, and is refined
+    later by SourceDebuggingVisitor to the statement separator which follows.
+    Both give the same positions once refined.
+    :param p: The YaccProduction of the rule being reduced
+    :param node: The statement, by default p[0]
+    :param last: The index of the token with which the statement ends, if it does
+                 not cover the whole rule.
+    :param end: The index of the symbol at the start of which the statement ends,
+                for the header of an IF, or a DEF or REPEAT, which is not
+                separated from the statement following it on the same line.
+    '''
+    if node is None:
+        node = p[0]
+    if node is None:
+        return
+    if isinstance(p.lexer, SpanRecordingLexer):
+        if node.span is None:
+            if end is not None:
+                node.span = p.lexer.span(p, last=p.lexer.firstToken(p, end), to_start=True)
+            elif last is not None:
+                node.span = p.lexer.span(p, last=p.lexer.firstToken(p, last))
+            else:
+                node.span = p.lexer.span(p)
+        if node.lineNum is None:
+            node.lineNum = p.lexer.spans.startLine(node.span) - 1
+        return
+    if node.startLine is None:
+        if end is not None or last is not None:
+            last_symbol = end if end is not None else last
+            node.startLine, node.endLine = p.lineno(1), p.lineno(last_symbol)
+            node.startPos, node.endPos = p.lexpos(1), p.lexpos(last_symbol)
+        else:
+            node.startLine, node.endLine = p.linespan(1)
+            node.startPos, node.endPos = p.lexspan(1)
+    if node.lineNum is None:
+        node.lineNum = node.startLine - 1
 
 logger = logging.getLogger('bbc_grammar')
 
@@ -204,9 +238,10 @@ def p_call_stmt(p):
 # must begin on a new line.
 def p_case_stmt(p):
     '''case_stmt : CASE expr OF stmt_terminator when_clause_list ENDCASE'''
-    p[0] = Case(condition = p[2], whenClauses = p[5])
+    p[0] = Case(condition = p[2], whenClauses = p[5].clauses)
     p[0].lineNum = p.lineno(1) - 1
-    setDebuggingPositions(p)
+    # The statement is its CASE ... OF line
+    setDebuggingPositions(p, last=3)
 
 def p_when_clause_list(p):
     '''when_clause_list : when_clause
@@ -303,18 +338,14 @@ def p_def_fn_stmt(p):
     
     if len(p) == 4:
         p[0] = DefineFunction(name = p[2], followingStatement = p[3])
-        end_pos = p.lexpos(2)
+        end = 2
     elif len(p) == 7:
         p[0] = DefineFunction(name = p[2], formalParameters = p[4], followingStatement = p[6])
-        end_pos = p.lexpos(5)
+        end = 5
         
     #print "Assigning DEF PROC line numbers"
     p[0].lineNum = p.lineno(1) - 1
-    p[0].startLine = p.lineno(1)
-    p[0].endLine = p.lineno(1)
-    p[0].startPos = p.lexpos(1)
-    assert end_pos is not None
-    p[0].endPos = end_pos
+    setHeaderPositions(p, end)
     
 def p_end_fn_stmt(p):
     '''end_fn_stmt : EQ expr %prec UEQUAL'''
@@ -326,18 +357,27 @@ def p_def_proc_stmt(p):
                      | DEF PROC_ID LPAREN formal_arg_list RPAREN statement'''
     if len(p) == 4:
         p[0] = DefineProcedure(name = p[2], followingStatement = p[3])
-        end_pos = p.lexpos(2)
+        end = 2
     elif len(p) == 7:
         p[0] = DefineProcedure(name = p[2], formalParameters = p[4], followingStatement = p[6])
-        end_pos = p.lexpos(5)
+        end = 5
     
     #print "Assigning DEF PROC line numbers"
     p[0].lineNum = p.lineno(1) - 1
-    p[0].startLine = p.lineno(1)
-    p[0].endLine = p.lineno(1)
-    p[0].startPos = p.lexpos(1)
-    assert end_pos is not None
-    p[0].endPos = end_pos
+    setHeaderPositions(p, end)
+
+def setHeaderPositions(p, end):
+    '''
+    Set the positions of a DEF or REPEAT statement, which covers its header up
+    to the token at index end - the name, or the closing parenthesis of the
+    formal arguments, or the REPEAT - but not the statement following it. If
+    that statement is on the same line, with no separator between them, the
+    header ends at the start of the token.
+    '''
+    if p[len(p) - 1] is None:
+        setDebuggingPositions(p, last=end)
+    else:
+        setDebuggingPositions(p, end=end)
     
 def p_endproc_stmt(p):
     '''endproc_stmt : ENDPROC'''
@@ -532,9 +572,9 @@ def p_on_goto_stmt(p):
                     | ON expr GOTO expr_list ELSE multi_statement'''
     # TODO ELSE clause
     if len(p) == 5:
-        p[0] = OnGoto(switch = p[2], targetLogicalLines = p[4])
+        p[0] = OnGoto(switch = p[2], targetLogicalLines = p[4], outOfRangeClause = None)
     elif len(p) == 7:
-        p[0] = OnGoto(switch = p[2], targetLogicalLines = p[4], outOfRangeClause = p[6])
+        p[0] = OnGoto(switch = p[2], targetLogicalLines = p[4], outOfRangeClause = clauseStatements(p[6]))
     p[0].lineNum = p.lineno(1) - 1
     
 # GOSUB statement
@@ -562,26 +602,30 @@ def p_if_single_stmt(p):
 
     # Specialised debugging lexer positions set in here       
     if len(p) == 4:
-        p[0] = If(condition = p[2], trueClause = p[3])
-        end_pos = p.lexpos(3)
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[3]), falseClause = None)
+        true_clause = 3
     elif len(p) == 5:
-        p[0] = If(condition = p[2], trueClause = p[4])
-        end_pos = p.lexpos(4)
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[4]), falseClause = None)
+        true_clause = 4
     elif len(p) == 6:
-        p[0] = If(condition = p[2], trueClause = p[3], falseClause = p[5])
-        end_pos = p.lexpos(3)
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[3]), falseClause = clauseStatements(p[5]))
+        true_clause = 3
     elif len(p) == 7:
-        p[0] = If(condition = p[2], trueClause = p[4], falseClause = p[6])
-        end_pos = p.lexpos(4)
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[4]), falseClause = clauseStatements(p[6]))
+        true_clause = 4
 
     #print "Assigning IF line numbers"
     p[0].lineNum = p.lineno(1) - 1
-    p[0].startLine = p.lineno(1)
-    p[0].endLine = p.lineno(1)
-    p[0].startPos = p.lexpos(1)
-    assert end_pos is not None
-    p[0].endPos = end_pos
+    # The statement ends before its true clause
+    setDebuggingPositions(p, end=true_clause)
     
+def clauseStatements(statement_list):
+    """
+    :returns: The list of statements of a clause of an IF or ON statement, or
+              None if the clause has no statements.
+    """
+    return statement_list.statements or None
+
 # The clause is only used with IF statements and
 # possible ON statements when the result of an expression
 # is interpreted as a line number to GOTO
@@ -594,11 +638,7 @@ def p_implicit_goto(p):
     '''implicit_goto : factor'''
     stmt_list = StatementList()
     goto = Goto(targetLogicalLine = p[1])
-    goto.lineNum = p.lineno(1) - 1
-    goto.startLine = p.lineno(1)
-    goto.endLine = p.lineno(1)
-    goto.startPos = p.lexpos(1)
-    goto.endPos = p.lexpos(1)
+    setDebuggingPositions(p, goto)
     stmt_list.append(goto)
     p[0] = stmt_list
         
@@ -606,10 +646,12 @@ def p_if_multi_stmt(p):
     '''if_multi_stmt : IF expr THEN statement_list ENDIF
                      | IF expr THEN statement_list ELSE statement_list ENDIF'''
     if len(p) == 6:
-        p[0] = If(condition = p[2], trueClause = p[4])
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[4]), falseClause = None)
     elif len(p) == 8:
-        p[0] = If(condition = p[2], trueClause = p[4], falseClause = p[6])
+        p[0] = If(condition = p[2], trueClause = clauseStatements(p[4]), falseClause = clauseStatements(p[6]))
     p[0].lineNum = p.lineno(1) - 1
+    # The statement ends at its ENDIF
+    setDebuggingPositions(p, end=len(p) - 1)
     
 # The syntax rules for FOR..NEXT loops are not implemented by the
 # grammar owing to the fact that NEXT is treated as a statement,
@@ -932,6 +974,7 @@ def p_repeat_stmt(p):
     '''repeat_stmt : REPEAT statement'''
     p[0] = Repeat(followingStatement = p[2])
     p[0].lineNum = p.lineno(1) - 1
+    setHeaderPositions(p, 1)
 
 def p_restore_stmt(p):
     '''restore_stmt : RESTORE
@@ -1788,7 +1831,6 @@ def p_str_str_func(p):
     '''str_str_func : str_str_dec_func
                     | str_str_hex_func'''
     p[0] = p[1]
-    p[0].lineNum = p.lineno(1) - 1
     
 def p_str_str_dec_func(p):
     'str_str_dec_func : STR_STR expr %prec FUNCTION'
@@ -1868,9 +1910,17 @@ def p_channel(p):
 #=============================================================================#
 # VARIABLE
 
+def internSymbol(p):
+    '''
+    Give the node being reduced the symbol id of its identifier, from the
+    InternTable of the program being parsed.
+    '''
+    p[0].symbol_id, p[0].identifier = p.parser.intern_table.intern(p[0].identifier)
+
 def p_variable(p):
     'variable : ID'
     p[0] = Variable(identifier = p[1])
+    internSymbol(p)
     p[0].lineNum = p.lineno(1) - 1
 
 def p_variable_list(p):
@@ -1919,11 +1969,13 @@ def p_nullable_writable_list(p):
 def p_array(p):
     'array : ARRAYID_LPAREN RPAREN'
     p[0] = Array(identifier = p[1])
+    internSymbol(p)
     p[0].lineNum = p.lineno(1) - 1
     
 def p_indexer(p):
     'indexer : ARRAYID_LPAREN expr_list RPAREN'
     p[0] = Indexer(identifier = p[1], indices = p[2])
+    internSymbol(p)
     p[0].lineNum = p.lineno(1) - 1
 
 #=============================================================================#
@@ -1937,12 +1989,12 @@ def p_literal(p):
 
 def p_literal_string(p):
     'literal_string : LITERAL_STRING'
-    p[0] = LiteralString(value = p[1])
+    p[0] = LiteralString(value = p.parser.intern_table.literal(p[1]))
     p[0].lineNum = p.lineno(1) - 1
 
 def p_literal_integer(p):
     'literal_integer : LITERAL_INTEGER'
-    p[0] = LiteralInteger(value = p[1])
+    p[0] = LiteralInteger(value = p.parser.intern_table.literal(p[1]))
     p[0].lineNum = p.lineno(1) - 1
 
 def p_literal_float(p):
@@ -1960,6 +2012,13 @@ def p_literal_float(p):
 def p_empty(p):
     'empty :'
     p[0] = None
+    # PLY tracks an empty symbol at the position following the lookahead token,
+    # so a statement ending with one, such as NEXT, would extend beyond its
+    # separator. Place it at the symbol preceding it instead.
+    preceding = p.stack[-1]
+    if hasattr(p.slice[0], 'lexpos') and hasattr(preceding, 'lexpos'):
+        p.slice[0].lineno = getattr(preceding, 'endlineno', preceding.lineno)
+        p.slice[0].lexpos = getattr(preceding, 'endlexpos', preceding.lexpos)
 
 #=============================================================================#
 # ERRORS
@@ -0,0 +1,70 @@
+'''
+Interning of the identifiers and literal values of a program.
+
+The parser gives each Variable, Array and Indexer the symbol id of its
+identifier from an InternTable, which is attached to the Program as its
+intern_table attribute. Every occurrence of an identifier refers to the same
+string, and has the same small integer symbol id, so later passes can compare
+and index identifiers by symbol id rather than by hashing and comparing their
+spellings. Identical literal strings and integers are also held once.
+
+Literal nodes themselves are not shared, since each has its own parent and may
+be replaced by the type checker, but they share their values.
+'''
+
+from .ast import Variable, Array, Indexer, LiteralString, LiteralInteger
+
+# The nodes which have a symbol id
+SYMBOL_NODES = (Variable, Array, Indexer)
+
+# The literal nodes whose values are interned
+LITERAL_NODES = (LiteralString, LiteralInteger)
+
+class InternTable(object):
+    '''
+    The identifier spellings of a program, indexed by their symbol ids, which
+    are allocated from zero in the order in which the spellings are first
+    interned, and the literal values of the program.
+    '''
+    def __init__(self):
+        self.spellings = []
+        self.__symbol_ids = {}
+        self.__literals = {}
+
+    def __len__(self):
+        return len(self.spellings)
+
+    def intern(self, spelling):
+        '''
+        :param spelling: The spelling of an identifier
+        :returns: A 2-tuple of the symbol id of the spelling, and the interned
+                  string with that spelling.
+        '''
+        symbol_id = self.__symbol_ids.get(spelling)
+        if symbol_id is None:
+            symbol_id = self.__symbol_ids[spelling] = len(self.spellings)
+            self.spellings.append(spelling)
+        return symbol_id, self.spellings[symbol_id]
+
+    def symbolId(self, spelling):
+        '''
+        :returns: The symbol id of spelling, or None if it has not been interned
+        '''
+        return self.__symbol_ids.get(spelling)
+
+    def spelling(self, symbol_id):
+        '''
+        :returns: The spelling of the identifier with the given symbol id
+        '''
+        return self.spellings[symbol_id]
+
+    def literal(self, value):
+        '''
+        :param value: The value of a literal string or integer
+        :returns: The first equal value of the same type to have been interned
+        '''
+        # Values of different types are kept apart, since 1 == 1L
+        values = self.__literals.get(value.__class__)
+        if values is None:
+            values = self.__literals[value.__class__] = {}
+        return values.setdefault(value, value)
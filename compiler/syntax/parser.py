@@ -1,26 +1,172 @@
 import sys
+import os
+import re
+import imp
+import time
 import logging
+from bisect import bisect_left, bisect_right
 
 import ply.lex as lex
 import ply.yacc as yacc
 
 import grammar
 import lexer
+from token_stream import TokenStreamLexer
+from trie_lexer import TrieLexer
+from token_spans import SpanRecordingLexer
+from intern_table import InternTable
+import ast_cache
+from . import ast, ast_meta
+from .ast import If, Case, Program, StatementList
+from .position_shifts import PositionShifts, shiftPositions
 
 __author__ = 'rjs'
 
+# Increment to invalidate the cached lexer and parser tables of earlier versions
+TABLE_VERSION = 1
+
+def userCacheDirectory():
+    '''
+    :returns: The per-user cache directory for OWL BASIC, since the directory of
+              this package may not be writable.
+    '''
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'owl-basic')
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'owl-basic')
+
+# The default directory for cached tables
+TABLE_DIR = os.path.join(userCacheDirectory(), 'tables')
+
+LEXTAB_PREFIX = 'lextab_'
+PARSETAB_PREFIX = 'parsetab_'
+AST_CACHE_PREFIX = 'ast_'
+
+# The names of the text lexer engines
+PLY_LEXER = 'ply'
+TRIE_LEXER = 'trie'
+
+# The lexers and parser are built once per process, and reused for each parse
+_lexers = {}
+_parser = None
+
+def updateWithSources(sig, modules):
+    '''
+    Update the hash sig with the source of each of modules.
+    '''
+    for module in modules:
+        source_filename = os.path.splitext(module.__file__)[0] + '.py'
+        f = open(source_filename, 'rb')
+        sig.update(f.read())
+        f.close()
+
+def tableKey():
+    '''
+    :returns: A string identifying the lexer and parser tables built from the current
+              grammar and lexer modules, with the current version of PLY.
+    '''
+    try:
+        from hashlib import md5
+    except ImportError:
+        from md5 import md5
+    sig = md5()
+    sig.update(str(TABLE_VERSION))
+    sig.update(lex.__version__)
+    sig.update(yacc.__tabversion__)
+    updateWithSources(sig, (grammar, lexer))
+    return sig.hexdigest()
+
+def tableDirectory(options):
+    '''
+    :returns: The directory for cached tables, which is created if necessary,
+              or None if the tables cannot be cached.
+    '''
+    table_dir = getattr(options, 'table_dir', None) or TABLE_DIR
+    if not os.path.isdir(table_dir):
+        try:
+            os.makedirs(table_dir)
+        except OSError:
+            logging.warning("Cannot create table directory %s", table_dir)
+            return None
+    if not os.access(table_dir, os.W_OK):
+        logging.warning("Cannot write to table directory %s", table_dir)
+        return None
+    return table_dir
+
+def removeStaleTables(table_dir, key):
+    '''
+    Remove cached tables for keys other than key from table_dir.
+    '''
+    for filename in os.listdir(table_dir):
+        if filename.startswith(LEXTAB_PREFIX) or filename.startswith(PARSETAB_PREFIX):
+            if key not in filename:
+                try:
+                    os.remove(os.path.join(table_dir, filename))
+                except OSError:
+                    pass
+
+def lexerEngine(options):
+    '''
+    :returns: The name of the text lexer engine selected by the options.
+    '''
+    engine = getattr(options, 'lexer', None) or PLY_LEXER
+    if engine not in (PLY_LEXER, TRIE_LEXER):
+        raise ValueError, "Unknown lexer engine '%s'" % engine
+    return engine
+
 def buildLexer(options):
+    '''
+    Build a text lexer. The PLY lexer is built from cached tables if they are
+    available. The trie lexer is built directly from the lexer module, which
+    is quicker than loading the PLY tables.
+    '''
     logging.debug("buildLexer")
     if options.verbose:
         sys.stderr.write("Building lexer...")
-    # Build the lexer and parser
-
-    lx = lex.lex(lexer)
+    start_time = time.time()
+    if lexerEngine(options) == TRIE_LEXER:
+        lx = TrieLexer(lexer)
+        source = "lexer module"
+    else:
+        table_dir = tableDirectory(options)
+        if table_dir is None:
+            lx = lex.lex(lexer)
+            source = "lexer module"
+        else:
+            key = tableKey()
+            lextab = LEXTAB_PREFIX + key
+            lextab_filename = os.path.join(table_dir, lextab + '.py')
+            if os.path.exists(lextab_filename):
+                lx = lex.lex(lexer, optimize=1, lextab=imp.load_source(lextab, lextab_filename))
+                source = "cached tables"
+            else:
+                # Validate the lexer rules when building the tables
+                removeStaleTables(table_dir, key)
+                lx = lex.lex(lexer)
+                lx.writetab(lextab, table_dir)
+                source = "lexer module"
+    elapsed = time.time() - start_time
+    logging.debug("Built lexer from %s in %.3fs", source, elapsed)
     if options.verbose:
-        sys.stderr.write("done\n")
+        sys.stderr.write("done (%.3fs)\n" % elapsed)
 
     return lx
 
+def sharedLexer(options):
+    '''
+    :returns: The text lexer for this process with the engine selected by the
+              options, built on first use.
+    '''
+    engine = lexerEngine(options)
+    if engine not in _lexers:
+        _lexers[engine] = buildLexer(options)
+    return _lexers[engine]
+
+def buildTokenStreamLexer(options):
+    '''Build a lexer which lexes tokenised programs without detokenising them.'''
+    logging.debug("buildTokenStreamLexer")
+    return TokenStreamLexer(sharedLexer(options))
+
 def tokenize(data, lexer):
     '''Lex the data and exit.
 
@@ -40,30 +186,527 @@ def tokenize(data, lexer):
     sys.exit(0) 
 
 def buildParser(options):
+    '''
+    Build the parser, from cached tables if they are available. The LALR tables
+    are only generated when the grammar has changed. With the debug_parser
+    option they are always regenerated, and the parser.out debugging file is
+    written beside them.
+    '''
     logging.debug("buildParser")
     if options.verbose:
         sys.stderr.write("Building parser... ")
 
-    basic_parser = yacc.yacc(module=grammar, picklefile="parsetab.pickle", debug=1)
+    start_time = time.time()
+    debug = getattr(options, 'debug_parser', False)
+    table_dir = tableDirectory(options)
+    if table_dir is None:
+        basic_parser = yacc.yacc(module=grammar, debug=debug, write_tables=0)
+        source = "grammar"
+    else:
+        key = tableKey()
+        picklefile = os.path.join(table_dir, PARSETAB_PREFIX + key + '.pickle')
+        if debug and os.path.exists(picklefile):
+            os.remove(picklefile)
+        if os.path.exists(picklefile):
+            source = "cached tables"
+        else:
+            removeStaleTables(table_dir, key)
+            source = "grammar"
+        basic_parser = yacc.yacc(module=grammar, picklefile=picklefile, optimize=1, debug=debug,
+                                 debugfile=os.path.join(table_dir, 'parser.out'))
+    elapsed = time.time() - start_time
+    logging.debug("Built parser from %s in %.3fs", source, elapsed)
     if options.verbose:
-        sys.stderr.write("done\n")
+        sys.stderr.write("done (%.3fs)\n" % elapsed)
     
     return basic_parser
 
-def parse(data, options):
+def sharedParser(options):
+    '''
+    :returns: The parser for this process, built on first use.
+    '''
+    global _parser
+    if _parser is None:
+        _parser = buildParser(options)
+    return _parser
+
+def parseWithErrorFunction(parser, data, lexer, errorfunc, intern_table, tracking=True):
+    '''
+    Parse data, calling errorfunc rather than the p_error function of the grammar
+    for each syntax error. The grammar rules intern identifiers and literal values
+    in intern_table, which they find as the intern_table attribute of the parser.
+    '''
+    default_errorfunc = parser.errorfunc
+    parser.errorfunc = errorfunc
+    parser.intern_table = intern_table
+    try:
+        return parser.parse(data, lexer=lexer, tracking=tracking)
+    finally:
+        parser.errorfunc = default_errorfunc
+        parser.intern_table = None
+
+def parse(data, options, lexer=None):
+    '''Parse a program.
+
+    Args:
+        data: The program text, or a tokenised decoder.Decoder if lexer is a
+            TokenStreamLexer.
+        options: Command line options.
+        lexer: An optional lexer. By default the text lexer for this process is
+            used, and with the parse_jobs option the program text is parsed in
+            that number of worker processes, if it can be divided.
+
+    With the compact_positions option the parser does not track the positions
+    of grammar symbols. Instead statements are given the number of a span of
+    tokens in a TokenSpans table, which is attached to the Program as its
+    token_spans attribute. Programs with compact positions are always parsed
+    serially.
+
+    The identifiers and literal values of the program are interned in an
+    InternTable, which is attached to the Program as its intern_table attribute.
+    '''
     logging.debug("parse")
     if options.verbose:
         sys.stderr.write("Parsing...")
 
-    lexer = buildLexer(options)
+    # Only program text can be divided between worker processes
+    jobs = getattr(options, 'parse_jobs', None) or 1
+    compact = getattr(options, 'compact_positions', False)
+    parallel = lexer is None and jobs > 1 and not compact
+    if lexer is None:
+        lexer = sharedLexer(options)
+        # The line number is not reset by input()
+        lexer.lineno = 1
 
     if options.debug_lex:
         tokenize(data, lexer)
 
-    parser = buildParser(options)
+    if parallel:
+        parse_tree = parallelParse(data, options, jobs)
+        if parse_tree is not None:
+            if options.verbose:
+                sys.stderr.write("done\n")
+            return parse_tree
+        logging.debug("Parsing serially")
+
+    intern_table = InternTable()
+
+    parser = sharedParser(options)
 
-    parse_tree = parser.parse(data, lexer=lexer, tracking=True)
+    # Count the syntax errors, since a program parsed with error recovery cannot be
+    # reparsed incrementally
+    syntax_errors = []
+    def recordSyntaxError(token):
+        syntax_errors.append(token)
+        return grammar.p_error(token)
+
+    if compact:
+        lexer = SpanRecordingLexer(lexer, parser)
+    parse_tree = parseWithErrorFunction(parser, data, lexer, recordSyntaxError, intern_table, tracking=not compact)
+    if parse_tree is not None:
+        parse_tree.syntax_errors = len(syntax_errors)
+        parse_tree.intern_table = intern_table
+        if compact:
+            parse_tree.token_spans = lexer.spans
     if options.verbose:
         sys.stderr.write("done\n")
 
-    return parse_tree
\ No newline at end of file
+    return parse_tree
+
+def astCacheKey(data, options):
+    '''
+    :returns: A string identifying the AST of the program text data, parsed with
+              the current grammar and lexer modules and the given options into
+              the node classes of the current ast and ast_meta modules.
+    '''
+    try:
+        from hashlib import md5
+    except ImportError:
+        from md5 import md5
+    sig = md5()
+    sig.update(tableKey())
+    sig.update(str(ast_cache.FORMAT_VERSION))
+    updateWithSources(sig, (ast, ast_meta))
+    sig.update(str(bool(getattr(options, 'compact_positions', False))))
+    sig.update(data)
+    return sig.hexdigest()
+
+def cachedParse(data, options):
+    '''Parse a program, or load its AST from the cache.
+
+    With the ast_cache option, the AST of each program which parses without
+    syntax errors is serialized to that directory, in a file named by a hash
+    of the program text, and is loaded from there when the same text is
+    parsed again. Otherwise the program is parsed as by parse().
+
+    Args:
+        data: The program text.
+        options: Command line options.
+
+    Returns:
+        The parse tree.
+    '''
+    cache_dir = getattr(options, 'ast_cache', None)
+    if not cache_dir:
+        return parse(data, options)
+    filename = os.path.join(cache_dir, AST_CACHE_PREFIX + astCacheKey(data, options) + '.bin')
+    if os.path.exists(filename):
+        start_time = time.time()
+        try:
+            f = open(filename, 'rb')
+            try:
+                parse_tree = ast_cache.loads(f.read())
+            finally:
+                f.close()
+        except (IOError, ast_cache.SerializationError), e:
+            logging.warning("Cannot load cached AST %s: %s", filename, e)
+        else:
+            logging.debug("Loaded cached AST in %.3fs", time.time() - start_time)
+            return parse_tree
+
+    parse_tree = parse(data, options)
+    # The syntax errors of a program are only reported when it is parsed
+    if parse_tree is not None and not parse_tree.syntax_errors:
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            serialized = ast_cache.dumps(parse_tree)
+            f = open(filename, 'wb')
+            try:
+                f.write(serialized)
+            finally:
+                f.close()
+        except (IOError, OSError, ast_cache.SerializationError), e:
+            logging.warning("Cannot cache AST in %s: %s", filename, e)
+    return parse_tree
+
+# Top-level statements which can end on the line of the following statement,
+# as in ENDIF:PRINT, so that a reparsed region cannot begin after them
+MULTI_LINE_STATEMENTS = (If, Case)
+
+class RegionSyntaxError(Exception):
+    '''Raised to abandon the parse of a region of a program.'''
+    pass
+
+def abandonRegion(token):
+    raise RegionSyntaxError, "Syntax error %s" % token
+
+def abandonRegionLexing(token):
+    raise RegionSyntaxError, "Illegal character '%s'" % token.value[0]
+
+def firstStatementFrom(statements, shifts, line):
+    '''
+    :param statements: The top-level statements of a program, in which empty
+                       statements are None.
+    :param shifts: The PositionShifts of the statements.
+    :param line: A one-based physical line number.
+    :returns: The index of the first statement which does not begin before line.
+    '''
+    low = 0
+    high = len(statements)
+    while low < high:
+        mid = (low + high) // 2
+        index = mid
+        while index < high and statements[index] is None:
+            index += 1
+        if index < high and shifts.startLine(statements, index) < line:
+            low = index + 1
+        else:
+            high = mid
+    return low
+
+def isRegionStart(statements, shifts, index):
+    '''
+    :returns: True if the top-level statement at index begins a line, and the
+              parser has finished with the statements before it at the
+              beginning of that line.
+    '''
+    statement = statements[index]
+    if statement is None or statement.startLine is None:
+        return False
+    start_line = shifts.startLine(statements, index)
+    for previous_index in xrange(index - 1, -1, -1):
+        previous = statements[previous_index]
+        if previous is not None:
+            return (shifts.startLine(statements, previous_index) < start_line
+                    and not isinstance(previous, MULTI_LINE_STATEMENTS))
+    return True
+
+def changedRegion(statements, shifts, source_map, previous_source_map, changed_lines):
+    '''
+    Find the top-level statements of the previous version of a program which
+    contain the changed lines, and the lines of the new version which replace them.
+
+    :returns: A 5-tuple of the index of the first statement to be replaced, the
+              index of the statement following the last, the zero-based physical
+              line beginning the region, and the physical lines following the
+              region in the new and previous versions. None if the region cannot
+              be found.
+    '''
+    if not statements:
+        return None
+    lines = source_map.physical_to_logical_map
+    previous_lines = previous_source_map.physical_to_logical_map
+    # The first one-based physical lines of the previous version at and after
+    # the changed lines
+    before = bisect_left(previous_lines, min(changed_lines)) + 1
+    after = bisect_right(previous_lines, max(changed_lines)) + 1
+
+    # The region begins on an unchanged line, since the position of the end of a
+    # statement can depend upon the blank lines after it
+    first = min(firstStatementFrom(statements, shifts, before), len(statements) - 1)
+    while first > 0 and not (isRegionStart(statements, shifts, first)
+                             and shifts.startLine(statements, first) < before):
+        first -= 1
+    last = max(firstStatementFrom(statements, shifts, after), first)
+    while last < len(statements) and not isRegionStart(statements, shifts, last):
+        last += 1
+
+    # The lines before the region are unchanged
+    start_line = shifts.startLine(statements, first) - 1 if first > 0 else 0
+    if start_line > len(lines) or (start_line > 0 and lines[start_line - 1] != previous_lines[start_line - 1]):
+        return None
+    # The lines after the region are unchanged, but may have moved
+    if last < len(statements):
+        previous_end_line = shifts.startLine(statements, last) - 1
+        end_line = bisect_left(lines, previous_lines[previous_end_line])
+        if end_line == len(lines) or lines[end_line] != previous_lines[previous_end_line]:
+            return None
+    else:
+        previous_end_line = len(previous_lines)
+        end_line = len(lines)
+    return first, last, start_line, end_line, previous_end_line
+
+def parseRegion(text, line, options, intern_table=None):
+    '''
+    Parse part of a program, which must consist of whole top-level statements.
+
+    :param text: The program text of the region.
+    :param line: The one-based physical line number of the start of the region.
+    :param intern_table: The InternTable of the program. By default the region
+                         is interned in a new table.
+    :returns: The list of top-level statements of the region, or None if the
+              region could not be parsed on its own.
+    '''
+    lexer = sharedLexer(options)
+    lexer.lineno = line
+    # An illegal character may be the quote of a string which continues beyond
+    # the region
+    lexerrorf = lexer.lexerrorf
+    lexer.lexerrorf = abandonRegionLexing
+    try:
+        region = parseWithErrorFunction(sharedParser(options), text, lexer, abandonRegion,
+                                        intern_table if intern_table is not None else InternTable())
+    except RegionSyntaxError, e:
+        logging.debug("Parsing the whole program after %s", e)
+        return None
+    finally:
+        lexer.lexerrorf = lexerrorf
+    # A string containing line breaks leaves the line numbers of the following
+    # statements behind the physical lines
+    if lexer.lineno != line + text.count('\n'):
+        logging.debug("Parsing the whole program after a string spanning lines")
+        return None
+    return region.statements.statements
+
+def positionShifts(program):
+    '''
+    :returns: The PositionShifts of the top-level statements of program.
+    '''
+    shifts = getattr(program, 'position_shifts', None)
+    if shifts is None:
+        shifts = PositionShifts()
+        program.position_shifts = shifts
+    return shifts
+
+def applyPositionShifts(program):
+    '''
+    Move the positions of the top-level statements of a program which follow
+    regions changed by reparse() to their places in the program text.
+    '''
+    shifts = getattr(program, 'position_shifts', None)
+    if shifts:
+        shifts.apply(program.statements.statements)
+
+def reparse(program, data, source_map, previous_source_map, changed_lines, options):
+    '''Reparse the lines of a program which have changed since it was parsed.
+
+    Only the top-level statements on the changed lines are reparsed, widened to
+    the whole of any multi-line IF or CASE statement containing them. The new
+    statements replace the old in the StatementList of the program, their
+    parents are set, and the positions of the following statements are moved
+    to match the new program text. Those moves are recorded in the
+    PositionShifts of the program rather than written to every node, so that
+    reparsing takes time in proportion to the changed region, and are applied
+    by applyPositionShifts() before the later compiler passes. The whole program is reparsed if the line
+    numbers are not in ascending order, if the previous version had syntax
+    errors or compact positions, or if the changed lines cannot be parsed on
+    their own, for example because an ENDIF has been removed.
+
+    Args:
+        program: The Program returned by parse() or reparse() for the previous
+            version of the program, before any later compiler passes.
+        data: The program text of the new version of the program.
+        source_map: The SourceMap of the new version of the program.
+        previous_source_map: The SourceMap of the previous version of the program.
+        changed_lines: The logical line numbers of the lines which have been
+            changed, inserted or deleted.
+        options: Command line options.
+
+    Returns:
+        The program, which is a new Program if the whole program was reparsed.
+    '''
+    logging.debug("reparse")
+    if not changed_lines:
+        return program
+    if options.verbose:
+        sys.stderr.write("Reparsing...")
+    start_time = time.time()
+
+    statement_list = program.statements
+    statements = statement_list.statements
+    region = None
+    if (source_map.ascending and previous_source_map.ascending and len(source_map) > 0
+        and not getattr(program, 'syntax_errors', 0) and getattr(program, 'token_spans', None) is None):
+        shifts = positionShifts(program)
+        region = changedRegion(statements, shifts, source_map, previous_source_map, changed_lines)
+    new_statements = None
+    if region is not None:
+        first, last, start_line, end_line, previous_end_line = region
+        offsets = source_map.line_offsets
+        start_pos = offsets[start_line] if start_line < len(offsets) else len(data)
+        end_pos = offsets[end_line] if end_line < len(offsets) else len(data)
+        new_statements = parseRegion(data[start_pos:end_pos], start_line + 1, options, program.intern_table)
+
+    if new_statements is None:
+        if options.verbose:
+            sys.stderr.write("whole program...")
+        program = parse(data, options)
+    else:
+        # The new statements are stored relative to the shifts which apply at first
+        for statement in new_statements:
+            shiftPositions(statement, -shifts.lineDelta(first), start_pos - shifts.posDelta(first))
+        following = last < len(statements)
+        statements[first:last] = new_statements
+        shifts.replace(first, last, len(new_statements))
+        if following:
+            line_delta = end_line - previous_end_line
+            pos_delta = end_pos - previous_source_map.line_offsets[previous_end_line]
+            if line_delta or pos_delta:
+                shifts.add(first + len(new_statements), line_delta, pos_delta)
+
+        # The indices of the following statements change with the number of statements
+        reindex_end = len(statements) if len(new_statements) != last - first else first + len(new_statements)
+        for index in xrange(first, reindex_end):
+            statement_list._adopt(statements[index], 'statements', index)
+        logging.debug("Reparsed %d of %d lines", end_line - start_line, len(source_map))
+
+    elapsed = time.time() - start_time
+    logging.debug("Reparsed in %.3fs", elapsed)
+    if options.verbose:
+        sys.stderr.write("done (%.3fs)\n" % elapsed)
+    return program
+
+# Lines beginning the definition of a procedure or function, at which a program
+# can be divided for parallel parsing
+DEF_LINE_REGEX = re.compile(r'^[ \t]*DEF[ \t]*(?:PROC|FN)', re.MULTILINE)
+
+# The number of chunks parsed by each worker process, to balance their loads
+CHUNKS_PER_JOB = 4
+
+def definitionChunks(data, count):
+    '''
+    Divide program text at the beginnings of DEF PROC and DEF FN lines into at
+    most count chunks of similar size.
+
+    :returns: A list of 3-tuples of the start and end positions of each chunk
+              within data, and the one-based physical line number of its start.
+    '''
+    target = len(data) // count + 1
+    chunks = []
+    start = 0
+    line = 1
+    for match in DEF_LINE_REGEX.finditer(data):
+        end = match.start()
+        if end - start >= target:
+            chunks.append((start, end, line))
+            line += data.count('\n', start, end)
+            start = end
+    chunks.append((start, len(data), line))
+    return chunks
+
+def parseChunk(task):
+    '''
+    Parse a chunk of a program in a worker process.
+
+    :param task: A 4-tuple of the text of the chunk, its position within the
+                 program text, its one-based physical line number, and the
+                 command line options.
+    :returns: The top-level statements of the chunk in a StatementList, with
+              their source positions relative to the whole program, serialized
+              by ast_cache with the InternTable of the chunk, or None if the
+              chunk could not be parsed on its own.
+    '''
+    text, pos, line, options = task
+    intern_table = InternTable()
+    statements = parseRegion(text, line, options, intern_table)
+    if statements is None:
+        return None
+    if pos:
+        for statement in statements:
+            shiftPositions(statement, 0, pos)
+    statement_list = StatementList()
+    statement_list.statements.extend(statements)
+    statement_list.intern_table = intern_table
+    return ast_cache.dumps(statement_list)
+
+def parallelParse(data, options, jobs):
+    '''Parse a program in worker processes, divided at its DEF PROC and DEF FN lines.
+
+    Args:
+        data: The program text.
+        options: Command line options.
+        jobs: The number of worker processes.
+
+    The workers return their statements in the compact form of ast_cache rather
+    than pickled, and they are loaded into a single InternTable, so their
+    identifiers take the symbol ids of the whole program as they are restored.
+
+    Returns:
+        The parse tree, or None if the program could not be divided into chunks
+        which can be parsed on their own, for example because a chunk ends within
+        a multi-line IF, or has a syntax error.
+    '''
+    logging.debug("parallelParse")
+    try:
+        import multiprocessing
+    except ImportError:
+        logging.debug("Parsing serially without the multiprocessing module")
+        return None
+
+    chunks = definitionChunks(data, jobs * CHUNKS_PER_JOB)
+    if len(chunks) < 2:
+        return None
+    # The workers inherit the lexer and parser when they are forked
+    sharedLexer(options)
+    sharedParser(options)
+    start_time = time.time()
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(parseChunk, [(data[start:end], start, line, options) for start, end, line in chunks])
+    finally:
+        pool.close()
+        pool.join()
+    logging.debug("Parsed %d chunks in %.3fs", len(chunks), time.time() - start_time)
+    if None in results:
+        return None
+
+    intern_table = InternTable()
+    statement_list = StatementList()
+    for result in results:
+        statement_list.statements.extend(ast_cache.loads(result, intern_table).statements)
+    statement_list._adoptAll(statement_list.statements, 'statements')
+    parse_tree = Program(statements=statement_list)
+    parse_tree.syntax_errors = 0
+    parse_tree.intern_table = intern_table
+    return parse_tree
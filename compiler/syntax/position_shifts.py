@@ -0,0 +1,126 @@
+'''
+Deferred moves of the source positions of the top-level statements of a program.
+
+When a region of a program is reparsed, the statements following the region
+move by the number of physical lines and characters by which the region grew or
+shrank. Rather than rewrite the positions of every node of those statements,
+reparse() records a shift in the PositionShifts of the Program, which applies to
+every top-level statement from a given index onwards. The positions of a
+statement are those stored on its nodes plus the shifts which apply to it, and
+are only written to the nodes when apply() is called.
+'''
+
+from bisect import bisect_right
+
+from .ast_meta import AstNode
+
+# The options of AstNodes holding physical line numbers and text positions
+LINE_OPTIONS = ('line_num', 'start_line', 'end_line')
+POS_OPTIONS = ('start_pos', 'end_pos')
+
+def shiftPositions(node, line_delta, pos_delta):
+    '''
+    Move the source positions of a subtree by line_delta physical lines and
+    pos_delta characters.
+    '''
+    shifts = [(name, line_delta) for name in LINE_OPTIONS if line_delta]
+    shifts += [(name, pos_delta) for name in POS_OPTIONS if pos_delta]
+    if not shifts:
+        return
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        if not isinstance(node, AstNode):
+            continue
+        for name, delta in shifts:
+            value = getattr(node, name, None)
+            if value is not None:
+                setattr(node, name, value + delta)
+        for child in node.children.itervalues():
+            if isinstance(child, list):
+                nodes.extend(child)
+            else:
+                nodes.append(child)
+
+class PositionShifts(object):
+    '''
+    The shifts which have not yet been applied to the top-level statements of a
+    program. Each shift is held as the index of the first statement to which it
+    applies, and its line and position deltas. The deltas are accumulated in
+    index order, so the total shift of a statement is found by bisection.
+    '''
+    def __init__(self):
+        self.starts = []
+        self.line_deltas = []
+        self.pos_deltas = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __total(self, index):
+        '''
+        :returns: The position in the accumulated deltas of the last shift which
+                  applies to the statement at index, or -1 if none does.
+        '''
+        return bisect_right(self.starts, index) - 1
+
+    def lineDelta(self, index):
+        '''
+        :returns: The number of lines by which the statement at index has moved
+        '''
+        total = self.__total(index)
+        return self.line_deltas[total] if total >= 0 else 0
+
+    def posDelta(self, index):
+        '''
+        :returns: The number of characters by which the statement at index has moved
+        '''
+        total = self.__total(index)
+        return self.pos_deltas[total] if total >= 0 else 0
+
+    def startLine(self, statements, index):
+        '''
+        :returns: The one-based physical line on which the statement at index now
+                  starts, or None if it has no position.
+        '''
+        line = statements[index].startLine
+        if line is None:
+            return None
+        return line + self.lineDelta(index)
+
+    def replace(self, first, last, count):
+        '''
+        Account for the statements from index first up to index last being replaced
+        by count statements, which are stored with the shifts which apply at first.
+        '''
+        moved = count - (last - first)
+        for i, start in enumerate(self.starts):
+            if start > last:
+                self.starts[i] = start + moved
+            elif start > first:
+                self.starts[i] = first + count
+
+    def add(self, index, line_delta, pos_delta):
+        '''
+        Shift the statements from index onwards by line_delta lines and pos_delta characters.
+        '''
+        i = bisect_right(self.starts, index)
+        if i > 0 and self.starts[i - 1] == index:
+            i -= 1
+        else:
+            self.starts.insert(i, index)
+            self.line_deltas.insert(i, self.line_deltas[i - 1] if i > 0 else 0)
+            self.pos_deltas.insert(i, self.pos_deltas[i - 1] if i > 0 else 0)
+        for j in xrange(i, len(self.starts)):
+            self.line_deltas[j] += line_delta
+            self.pos_deltas[j] += pos_delta
+
+    def apply(self, statements):
+        '''
+        Write the shifted positions to the nodes of the statements, and forget the shifts.
+        '''
+        for total, start in enumerate(self.starts):
+            end = self.starts[total + 1] if total + 1 < len(self.starts) else len(statements)
+            for statement in statements[start:end]:
+                shiftPositions(statement, self.line_deltas[total], self.pos_deltas[total])
+        del self.starts[:], self.line_deltas[:], self.pos_deltas[:]
@@ -0,0 +1,154 @@
+'''
+Compact source positions for statements, as an alternative to the positions
+which the PLY parser tracks for every grammar symbol.
+
+A SpanRecordingLexer wraps the lexer passed to the parser, and records the
+position of each token in a TokenSpans table. Grammar rules give each statement
+a span of tokens, and store only the index of that span on the statement. The
+lines and columns of the statement are resolved from the table when debugging
+information or diagnostics need them.
+'''
+
+from array import array
+
+class TokenSpans(object):
+    '''
+    The positions of the tokens of a program, and the spans of tokens covered by
+    its statements. For each token the offset of its first character within the
+    program text, the offset following its last character, and its one-based
+    physical line number are held in parallel integer arrays, indexed by token
+    number. Each span is a pair of first and last token numbers, and a flag
+    which is set if the span ends at the start of its last token rather than
+    following it, indexed by span number.
+    '''
+    def __init__(self):
+        self.token_starts = array('i')
+        self.token_ends = array('i')
+        self.token_lines = array('i')
+        self.span_firsts = array('i')
+        self.span_lasts = array('i')
+        self.span_to_starts = array('b')
+
+    def __len__(self):
+        return len(self.token_starts)
+
+    def addSpan(self, first, last, to_start=False):
+        '''
+        :param first: The number of the first token of the span
+        :param last: The number of the last token of the span
+        :param to_start: True if the span ends at the start of its last token
+        :returns: The number of the new span
+        '''
+        self.span_firsts.append(first)
+        self.span_lasts.append(max(first, last))
+        self.span_to_starts.append(1 if to_start else 0)
+        return len(self.span_firsts) - 1
+
+    def startLine(self, span):
+        '''
+        :returns: The one-based physical line number on which the span starts
+        '''
+        return self.token_lines[self.span_firsts[span]]
+
+    def endLine(self, span):
+        '''
+        :returns: The one-based physical line number on which the last token of the span starts
+        '''
+        return self.token_lines[self.span_lasts[span]]
+
+    def startPos(self, span):
+        '''
+        :returns: The zero-based offset of the first character of the span
+        '''
+        return self.token_starts[self.span_firsts[span]]
+
+    def endPos(self, span):
+        '''
+        :returns: The zero-based offset following the last character of the span,
+                  or of the first character of its last token
+        '''
+        if self.span_to_starts[span]:
+            return self.token_starts[self.span_lasts[span]]
+        return self.token_ends[self.span_lasts[span]]
+
+    def position(self, span, source_map):
+        '''
+        :param span: A span number
+        :param source_map: The SourceMap of the program
+        :returns: A 4-tuple of the one-based start line, start column, end line and
+                  end column of the span, where the end column follows its last
+                  character.
+        '''
+        return (self.startLine(span), source_map.column(self.startPos(span)),
+                self.endLine(span), source_map.column(self.endPos(span)))
+
+class SpanRecordingLexer(object):
+    '''
+    A lexer which passes on the tokens of another lexer to the PLY parser, recording
+    their positions in a TokenSpans table. The first and last tokens of the
+    grammar symbols being reduced are found from the positions on the parser
+    symbol stack at which tokens were shifted, so the parser need not track
+    positions itself.
+    '''
+    def __init__(self, lexer, parser):
+        '''
+        :param lexer: The lexer from which tokens are read
+        :param parser: The PLY parser to which the tokens are passed
+        '''
+        self.lexer = lexer
+        self.parser = parser
+        self.spans = TokenSpans()
+        # The number of the most recent token shifted at each depth of the symbol stack
+        self.__shifted = []
+        # The number of the token preceding the lookahead token
+        self.__last = -1
+
+    def input(self, data):
+        self.lexer.input(data)
+
+    def token(self):
+        spans = self.spans
+        count = len(spans.token_starts)
+        if count:
+            # The parser reads a token immediately after shifting the previous one
+            depth = len(self.parser.symstack) - 1
+            shifted = self.__shifted
+            if depth < len(shifted):
+                shifted[depth] = count - 1
+            else:
+                shifted.extend([-1] * (depth - len(shifted)))
+                shifted.append(count - 1)
+        self.__last = count - 1
+        tok = self.lexer.token()
+        if tok is not None:
+            spans.token_starts.append(tok.lexpos)
+            spans.token_ends.append(self.lexer.lexpos)
+            spans.token_lines.append(tok.lineno)
+        return tok
+
+    def firstToken(self, p, n):
+        '''
+        :param p: The YaccProduction of the rule being reduced
+        :param n: The index of a non-empty symbol of the rule
+        :returns: The number of the first token of the symbol
+        '''
+        # The symbols of the rule have already been popped from the stack
+        return self.__shifted[len(p.stack) + n - 1]
+
+    def lastToken(self):
+        '''
+        :returns: The number of the last token of the rule being reduced
+        '''
+        return self.__last
+
+    def span(self, p, n=1, last=None, to_start=False):
+        '''
+        :param p: The YaccProduction of the rule being reduced
+        :param n: The index of the non-empty symbol of the rule at which the span starts
+        :param last: The number of the last token of the span, by default the last token of the rule
+        :param to_start: True if the span ends at the start of its last token
+        :returns: The number of a new span in the TokenSpans table
+        '''
+        if last is None:
+            last = self.__last
+        return self.spans.addSpan(self.firstToken(p, n), last, to_start)
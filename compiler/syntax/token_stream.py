@@ -0,0 +1,431 @@
+'''
+A lexer which produces PLY tokens directly from the token bytes of a tokenised
+BBC BASIC program, rather than from a detokenised copy of the program text.
+
+The tokens, and their lineno and lexpos attributes, are identical to those the
+text lexer in syntax.lexer would produce from the program as detokenised by
+decoder.decode, so the parser, and later passes which use the positions, cannot
+tell the difference. Keywords and line numbers become tokens directly. Runs of
+plain text between them - identifiers, literals and operators - are lexed by the
+text lexer, as is any keyword which would run together with the text which
+follows it, such as TO in TOP or TIME in TIME$.
+'''
+
+import re
+import string
+
+from ply.lex import LexToken
+
+from decoder import TEXT_PIECE, KEYWORD_PIECE, EXTENSION_PIECE, LINE_NUMBER_PIECE, REM_PIECE
+from source_debugging import TokenSeparators
+from source_map import SourceMap
+
+IDENTIFIER_CHARS = frozenset(string.ascii_letters + string.digits + '_`')
+
+# Characters which would continue a keyword the text lexer matches as a reserved
+# identifier, such as TRUE or ENDPROC, or as PROC or FN
+IDENTIFIER_GLUE = IDENTIFIER_CHARS | frozenset('@$%&~(')
+
+# Characters which could continue a keyword the text lexer matches with a rule
+# of its own into a longer keyword, such as TOP, TIME$ or RND(
+KEYWORD_GLUE = frozenset(string.ascii_letters + '$(')
+
+# Characters which would continue a line number into a longer number
+NUMBER_GLUE = frozenset(string.digits + '.')
+
+# Otherwise, adjacent pieces which are not separated by a space - extension
+# keywords and line numbers are not preceded by one when detokenised - may run
+# together if the last character of one could be followed within a token by the
+# first character of the next
+LEFT_GLUE = IDENTIFIER_CHARS | frozenset('@.&%$+-')
+RIGHT_GLUE = IDENTIFIER_CHARS | frozenset('@$%&~(.+-')
+
+# Tokens which the text lexer extends to the end of the line
+REST_OF_LINE = frozenset(['COMMENT', 'DATA', 'STAR_FX', 'STAR_CAT'])
+
+# Statement separator tokens, the positions of which are recorded for
+# SourceDebuggingVisitor
+SEPARATORS = frozenset(['COLON', 'ELSE', 'EOL'])
+
+NAME_REGEX = re.compile(r'[a-zA-Z_0-9`@]+')
+
+REM_KEYWORD = 'REM'
+
+class TokenStreamLexer(object):
+    '''
+    A lexer for tokenised programs which can be passed to the PLY parser in place
+    of the text lexer. The input is a tokenised decoder.Decoder, such as a
+    BbcBasicAcornDecoder. As the program is lexed, a SourceMap of its lines and
+    the positions of statement separators are recorded.
+    '''
+
+    def __init__(self, text_lexer):
+        '''
+        :param text_lexer: A lexer built from syntax.lexer, used for runs of plain text.
+        '''
+        self.__text_lexer = text_lexer
+        self.__probe_lexer = text_lexer.clone()
+        self.__keywords = {}
+        self.__tokens = iter(())
+        self.lineno = 1
+        self.lexpos = 0
+        self.source_map = SourceMap()
+        self.separators = TokenSeparators()
+        self.__last_end = 0
+
+    def input(self, program):
+        '''
+        :param program: A tokenised decoder.Decoder
+        '''
+        self.__tokens = self.__generateTokens(program)
+
+    def token(self):
+        '''
+        :returns: The next LexToken, or None at the end of the program.
+        '''
+        for tok, end in self.__tokens:
+            self.lineno = tok.lineno
+            if tok.type in SEPARATORS:
+                if tok.type == 'EOL':
+                    for i in range(len(tok.value)):
+                        self.separators.add(self.__last_end, tok.lexpos + i, 1)
+                    self.lineno += len(tok.value)
+                else:
+                    self.separators.add(self.__last_end, tok.lexpos, len(tok.value))
+            self.lexpos = end
+            self.__last_end = end
+            return tok
+        return None
+
+    def __generateTokens(self, program):
+        '''
+        A generator of (LexToken, end position) pairs for the whole program.
+        Each EOL token is held back until the next non-empty line, since the text
+        lexer combines the line ends of consecutive empty lines into one token.
+        '''
+        records = program.rawRecords()
+        line_start = 0
+        line_count = 0
+        last_empty = False
+        pending_eol = None
+        for line_number, line_data in records:
+            pieces = self.__strip(program.split(line_data))
+            if self.__needsTextLexer(pieces):
+                for item in self.__lexRemainingText(program, line_number, line_data, records,
+                                                    line_start, line_count, pending_eol):
+                    yield item
+                return
+            line_count += 1
+            self.__addLine(line_number, line_start, pieces)
+            starts, length = self.__layout(pieces, line_start)
+            if length == 0:
+                if pending_eol is None:
+                    pending_eol = self.__makeToken('EOL', '\n', line_count, line_start)
+                else:
+                    pending_eol.value += '\n'
+            else:
+                if pending_eol is not None:
+                    yield pending_eol, pending_eol.lexpos + len(pending_eol.value)
+                for item in self.__lineTokens(pieces, starts, line_start + length, line_count):
+                    yield item
+                pending_eol = self.__makeToken('EOL', '\n', line_count, line_start + length)
+            last_empty = length == 0
+            line_start += length + 1
+
+        if line_count == 0:
+            pending_eol = self.__makeToken('EOL', '\n', 1, 0)
+        elif last_empty and line_count > 1:
+            # The detokenised text of a program ending with an empty line already
+            # ends with a newline, so none is added after the last line
+            pending_eol.value = pending_eol.value[:-1]
+        yield pending_eol, pending_eol.lexpos + len(pending_eol.value)
+
+    def __addLine(self, line_number, line_start, pieces):
+        # The length of the line number and whitespace which indexLineNumbers
+        # would have removed from the front of the detokenised line
+        prefix = len(str(line_number)) + 1
+        if not pieces:
+            prefix += 1
+        self.source_map.addLine(line_number, line_start, prefix)
+
+    def __strip(self, pieces):
+        '''
+        Remove leading and trailing whitespace from the pieces of a line, as
+        decoder.decode does to each detokenised line.
+        '''
+        first = 0
+        last = len(pieces)
+        while first < last and pieces[first][0] == TEXT_PIECE and not pieces[first][1].strip():
+            first += 1
+        while last > first and pieces[last - 1][0] == TEXT_PIECE and not pieces[last - 1][1].strip():
+            last -= 1
+        pieces = pieces[first:last]
+        if pieces:
+            if pieces[0][0] == TEXT_PIECE:
+                pieces[0] = (TEXT_PIECE, pieces[0][1].lstrip())
+            if pieces[-1][0] in (TEXT_PIECE, REM_PIECE):
+                pieces[-1] = (pieces[-1][0], pieces[-1][1].rstrip())
+        return pieces
+
+    def __needsTextLexer(self, pieces):
+        '''
+        Determine whether the text lexer must take over from the start of this
+        line, because the line may run on into the next one - through a line
+        continuation, an unterminated string or a line break within the line.
+        '''
+        quotes = 0
+        for kind, text in pieces:
+            if kind == TEXT_PIECE:
+                if '\n' in text or '\r' in text:
+                    return True
+                quotes += text.count('"')
+        if quotes % 2 != 0:
+            return True
+        return bool(pieces) and pieces[-1][0] == TEXT_PIECE and pieces[-1][1].endswith('\\')
+
+    def __layout(self, pieces, line_start):
+        '''
+        :returns: A 2-tuple of a list of the positions of each piece within the
+                  detokenised program, and the length of the detokenised line.
+        '''
+        starts = []
+        pos = line_start
+        for i, (kind, text) in enumerate(pieces):
+            starts.append(pos)
+            pos += len(text)
+            if kind == KEYWORD_PIECE or kind == REM_PIECE:
+                if i > 0:
+                    pos += 1
+                if kind == REM_PIECE:
+                    pos += len(REM_KEYWORD)
+        return starts, pos - line_start
+
+    def __virtualText(self, pieces, first, last):
+        '''
+        :returns: The detokenised text of pieces[first:last].
+        '''
+        text = []
+        for i in range(first, last):
+            kind, piece_text = pieces[i]
+            if kind == KEYWORD_PIECE or kind == REM_PIECE:
+                if i > 0:
+                    text.append(' ')
+                if kind == REM_PIECE:
+                    text.append(REM_KEYWORD)
+            text.append(piece_text)
+        return ''.join(text)
+
+    def __tokenPos(self, pieces, starts, i):
+        # Keywords are preceded by a space, except at the start of a line
+        if i > 0 and (pieces[i][0] == KEYWORD_PIECE or pieces[i][0] == REM_PIECE):
+            return starts[i] + 1
+        return starts[i]
+
+    def __lineTokens(self, pieces, starts, line_end, lineno):
+        '''
+        :returns: A list of (LexToken, end position) pairs for the pieces of one
+                  non-empty line.
+        '''
+        self.__lineno = lineno
+        result = []
+        count = len(pieces)
+        i = 0
+        while i < count:
+            kind, text = pieces[i]
+            last = i + 1
+            if kind == KEYWORD_PIECE and text == 'DATA':
+                # DATA takes the remainder of the line as its value
+                value = self.__virtualText(pieces, i + 1, count)
+                if not value:
+                    tokens, last = self.__lexPieces(pieces, starts, i, count)
+                else:
+                    pos = self.__tokenPos(pieces, starts, i)
+                    tokens, last = [(self.__makeToken('DATA', value, lineno, pos), line_end)], count
+            else:
+                while last < count and self.__glues(pieces[last - 1], pieces[last], last - i):
+                    last += 1
+                if last == i + 1:
+                    tokens, last = self.__pieceTokens(pieces, starts, i)
+                elif last == i + 2 and kind == KEYWORD_PIECE and text in ('PROC', 'FN') and pieces[i + 1][0] == TEXT_PIECE:
+                    tokens, last = self.__procedureTokens(pieces, starts, i)
+                else:
+                    tokens, last = self.__lexPieces(pieces, starts, i, last)
+            result.extend(tokens)
+            i = last
+        return result
+
+    def __glues(self, piece, next_piece, group_size):
+        '''
+        Determine whether the detokenised text of two adjacent pieces could run
+        together into different tokens than each would produce alone.
+        :param group_size: The number of pieces, ending with piece, already found
+                           to run together.
+        '''
+        next_kind, next_text = next_piece
+        if next_kind == KEYWORD_PIECE or next_kind == REM_PIECE:
+            # Separated by a space
+            return False
+        if next_kind == EXTENSION_PIECE and self.__keyword(next_text) is None:
+            return True
+        kind, text = piece
+        if group_size == 1:
+            if kind == KEYWORD_PIECE or kind == EXTENSION_PIECE:
+                keyword = self.__keyword(text)
+                return keyword is None or next_text[0] in keyword[2]
+            if kind == LINE_NUMBER_PIECE:
+                return next_text[0] in NUMBER_GLUE
+        return text[-1] in LEFT_GLUE and next_text[0] in RIGHT_GLUE
+
+    def __pieceTokens(self, pieces, starts, i):
+        '''
+        :returns: A 2-tuple of a list of (LexToken, end position) pairs for the
+                  piece at index i, and the index of the next piece to be lexed.
+        '''
+        kind, text = pieces[i]
+        pos = self.__tokenPos(pieces, starts, i)
+        lineno = self.__lineno
+        if kind == LINE_NUMBER_PIECE:
+            return [(self.__makeToken('LITERAL_INTEGER', int(text), lineno, pos), pos + len(text))], i + 1
+        if kind == REM_PIECE:
+            return [(self.__makeToken('COMMENT', text, lineno, pos), pos + len(REM_KEYWORD) + len(text))], i + 1
+        if kind != TEXT_PIECE:
+            keyword = self.__keyword(text)
+            if keyword is not None:
+                type, value, glue = keyword
+                return [(self.__makeToken(type, value, lineno, pos), pos + len(text))], i + 1
+        return self.__lexPieces(pieces, starts, i, i + 1)
+
+    def __procedureTokens(self, pieces, starts, i):
+        '''
+        PROC and FN followed by a name are a single PROC_ID or FN_ID token.
+        '''
+        keyword = pieces[i][1]
+        name_text = pieces[i + 1][1]
+        match = NAME_REGEX.match(name_text)
+        if match is None:
+            return self.__lexPieces(pieces, starts, i, i + 2)
+        pos = self.__tokenPos(pieces, starts, i)
+        name_end = starts[i + 1] + match.end()
+        tokens = [(self.__makeToken(keyword + '_ID', keyword + match.group(), self.__lineno, pos), name_end)]
+        rest = name_text[match.end():]
+        if rest:
+            rest_tokens = self.__lexText(rest, name_end, i + 2 < len(pieces))
+            if rest_tokens is None:
+                rest_tokens = self.__lexText(rest + self.__virtualText(pieces, i + 2, len(pieces)), name_end, False)
+                return tokens + rest_tokens, len(pieces)
+            tokens.extend(rest_tokens)
+        return tokens, i + 2
+
+    def __lexPieces(self, pieces, starts, first, last):
+        '''
+        Lex the detokenised text of pieces[first:last] with the text lexer, or
+        of the remainder of the line if the text lexer would continue to its end.
+        :returns: A 2-tuple of a list of (LexToken, end position) pairs and the
+                  index of the next piece to be lexed.
+        '''
+        text = self.__virtualText(pieces, first, last)
+        tokens = self.__lexText(text, starts[first], last < len(pieces))
+        if tokens is None:
+            last = len(pieces)
+            text = self.__virtualText(pieces, first, last)
+            tokens = self.__lexText(text, starts[first], False)
+        return tokens, last
+
+    def __lexText(self, text, base, more):
+        '''
+        Lex text with the text lexer.
+        :param text: Detokenised text from within a single line.
+        :param base: The position of the text within the detokenised program.
+        :param more: True if more of the line follows the text.
+        :returns: A list of (LexToken, end position) pairs, or None if more of the line
+                  follows and the text lexer would have continued to the end of the line.
+        '''
+        lexer = self.__text_lexer
+        lexer.input(text)
+        lexer.lineno = self.__lineno
+        tokens = []
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                break
+            tok.lexpos += base
+            tokens.append((tok, base + lexer.lexpos))
+        if more and tokens and tokens[-1][0].type in REST_OF_LINE:
+            return None
+        return tokens
+
+    def __lexRemainingText(self, program, line_number, line_data, records, line_start, line_count, pending_eol):
+        '''
+        Detokenise and lex the remainder of the program, from the line with
+        line_number and line_data onwards, with the text lexer.
+        '''
+        bodies = []
+        pos = line_start
+        for line_number, line_data in [(line_number, line_data)] + list(records):
+            body = program.detokenise(line_data).strip()
+            prefix = len(str(line_number)) + 1
+            if not body:
+                prefix += 1
+            self.source_map.addLine(line_number, pos, prefix)
+            bodies.append(body)
+            pos += len(body) + 1
+        text = '\n'.join(bodies)
+        if not (bodies[-1] == '' and line_count + len(bodies) > 1):
+            text += '\n'
+
+        base = line_start
+        lineno = line_count + 1
+        if pending_eol is not None:
+            text = pending_eol.value + text
+            base = pending_eol.lexpos
+            lineno = pending_eol.lineno
+
+        lexer = self.__text_lexer
+        lexer.input(text)
+        lexer.lineno = lineno
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                break
+            tok.lexpos += base
+            yield tok, base + lexer.lexpos
+
+    def __keyword(self, text):
+        '''
+        :returns: A 3-tuple of the token type and value the text lexer produces for
+                  a keyword alone, and the set of characters which would continue it
+                  into a different token. None if the text lexer does not produce a
+                  single token from the keyword.
+        '''
+        try:
+            return self.__keywords[text]
+        except KeyError:
+            pass
+        keyword = None
+        if text != 'DATA':
+            tokens = self.__probe(text)
+            if len(tokens) == 1 and tokens[0][1] == len(text):
+                tok = tokens[0][0]
+                glue = IDENTIFIER_GLUE if len(self.__probe(text + 'Z')) == 1 else KEYWORD_GLUE
+                keyword = (tok.type, tok.value, glue)
+        self.__keywords[text] = keyword
+        return keyword
+
+    def __probe(self, text):
+        lexer = self.__probe_lexer
+        lexer.input(text)
+        tokens = []
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                break
+            tokens.append((tok, lexer.lexpos))
+        return tokens
+
+    def __makeToken(self, type, value, lineno, lexpos):
+        tok = LexToken()
+        tok.type = type
+        tok.value = value
+        tok.lineno = lineno
+        tok.lexpos = lexpos
+        return tok
@@ -0,0 +1,397 @@
+'''
+A hand-written lexer engine for the token rules of a PLY lexer module, such as
+syntax.lexer, which produces the same LexToken stream as the lexer PLY builds
+from them.
+
+PLY joins the regular expressions of all the rules into one master regular
+expression, so at each position every keyword is tried in turn until one
+matches. Here the rules whose expressions are literal strings - the keywords,
+REM and DATA - are compiled into a trie, so the keyword at a position is found
+by following the characters of the source. The other rules are matched by
+specialised scanners for identifiers, numbers and strings, or by their own
+regular expressions. Which rule matches at each position is decided with PLY's
+precedence - function rules in the order they are defined, then string rules
+from the longest regular expression to the shortest - and the rule functions
+themselves are called to convert the token values, exactly as PLY would.
+'''
+
+import re
+import copy
+import string
+
+from ply.lex import LexToken, LexError
+
+# Regular expression metacharacters, and the VERBOSE mode comment character
+METACHARACTERS = frozenset('.^$*+?{}[]|()#')
+
+# A rule expression suffix which extends a match to the end of the line
+REST_OF_LINE = r'[^\n]*'
+
+IDENTIFIER_START = string.ascii_letters + '_`'
+IDENTIFIER_SUFFIXES = frozenset('$%&~')
+DIGITS = frozenset(string.digits)
+HEX_DIGITS = frozenset(string.digits + 'ABCDEF')
+BINARY_DIGITS = frozenset('01')
+
+IDENTIFIER_RUN_REGEX = re.compile(r'[a-zA-Z_0-9`]*')
+DIGIT_RUN_REGEX = re.compile(r'\d*')
+LINE_END_RUN_REGEX = re.compile(r'[\r\n]*')
+
+def literalAlternatives(regex):
+    '''
+    :param regex: A regular expression, as written for a PLY rule.
+    :returns: A list of the strings matched by regex if it consists only of literal
+              or escaped characters, each optionally followed by ?, otherwise None.
+    '''
+    alternatives = ['']
+    i = 0
+    length = len(regex)
+    while i < length:
+        c = regex[i]
+        if c == '\\':
+            i += 1
+            if i == length or regex[i].isalnum():
+                return None
+            c = regex[i]
+        elif c in METACHARACTERS:
+            return None
+        elif c.isspace():
+            # Whitespace is ignored in VERBOSE mode, as used by PLY
+            i += 1
+            continue
+        i += 1
+        if i < length and regex[i] == '?':
+            i += 1
+            # The longer alternative first, since ? is greedy
+            alternatives = [a + c for a in alternatives] + alternatives
+        else:
+            alternatives = [a + c for a in alternatives]
+    return alternatives
+
+def scanIdentifier(data, pos):
+    '''
+    Scan [@a-zA-Z_`][a-zA-Z_0-9`]*[$%&~]? - the first character has been checked.
+    '''
+    end = IDENTIFIER_RUN_REGEX.match(data, pos + 1).end()
+    if end < len(data) and data[end] in IDENTIFIER_SUFFIXES:
+        end += 1
+    return end
+
+def scanArrayIdentifier(data, pos):
+    '''
+    Scan [a-zA-Z_`][a-zA-Z_0-9`]*[$%&~]?\( - the first character has been checked.
+    '''
+    end = IDENTIFIER_RUN_REGEX.match(data, pos + 1).end()
+    if end < len(data) and data[end] in IDENTIFIER_SUFFIXES:
+        end += 1
+    if end < len(data) and data[end] == '(':
+        return end + 1
+    return -1
+
+def scanString(data, pos):
+    '''
+    Scan "((?:[^"]+|"")*)"(?!") without backtracking. Each quote after the opening
+    one either begins a pair of quotes, or is the closing quote.
+    '''
+    i = pos + 1
+    while True:
+        i = data.find('"', i)
+        if i == -1:
+            return -1
+        if data[i + 1:i + 2] != '"':
+            return i + 1
+        i += 2
+
+def scanFloat(data, pos):
+    '''
+    Scan \d*\.\d+(E([+-]?\d+))?
+    '''
+    i = DIGIT_RUN_REGEX.match(data, pos).end()
+    if data[i:i + 1] != '.':
+        return -1
+    end = DIGIT_RUN_REGEX.match(data, i + 1).end()
+    if end == i + 1:
+        return -1
+    if data[end:end + 1] == 'E':
+        i = end + 1
+        if data[i:i + 1] in ('+', '-'):
+            i += 1
+        exponent_end = DIGIT_RUN_REGEX.match(data, i).end()
+        if exponent_end > i:
+            end = exponent_end
+    return end
+
+def scanInteger(data, pos):
+    '''
+    Scan \d+ - the first character has been checked.
+    '''
+    return DIGIT_RUN_REGEX.match(data, pos + 1).end()
+
+def prefixedRunScanner(digits):
+    '''
+    :returns: A scanner for a prefix character followed by one or more of digits.
+    '''
+    def scanPrefixedRun(data, pos):
+        end = pos + 1
+        length = len(data)
+        while end < length and data[end] in digits:
+            end += 1
+        if end == pos + 1:
+            return -1
+        return end
+    return scanPrefixedRun
+
+def scanLineEnds(data, pos):
+    '''
+    Scan [\r\n]+ - the first character has been checked.
+    '''
+    return LINE_END_RUN_REGEX.match(data, pos + 1).end()
+
+# Specialised scanners for rules of syntax.lexer, and the characters with which
+# their matches can begin. The specialised scanner for a rule is used only if its
+# regular expression is exactly the one given here.
+SCANNERS = {
+    r'([@a-zA-Z_`][a-zA-Z_0-9`]*[$%&~]?)': (scanIdentifier, '@' + IDENTIFIER_START),
+    r'[a-zA-Z_`][a-zA-Z_0-9`]*[$%&~]?\(': (scanArrayIdentifier, IDENTIFIER_START),
+    r'"((?:[^"]+|"")*)"(?!")': (scanString, '"'),
+    r'\d*\.\d+(E([+-]?\d+))?': (scanFloat, string.digits + '.'),
+    r'\d+': (scanInteger, string.digits),
+    r'&[\dA-F]+': (prefixedRunScanner(HEX_DIGITS), '&'),
+    r'%[01]+': (prefixedRunScanner(BINARY_DIGITS), '%'),
+    r'[\r\n]+': (scanLineEnds, '\r\n'),
+}
+
+# The characters with which matches of other rule expressions can begin, by
+# the literal prefix of the expression. Expressions without a known first
+# character are tried at every position.
+FIRST_CHARACTERS = [
+    (r'\*', '*'),
+    (r'\\', '\\'),
+    ('PROC', 'P'),
+    ('FN', 'F'),
+]
+
+def regexScanner(regex, reflags):
+    '''
+    :returns: A scanner which matches regex as PLY would.
+    '''
+    match = re.compile(regex, re.VERBOSE | reflags).match
+    def scanRegex(data, pos):
+        m = match(data, pos)
+        if m is None:
+            return -1
+        return m.end()
+    return scanRegex
+
+class TrieLexer(object):
+    '''
+    A lexer with the interface of a PLY lexer - input(), token(), clone(), skip(),
+    lineno and lexpos - built from the t_ rules of a PLY lexer module.
+    '''
+
+    def __init__(self, module, reflags=0):
+        '''
+        :param module: A PLY lexer module, such as syntax.lexer.
+        :param reflags: Additional regular expression flags, as passed to lex.lex().
+        '''
+        rules = [(name[2:], value) for name, value in vars(module).items()
+                 if name.startswith('t_') and name not in ('t_ignore', 't_error')]
+        functions = sorted([(name, value) for name, value in rules if callable(value)],
+                           key=lambda rule: rule[1].func_code.co_firstlineno)
+        strings = sorted([(name, value) for name, value in rules if not callable(value)],
+                         key=lambda rule: len(rule[1]), reverse=True)
+
+        # Each rule has a rank, from which PLY's precedence follows
+        self.__keywords = {}
+        self.__candidates = {}
+        self.__anywhere = []
+        rank = 0
+        for name, function in functions:
+            self.__addRule(rank, name, function, function.__doc__, reflags)
+            rank += 1
+        for name, regex in strings:
+            self.__addRule(rank, name, None, regex, reflags)
+            rank += 1
+        # Rules which can begin with any character must be tried at every position
+        for c in self.__candidates:
+            self.__candidates[c] = sorted(self.__candidates[c] + self.__anywhere)
+        for node in self.__keywords.values():
+            self.__resolveKeywords(node, None, 1)
+
+        self.lexignore = getattr(module, 't_ignore', '')
+        self.lexerrorf = getattr(module, 't_error', None)
+        self.lexliterals = getattr(module, 'literals', '')
+        self.lexdata = None
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = 1
+
+    def __addRule(self, rank, name, function, regex, reflags):
+        to_end_of_line = regex.endswith(REST_OF_LINE)
+        alternatives = literalAlternatives(regex[:-len(REST_OF_LINE)] if to_end_of_line else regex)
+        if alternatives is not None and '' not in alternatives:
+            for text in alternatives:
+                self.__addKeyword(text, (rank, name, function, to_end_of_line))
+            return
+
+        if regex in SCANNERS:
+            scanner, first_characters = SCANNERS[regex]
+        else:
+            scanner = regexScanner(regex, reflags)
+            first_characters = None
+            for prefix, characters in FIRST_CHARACTERS:
+                if regex.startswith(prefix):
+                    first_characters = characters
+                    break
+        candidate = (rank, name, function, scanner)
+        if first_characters is None:
+            self.__anywhere.append(candidate)
+        else:
+            for c in first_characters:
+                self.__candidates.setdefault(c, []).append(candidate)
+
+    def __addKeyword(self, text, rule):
+        node = self.__keywords
+        for c in text:
+            node = node.setdefault(c, {})
+        node[None] = rule
+
+    def __resolveKeywords(self, node, best, length):
+        '''
+        Replace the rule at each node of the keyword trie with a 5-tuple of the rank,
+        type, function and rest of line flag of the highest precedence rule matching
+        a prefix of the characters leading to the node, and the length of its match.
+        '''
+        rule = node.pop(None, None)
+        # Of two alternatives of the same rule, ? prefers the longer
+        if rule is not None and (best is None or rule[0] <= best[0]):
+            best = rule + (length,)
+        if best is not None:
+            node[None] = best
+        for c, child in node.items():
+            if c is not None:
+                self.__resolveKeywords(child, best, length + 1)
+
+    def clone(self):
+        return copy.copy(self)
+
+    def input(self, s):
+        if not isinstance(s, basestring):
+            raise ValueError("Expected a string")
+        self.lexdata = s
+        self.lexpos = 0
+        self.lexlen = len(s)
+
+    def skip(self, n):
+        self.lexpos += n
+
+    def token(self):
+        '''
+        :returns: The next LexToken, or None at the end of the input.
+        '''
+        lexpos = self.lexpos
+        lexlen = self.lexlen
+        lexignore = self.lexignore
+        lexdata = self.lexdata
+        keywords = self.__keywords
+        candidates = self.__candidates
+        anywhere = self.__anywhere
+
+        while lexpos < lexlen:
+            c = lexdata[lexpos]
+            if c in lexignore:
+                lexpos += 1
+                continue
+
+            # Follow the characters at lexpos as far as possible through the keyword
+            # trie. Each node holds the keyword of the highest precedence which is
+            # a prefix of the characters leading to it.
+            keyword = None
+            node = keywords.get(c)
+            if node is not None:
+                i = lexpos + 1
+                while i < lexlen:
+                    child = node.get(lexdata[i])
+                    if child is None:
+                        break
+                    node = child
+                    i += 1
+                keyword = node.get(None)
+
+            token_type = None
+            for rank, rule_type, rule_function, scanner in candidates.get(c, anywhere):
+                if keyword is not None and keyword[0] < rank:
+                    break
+                end = scanner(lexdata, lexpos)
+                if end > lexpos:
+                    token_type = rule_type
+                    function = rule_function
+                    break
+            if token_type is None and keyword is not None:
+                rank, token_type, function, to_end_of_line, length = keyword
+                end = lexpos + length
+                if to_end_of_line:
+                    end = lexdata.find('\n', end)
+                    if end == -1:
+                        end = lexlen
+
+            if token_type is not None:
+                tok = LexToken()
+                tok.value = lexdata[lexpos:end]
+                tok.lineno = self.lineno
+                tok.lexpos = lexpos
+                tok.type = token_type
+                if function is None:
+                    self.lexpos = end
+                    return tok
+                tok.lexer = self
+                self.lexpos = end
+                newtok = function(tok)
+                if not newtok:
+                    lexpos = self.lexpos
+                    continue
+                return newtok
+
+            if c in self.lexliterals:
+                tok = LexToken()
+                tok.value = c
+                tok.lineno = self.lineno
+                tok.type = c
+                tok.lexpos = lexpos
+                self.lexpos = lexpos + 1
+                return tok
+
+            if self.lexerrorf:
+                tok = LexToken()
+                tok.value = lexdata[lexpos:]
+                tok.lineno = self.lineno
+                tok.type = "error"
+                tok.lexer = self
+                tok.lexpos = lexpos
+                self.lexpos = lexpos
+                newtok = self.lexerrorf(tok)
+                if lexpos == self.lexpos:
+                    # Error method didn't change text position at all. This is an error.
+                    raise LexError("Scanning error. Illegal character '%s'" % (lexdata[lexpos]), lexdata[lexpos:])
+                lexpos = self.lexpos
+                if not newtok:
+                    continue
+                return newtok
+
+            self.lexpos = lexpos
+            raise LexError("Illegal character '%s' at index %d" % (lexdata[lexpos], lexpos), lexdata[lexpos:])
+
+        self.lexpos = lexpos + 1
+        if self.lexdata is None:
+            raise RuntimeError("No input string given with input()")
+        return None
+
+    # Iterator interface
+    def __iter__(self):
+        return self
+
+    def next(self):
+        t = self.token()
+        if t is None:
+            raise StopIteration
+        return t
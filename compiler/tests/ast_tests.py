@@ -0,0 +1,330 @@
+'''
+Tests of the construction, linking, indexing and editing of the AST, and of the
+fused passes which prepare it.
+
+Usage: python ast_tests.py
+'''
+
+import sys
+import os
+import random
+import logging
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from main import prepareAst
+import syntax.parser
+from syntax.ast import (AstNode, AstStatement, StatementList, Gosub, Return, ReturnFromProcedure, Data,
+                        Rem, UserFunc, Local, CallProcedure, Print)
+from syntax.ast_meta import AstMeta
+from utility import hasprop
+from source_debugging import SourceDebuggingVisitor, TextSeparators
+from parent_visitor import ParentVisitor
+from separation_visitor import SeparationVisitor
+from simplify_visitor import SimplificationVisitor
+from line_number_visitor import LineNumberVisitor
+from data_visitor import DataVisitor
+from pass_fusion import runPasses, hooks, FusiblePass
+from visitor import Visitor
+from flow.convert_sub_visitor import ConvertSubVisitor
+from ast_utils import (indexSuccessors, searchFollowingStatement, insertStatementBefore,
+                       insertStatementAfter, removeStatement, replaceStatement)
+from synthetic_programs import (Options, BLOCK, programLines, extendedLines, indexProgram,
+                                parseProgram, testPrograms, nodes, describe, silenced)
+
+# The number of lines of the synthetic programs
+LINES = 2000
+
+# Statements which are followed by another on the same line
+LINKED_EXTRA = [
+    'REPEAT A%% = A%% + %(n)d : UNTIL A%% > 100',
+    'REPEAT REPEAT : UNTIL TRUE : UNTIL TRUE',
+    'DEF FNtwice%(n)d(X%%) = 2 * X%%',
+    'IF A%% THEN REPEAT : UNTIL TRUE : : ELSE :',
+]
+
+# Statements of the kinds which are found from the node index
+INDEXED_EXTRA = [
+    'GOSUB %(sub)d',
+    'DATA %(n)d, "Two", Three',
+    'REM, %(n)d',
+    'Z%% = FNtwice%(n)d(FNtwice%(n)d(%(n)d))',
+    'DEF FNtwice%(n)d(X%%)',
+    'LOCAL T%%',
+    'T%% = 2 * X%%',
+    '= T%%',
+    'PRINT "Subroutine"',
+    'RETURN',
+]
+
+INDEXED_KINDS = (AstNode, AstStatement, Gosub, Return, ReturnFromProcedure, Data, Rem, UserFunc, Local,
+                 CallProcedure)
+
+# Statements which are separated, and DATA which is extracted
+FUSED_EXTRA = [
+    'DIM A%%(%(n)d), B$(2), C%% 10',
+    'READ X%%, Y$ : NEXT',
+    'DATA %(n)d, "Two", Three',
+    'REM, %(n)d',
+]
+
+def links(program):
+    '''
+    :returns: The parent references of each node of the program.
+    '''
+    return [(id(node), id(node.parent), getattr(node, 'parent_property', None),
+             getattr(node, 'parent_index', None)) for node in nodes(program)]
+
+def searchingCall(cls, *args, **kwargs):
+    '''
+    Construct a node as AstMeta did before it generated constructors.
+    '''
+    obj = type.__call__(cls, *args)
+    for kwarg in kwargs:
+        if hasprop(cls, kwarg):
+            value = kwargs[kwarg]
+            setattr(obj, kwarg, value)
+            if kwarg in cls._child_properties:
+                if isinstance(value, list):
+                    obj._adoptAll(value, kwarg)
+                else:
+                    obj._adopt(value, kwarg)
+        else:
+            raise AttributeError("No such property initialiser as '%s' on '%s'" % (kwarg, cls.__name__))
+    return obj
+
+def searchingParse(data, options=Options):
+    '''
+    :returns: The program parsed with nodes constructed by searchingCall
+    '''
+    generated_call = AstMeta.__call__
+    AstMeta.__call__ = searchingCall
+    try:
+        return syntax.parser.parse(data, options)
+    finally:
+        AstMeta.__call__ = generated_call
+
+def summariseLinks(program):
+    '''
+    :returns: A description of the program and the parent links of its nodes
+    '''
+    parents = [(node.__class__.__name__, node.parent.__class__.__name__,
+                getattr(node, 'parent_property', None), getattr(node, 'parent_index', None))
+               for node in nodes(program)]
+    return describe(program), parents
+
+def statements(program):
+    return [node for node in nodes(program) if isinstance(node, AstStatement)]
+
+def nestedLines(depth, n):
+    '''
+    :returns: The bodies of the lines of IF statements nested to depth, each
+              of which is the last statement of the clause holding it.
+    '''
+    opening = ['IF A%% > %d THEN' % (n + level) for level in xrange(depth)]
+    closing = []
+    for level in xrange(depth):
+        closing.extend(['ELSE', '  PRINT %d' % level, 'ENDIF'])
+    return opening + ['PRINT "Deepest"'] + closing
+
+def nestedProgramLines(lines, depth):
+    '''
+    :returns: The numbered lines of a program of at least lines lines, of BLOCKs
+              each followed by IF statements nested to depth.
+    '''
+    body = []
+    n = 0
+    while len(body) < lines:
+        body.extend(BLOCK[i] % {'n': n, 'line': 10} for i in xrange(len(BLOCK)))
+        body.extend(nestedLines(depth, n))
+        n += 1
+    return [(10 * (i + 1), b) for i, b in enumerate(body)]
+
+def preparedProgram(lines):
+    '''
+    :returns: The parsed program of the numbered lines, prepared as by the compiler
+    '''
+    program, data, source_map = parseProgram(lines)
+    with silenced():
+        prepareAst(program, TextSeparators(data), source_map, Options)
+    return program
+
+def editStatements(program, count, replace=False):
+    '''
+    Insert, remove and, if replace, replace count statements at random.
+    '''
+    random.seed(42)
+    indexSuccessors(program)
+    candidates = [s for s in statements(program) if isinstance(s.parent_index, int)]
+    choices = 4 if replace else 3
+    for i in xrange(count):
+        statement = random.choice(candidates)
+        choice = i % choices
+        if choice == 0:
+            insertStatementBefore(statement, Rem(data=", %d" % i))
+        elif choice == 1:
+            insertStatementAfter(statement, Data(data="%d" % i))
+        elif statement.parent_index > 0:
+            candidates.remove(statement)
+            if choice == 2:
+                removeStatement(statement)
+            else:
+                replaceStatement(statement, CallProcedure(name="PROCedit%d" % i))
+
+def createPasses(data, source_map):
+    return [SourceDebuggingVisitor(TextSeparators(data), source_map),
+            SeparationVisitor(),
+            SimplificationVisitor(),
+            LineNumberVisitor(),
+            DataVisitor()]
+
+def summarisePasses(program, passes):
+    '''
+    :returns: A description of the prepared AST and the results of the passes.
+    '''
+    lnv, dv = passes[-2:]
+    lines = sorted((line, describe(statement, statement.parent, statement.parent_property, statement.parent_index))
+                   for line, statement in lnv.line_to_stmt.items())
+    return describe(program), lines, dv.data, sorted(dv.index.items())
+
+def preparePasses(data, source_map, fused):
+    '''
+    :returns: The program of data, prepared by separate or fused passes, and the passes.
+    '''
+    program = syntax.parser.parse(data, Options)
+    passes = createPasses(data, source_map)
+    if fused:
+        runPasses(program, passes)
+    else:
+        for p in passes:
+            program.accept(p)
+    return program, passes
+
+class LinkedAstTest(unittest.TestCase):
+    '''
+    The parent references set by the parser must be unchanged by ParentVisitor,
+    which the compiler no longer runs, and no StatementList may be nested in
+    another or hold an empty statement.
+    '''
+
+    def check(self, data, name=None):
+        program = syntax.parser.parse(data, Options)
+        expected = links(program)
+        program.accept(ParentVisitor())
+        self.assertEqual(links(program), expected, name)
+        for node in nodes(program):
+            if isinstance(node, StatementList):
+                for statement in node.statements:
+                    self.assertFalse(statement is None or isinstance(statement, StatementList), name)
+
+    def test_test_programs(self):
+        for name, data, source_map in testPrograms():
+            self.check(data, name)
+
+    def test_synthetic_program(self):
+        data, source_map = indexProgram(extendedLines(LINES // (len(BLOCK) + len(LINKED_EXTRA)), LINKED_EXTRA))
+        self.check(data)
+
+class NodeConstructionTest(unittest.TestCase):
+    '''
+    The nodes built by the constructors which AstMeta generates must be those
+    built by AstNode.__init__ followed by a search of the class hierarchy for
+    each keyword argument.
+    '''
+
+    def check(self, data, name=None):
+        generated = syntax.parser.parse(data, Options)
+        searched = searchingParse(data)
+        self.assertEqual(summariseLinks(searched), summariseLinks(generated), name)
+
+    def test_test_programs(self):
+        for name, data, source_map in testPrograms():
+            self.check(data, name)
+
+    def test_synthetic_program(self):
+        data, source_map = indexProgram(programLines(LINES // len(BLOCK)))
+        self.check(data)
+
+class NodeIndexTest(unittest.TestCase):
+    '''
+    The nodes of each kind in the node index must be those found by traversing
+    the AST, as must the DATA extracted from the index, also after editing.
+    '''
+
+    def setUp(self):
+        lines = extendedLines(LINES // (len(BLOCK) + len(INDEXED_EXTRA)), INDEXED_EXTRA)
+        self.program = preparedProgram(lines)
+
+    def check(self):
+        all_nodes = nodes(self.program)
+        for kind in INDEXED_KINDS:
+            indexed = set(map(id, self.program.node_index.instances(kind)))
+            self.assertEqual(indexed, set(id(node) for node in all_nodes if isinstance(node, kind)), kind.__name__)
+        traversed = DataVisitor()
+        self.program.accept(traversed)
+        indexed = DataVisitor()
+        indexed.extract(self.program.node_index)
+        self.assertEqual(indexed.data, traversed.data)
+        self.assertEqual(indexed.index, traversed.index)
+
+    def test_prepared_program(self):
+        self.check()
+
+    def test_edited_program(self):
+        editStatements(self.program, len(self.program.node_index.instances(AstStatement)) // 100, replace=True)
+        csv = ConvertSubVisitor()
+        with silenced():
+            for ret in self.program.node_index.instances(Return):
+                csv.visit(ret)
+        self.check()
+
+class SuccessorIndexTest(unittest.TestCase):
+    '''
+    The successor of every statement in the index must be the statement located
+    by searching up through the enclosing statements, also after editing.
+    '''
+
+    def setUp(self):
+        self.program = preparedProgram(nestedProgramLines(LINES, 10))
+        indexSuccessors(self.program)
+
+    def check(self):
+        for statement in statements(self.program):
+            self.assertTrue(statement.linear_successor is searchFollowingStatement(statement))
+
+    def test_prepared_program(self):
+        self.check()
+
+    def test_edited_program(self):
+        editStatements(self.program, len(statements(self.program)) // 100)
+        self.check()
+
+class PassFusionTest(unittest.TestCase):
+    '''
+    The passes fused by runPasses must prepare the same AST, with the same line
+    numbers and DATA, as the passes run one traversal each.
+    '''
+
+    def test_fused_passes(self):
+        lines = extendedLines(LINES // (len(BLOCK) + len(FUSED_EXTRA)), FUSED_EXTRA)
+        data, source_map = indexProgram(lines)
+        expected = summarisePasses(*preparePasses(data, source_map, False))
+        actual = summarisePasses(*preparePasses(data, source_map, True))
+        self.assertEqual(actual, expected)
+
+    def test_hooks_follow_class_changes(self):
+        class CountingPass(Visitor, FusiblePass):
+            def enterAstStatement(self, node):
+                pass
+        before = hooks(CountingPass, Print)[0]
+        CountingPass.enterPrint = lambda self, node: None
+        added = hooks(CountingPass, Print)[0]
+        del CountingPass.enterPrint
+        removed = hooks(CountingPass, Print)[0]
+        self.assertTrue(added is not before)
+        self.assertTrue(removed is before)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.CRITICAL)
+    unittest.main()
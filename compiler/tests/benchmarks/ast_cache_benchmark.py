@@ -0,0 +1,76 @@
+'''
+Benchmark for the binary AST serialization of syntax/ast_cache.py, with which
+parsed programs are cached. A long synthetic program is parsed, serialized and
+loaded again, and the time taken to load it is compared with the time taken to
+parse it. The first load of each program also generates the restoring
+functions of its node classes, as when a program is loaded once by the
+compiler, so it is reported apart from the quickest load. The loaded trees are
+checked by syntax_tests.py.
+
+Usage: python ast_cache_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from syntax import ast_cache
+from synthetic_programs import Options, BLOCK, programLines, indexProgram
+
+# The number of times each program is parsed and loaded, of which the quickest is timed
+REPEATS = 3
+
+def best(previous, elapsed):
+    return elapsed if previous is None else min(previous, elapsed)
+
+def measure(data, options):
+    '''
+    :returns: The size of the serialized form of the program, the shortest times
+              taken to parse and load the program, the time taken to serialize
+              it, and the time taken by the first load.
+    '''
+    # The tree from the previous attempt is freed before each is timed
+    parse_time = program = None
+    for attempt in xrange(REPEATS):
+        program = None
+        start = time.time()
+        program = syntax.parser.parse(data, options)
+        parse_time = best(parse_time, time.time() - start)
+    start = time.time()
+    serialized = ast_cache.dumps(program)
+    dump_time = time.time() - start
+    ast_cache._restorers.clear()
+    load_time = first_load_time = None
+    for attempt in xrange(REPEATS):
+        loaded = None
+        start = time.time()
+        loaded = ast_cache.loads(serialized)
+        elapsed = time.time() - start
+        load_time = best(load_time, elapsed)
+        first_load_time = first_load_time or elapsed
+    return len(serialized), parse_time, dump_time, load_time, first_load_time
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    syntax.parser.sharedParser(Options)
+
+    data, source_map = indexProgram(programLines(blocks))
+    for compact in (False, True):
+        options = Options()
+        options.compact_positions = compact
+        size, parse_time, dump_time, load_time, first_load_time = measure(data, options)
+        print "%d lines, %s positions, %d bytes" % (len(source_map), "compact" if compact else "tracked", size)
+        print "parse:     %8.3f s" % parse_time
+        print "serialize: %8.3f s" % dump_time
+        print "load:      %8.3f s (%.1f times faster than parsing)" % (load_time, parse_time / load_time)
+        print "first load:%8.3f s (%.1f times faster than parsing)" % (first_load_time, parse_time / first_load_time)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,82 @@
+'''
+Memory benchmark for the AstNodes of syntax/ast_meta.py, which store their
+children and options in slots. A long synthetic program is parsed, with its
+parents, and the bytes used by each node and the containers it owns are
+measured. For comparison, the size of each node with the instance, children and
+options dictionaries which AstNodes had before they had slots is computed.
+
+Usage: python ast_memory_benchmark.py [lines]
+'''
+
+import sys
+import os
+import gc
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from cfg_vertex import CfgVertex
+from synthetic_programs import Options, BLOCK, programLines, indexProgram, nodes
+
+class DictionaryNode(object):
+    '''An object with an instance dictionary, as AstNodes were before they had slots.'''
+    pass
+
+def ownedContainers(node):
+    '''
+    :returns: The dictionaries, lists and sets referred to by the slots of a node,
+              including its instance dictionary if it has one.
+    '''
+    return [referent for referent in gc.get_referents(node) if isinstance(referent, (dict, list, set))]
+
+def slotBytes(node):
+    '''
+    :returns: The bytes used by a node and the containers it owns.
+    '''
+    return sys.getsizeof(node) + sum(sys.getsizeof(container) for container in ownedContainers(node))
+
+def dictionaryBytes(node, dictionary_node_size):
+    '''
+    :returns: The bytes which a node and the containers it owns would use if the node
+              had an instance dictionary holding dictionaries of its children and options.
+    '''
+    attributes = {}
+    for name in ('parent', 'parent_property', 'parent_index', '_AstNode__symbol_table'):
+        if hasattr(node, name):
+            attributes[name] = getattr(node, name)
+    if isinstance(node, CfgVertex):
+        for name in CfgVertex.vertex_slots:
+            attributes[name] = getattr(node, name)
+    attributes['_children'] = node.children
+    attributes['_options'] = node.options
+    size = dictionary_node_size + sys.getsizeof(attributes)
+    size += sys.getsizeof(attributes['_children']) + sys.getsizeof(attributes['_options'])
+    for container in ownedContainers(node):
+        if isinstance(container, dict):
+            # The instance dictionary, the entries of which would have been in attributes
+            size += sys.getsizeof(dict(container, **attributes)) - sys.getsizeof(attributes)
+        else:
+            size += sys.getsizeof(container)
+    return size
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+
+    data, source_map = indexProgram(programLines(blocks))
+    program = syntax.parser.parse(data, Options)
+
+    all_nodes = nodes(program)
+    slot_bytes = sum(slotBytes(node) for node in all_nodes)
+    dictionary_node_size = sys.getsizeof(DictionaryNode())
+    dictionary_bytes = sum(dictionaryBytes(node, dictionary_node_size) for node in all_nodes)
+    print "%d lines, %d nodes" % (len(source_map), len(all_nodes))
+    print "with dictionaries: %8.1f bytes per node" % (float(dictionary_bytes) / len(all_nodes))
+    print "with slots:        %8.1f bytes per node" % (float(slot_bytes) / len(all_nodes))
+    print "saving: %.0f%%" % (100.0 * (dictionary_bytes - slot_bytes) / dictionary_bytes)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,50 @@
+'''
+Benchmark for the approximate topological ordering of flow/traversal.py, by
+which orderBasicBlocks orders the basic blocks of each routine. Synthetic
+control flow graphs are built, of straight-line code broken by branches
+forward and by loops nested within one another. The time taken to order small
+graphs is compared with that taken by the recursive orderer which was used
+before, and the time taken to order graphs of increasing size is reported,
+which should grow linearly with the number of vertices. The orders are checked
+by flow_tests.py.
+
+Usage: python block_order_benchmark.py [vertices]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from flow.traversal import approximateTopologicalOrder, depthFirstSearch
+from flow_tests import ORDER_SIZES, RecursiveOrderer, orderGraph
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    largest = int(args[0]) if len(args) > 0 else 100000
+
+    for size in ORDER_SIZES:
+        start = orderGraph(size, size)
+        begin = time.time()
+        approximateTopologicalOrder(start)
+        elapsed = time.time() - begin
+        begin = time.time()
+        RecursiveOrderer(start, set(depthFirstSearch(start)))
+        recursive_elapsed = time.time() - begin
+        print "%8d vertices: %8.3f s, recursive %8.3f s" % (size, elapsed, recursive_elapsed)
+
+    size = 1000
+    while size <= largest:
+        start = orderGraph(size, size)
+        begin = time.time()
+        approximateTopologicalOrder(start)
+        elapsed = time.time() - begin
+        print "%8d vertices: %8.3f s, %5.2f us per vertex" % (size, elapsed, 1e6 * elapsed / size)
+        size *= 10
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+'''
+Memory benchmark for the control flow graph store of cfg_store.py. A long
+synthetic program is parsed and prepared, and its control flow graph created,
+after which the memory used by the store is compared with that which would be
+used by the sets of edges and entry points which each vertex held before. The
+edges of the store are checked by flow_tests.py.
+
+Usage: python cfg_store_benchmark.py [lines]
+'''
+
+import sys
+import os
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from cfg_store import RELATIONS
+from synthetic_programs import BLOCK, programLines
+from flow_tests import edges, controlFlowGraph
+
+def setBytes(graph):
+    '''
+    :returns: The bytes which would be used by the vertices of graph if each held
+              a set for each relation, and a set of its entry points.
+    '''
+    size = 0
+    for vertex in graph.vertices:
+        size += sum(sys.getsizeof(set(edges(vertex, relation))) for relation in RELATIONS)
+        size += sys.getsizeof(set(vertex.entryPoints))
+    return size
+
+def storeBytes(graph):
+    '''
+    :returns: The bytes used by the compacted store of graph, excluding the
+              vertices themselves.
+    '''
+    graph.compact()
+    size = sys.getsizeof(graph.vertices)
+    for relation in RELATIONS:
+        offsets, targets = graph.csr(relation)
+        size += sys.getsizeof(offsets) + sys.getsizeof(targets)
+    entry_points = graph._CfgStore__entry_points
+    size += sys.getsizeof(entry_points)
+    size += sum(sys.getsizeof(names) for names in graph._CfgStore__name_sets)
+    return size
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+
+    lines = programLines(blocks)
+    program, graph = controlFlowGraph(lines)
+    set_bytes = setBytes(graph)
+    store_bytes = storeBytes(graph)
+    print "%d lines, %d vertices, %d edges" % (len(lines), len(graph),
+                                              sum(len(graph.csr(relation)[1]) for relation in RELATIONS))
+    print "vertex sets:      %10d bytes" % set_bytes
+    print "compressed store: %10d bytes" % store_bytes
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,42 @@
+'''
+Benchmark for the compact_positions option of syntax/parser.py. A long
+synthetic program is parsed with the positions tracked by the parser and set by
+SourceDebuggingVisitor, and with compact positions resolved from the TokenSpans
+table, and the times taken are compared. The positions are checked by
+syntax_tests.py.
+
+Usage: python compact_positions_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from synthetic_programs import Options, BLOCK, programLines, indexProgram
+from syntax_tests import trackedPositions, compactPositions
+
+def timed(positions, data, source_map):
+    start = time.time()
+    result = positions(data, source_map)
+    return result, time.time() - start
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    syntax.parser.sharedParser(Options)
+
+    data, source_map = indexProgram(programLines(blocks))
+    tracked, tracked_time = timed(trackedPositions, data, source_map)
+    compact, compact_time = timed(compactPositions, data, source_map)
+    print "%d lines, %d statements" % (len(source_map), len(tracked))
+    print "tracked positions: %8.3f s" % tracked_time
+    print "compact positions: %8.3f s" % compact_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,43 @@
+'''
+Benchmark for the elimination of unreachable code and unused procedures and
+functions by flow/dead_code_eliminator.py. Synthetic programs of live code,
+lines skipped by GOTO, and procedures and functions which are called only from
+unreachable code, or from each other, are compiled as far as their basic
+blocks, and the time taken by the elimination of programs of increasing size
+is reported. What is removed is checked by flow_tests.py.
+
+Usage: python dead_code_benchmark.py [blocks]
+'''
+
+import sys
+import os
+import gc
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from flow import eliminateDeadCode
+from synthetic_programs import Options, preparedProgram
+from flow_tests import deadCodeProgram
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    largest = int(args[0]) if len(args) > 0 else 1000
+
+    blocks = 10
+    while blocks <= largest:
+        text = deadCodeProgram(blocks)
+        program, entry_points = preparedProgram(text)
+        # Collect the garbage of the earlier passes, so it is not collected during the elimination
+        gc.collect()
+        start = time.time()
+        node_count, method_count = eliminateDeadCode(program, entry_points, Options)
+        print "%7d lines: elimination %7.3f s, removed %d nodes and %d methods" % (
+            text.count('\n'), time.time() - start, node_count, method_count)
+        blocks *= 10
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,48 @@
+'''
+Throughput benchmark for the table-driven detokeniser in decoder.py against
+the regular expression substitution it replaced. A synthetic program is
+decoded by both implementations, the output of which is checked by
+syntax_tests.py.
+
+Usage: python detokenise_benchmark.py [lines] [repeats]
+'''
+
+import sys
+import os
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import decoder
+from synthetic_programs import tokenisedLines
+from syntax_tests import legacyDetokenise
+
+def measure(detokenise, lines, repeats):
+    best = None
+    for _ in xrange(repeats):
+        start = time.clock()
+        for line in lines:
+            detokenise(line)
+        elapsed = time.clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    count = int(args[0]) if len(args) > 0 else 20000
+    repeats = int(args[1]) if len(args) > 1 else 5
+    lines = tokenisedLines(count)
+    size = sum(len(line) for line in lines)
+
+    acorn = decoder.BbcBasicAcornDecoder('')
+    legacy = measure(legacyDetokenise, lines, repeats)
+    table = measure(acorn.detokenise, lines, repeats)
+    print "%d lines, %d bytes" % (count, size)
+    print "re.sub detokeniser:       %8.3f s  %8.0f KB/s" % (legacy, size / legacy / 1024)
+    print "table-driven detokeniser: %8.3f s  %8.0f KB/s" % (table, size / table / 1024)
+    print "speedup: %.2fx" % (legacy / table)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
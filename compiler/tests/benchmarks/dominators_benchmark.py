@@ -0,0 +1,44 @@
+'''
+Benchmark for the dominator and post-dominator trees of flow/dominators.py.
+The time taken to compute the trees, and the dominance frontiers, of random
+graphs of basic blocks of increasing size is reported. The trees are checked
+by flow_tests.py.
+
+Usage: python dominators_benchmark.py [blocks]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from flow.dominators import DominatorTree
+from flow_tests import randomGraph
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    largest = int(args[0]) if len(args) > 0 else 100000
+
+    size = 1000
+    while size <= largest:
+        entry_block = randomGraph(size, size)
+        start = time.time()
+        tree = DominatorTree(entry_block)
+        dominator_time = time.time() - start
+        start = time.time()
+        DominatorTree(entry_block, post=True)
+        post_time = time.time() - start
+        start = time.time()
+        for block in tree.blocks:
+            tree.frontier(block)
+        frontier_time = time.time() - start
+        print "%8d blocks: dominators %7.3f s, post-dominators %7.3f s, frontiers %7.3f s" % (
+            len(tree.blocks), dominator_time, post_time, frontier_time)
+        size *= 10
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+'''
+Benchmark for the interning of identifiers and literal values by the parser,
+with the InternTable of syntax/intern_table.py. A long synthetic program of
+procedures, each with its own parameters and local variables, which also use
+globals shared by a few procedures and by all of them, is parsed. The bytes
+which the strings and integers held by the nodes would use without interning
+are compared with those they use, and the types of the variables are decoded
+from their sigils both by spelling and by symbol id. The interning is checked
+by syntax_tests.py.
+
+Usage: python intern_table_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from syntax.intern_table import SYMBOL_NODES, LITERAL_NODES
+import sigil
+from synthetic_programs import Options, PROCEDURE, procedureLines, parseProgram, nodes
+
+def valueBytes(program):
+    '''
+    :returns: The bytes which the identifiers and literal values of the nodes
+              would use if each node had its own copy, and the bytes they use.
+    '''
+    values = [node.identifier if isinstance(node, SYMBOL_NODES) else node.value
+              for node in nodes(program) if isinstance(node, SYMBOL_NODES + LITERAL_NODES)]
+    # Integers from -5 to 256 are always shared
+    copied = sum(sys.getsizeof(value) for value in values
+                 if not (isinstance(value, int) and -5 <= value <= 256))
+    distinct = dict((id(value), value) for value in values)
+    shared = sum(sys.getsizeof(value) for value in distinct.itervalues())
+    return copied, shared
+
+def decodeTime(variables, by_symbol_id):
+    '''
+    :returns: The time taken to decode the types of the variables.
+    '''
+    start = time.time()
+    if by_symbol_id:
+        types = {}
+        for variable in variables:
+            try:
+                types[variable.symbol_id]
+            except KeyError:
+                types[variable.symbol_id] = sigil.identifierToType(variable.identifier)
+    else:
+        for variable in variables:
+            sigil.identifierToType(variable.identifier)
+    return time.time() - start
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    procedures = (int(args[0]) if len(args) > 0 else 20000) // len(PROCEDURE)
+    syntax.parser.sharedParser(Options)
+
+    program, data, source_map = parseProgram(procedureLines(procedures))
+    copied, shared = valueBytes(program)
+    variables = [node for node in nodes(program) if isinstance(node, SYMBOL_NODES[:1])]
+    spelling_time = decodeTime(variables, False)
+    symbol_id_time = decodeTime(variables, True)
+    print "%d lines, %d identifiers, %d symbol ids" % (len(source_map), len(variables), len(program.intern_table))
+    print "identifiers and literals copied:   %10d bytes" % copied
+    print "identifiers and literals interned: %10d bytes" % shared
+    print "decode types by spelling:  %8.3f s" % spelling_time
+    print "decode types by symbol id: %8.3f s" % symbol_id_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
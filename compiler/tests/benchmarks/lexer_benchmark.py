@@ -0,0 +1,51 @@
+'''
+Throughput benchmark for the keyword trie lexer in syntax/trie_lexer.py against
+the PLY lexer built from the same rules. Copies of the test programs are lexed
+by both lexers, the token streams of which are checked by syntax_tests.py.
+
+Usage: python lexer_benchmark.py [copies] [repeats]
+'''
+
+import sys
+import os
+import glob
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import ply.lex as lex
+import syntax.lexer
+from syntax.trie_lexer import TrieLexer
+from synthetic_programs import TEST_DIR
+from syntax_tests import lexTokens
+
+def timeLexer(lexer, data, repeats):
+    best = None
+    for i in xrange(repeats):
+        start = time.time()
+        lexTokens(lexer, data)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    copies = int(args[0]) if len(args) > 0 else 20
+    repeats = int(args[1]) if len(args) > 1 else 3
+
+    ply_lexer = lex.lex(module=syntax.lexer)
+    trie_lexer = TrieLexer(syntax.lexer)
+
+    programs = [open(filename, 'rb').read() for filename in sorted(glob.glob(os.path.join(TEST_DIR, '*.bbctxt')))]
+    data = ''.join(programs) * copies
+    ply_time = timeLexer(ply_lexer, data, repeats)
+    trie_time = timeLexer(trie_lexer, data, repeats)
+    print "%d programs, %d bytes" % (len(programs) * copies, len(data))
+    print "PLY lexer:  %8.3f s" % ply_time
+    print "trie lexer: %8.3f s" % trie_time
+    print "speedup: %.2fx" % (ply_time / trie_time)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+'''
+Benchmark for the loop nesting forest of flow/loop_forest.py, and the
+loop-aware layout of flow/basic_block_orderer.py. The branches which the code
+generator would emit between the basic blocks of a synthetic program of loops
+built with GOTO are counted for the layout and for the approximate topological
+order, weighting each by ten to the power of its loop depth, and the time taken
+to find the loops of, and lay out, random structured graphs of increasing size
+is reported. The loops and layouts are checked by flow_tests.py.
+
+Usage: python loop_forest_benchmark.py [blocks]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from flow.loop_forest import findLoops
+from flow.basic_block_orderer import layoutBlocks
+from flow.traversal import approximateTopologicalOrder
+from synthetic_programs import basicBlocks
+from flow_tests import GOTO_LOOPS, gotoProgram, structuredGraph
+
+def branches(order):
+    '''
+    :returns: The number of branches between the blocks in order, and their
+              number weighted by ten to the power of the loop depth of each.
+    '''
+    count = weighted = 0
+    for i, block in enumerate(order):
+        following = order[i + 1] if i + 1 < len(order) else None
+        successors = list(block.outEdges)
+        if len(successors) == 1:
+            branch = successors[0] is not following
+        elif len(successors) == 2:
+            # One conditional branch, and an unconditional one if neither successor follows
+            branch = 1 + (following not in successors)
+        else:
+            branch = 0
+        count += branch
+        weighted += branch * 10 ** block.loop_depth
+    return count, weighted
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    largest = int(args[0]) if len(args) > 0 else 100000
+
+    basic_blocks = basicBlocks(gotoProgram(3000 // len(GOTO_LOOPS)))
+    ordered = topological = (0, 0)
+    for entry_block in basic_blocks.values():
+        forest = findLoops(entry_block)
+        ordered = map(sum, zip(ordered, branches(layoutBlocks(forest))))
+        topological = map(sum, zip(topological, branches(approximateTopologicalOrder(entry_block))))
+    print "compiled program, %d entry points" % len(basic_blocks)
+    print "branches in topological order: %6d, weighted by loop depth %8d" % tuple(topological)
+    print "branches in loop-aware layout: %6d, weighted by loop depth %8d" % tuple(ordered)
+
+    size = 1000
+    while size <= largest:
+        entry_block = structuredGraph(size, size)
+        start = time.time()
+        forest = findLoops(entry_block)
+        loop_time = time.time() - start
+        start = time.time()
+        layoutBlocks(forest)
+        layout_time = time.time() - start
+        print "%8d blocks, %6d loops: loop forest %7.3f s, layout %7.3f s" % (
+            len(forest.root.allBlocks()), len(forest.loops), loop_time, layout_time)
+        size *= 10
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+'''
+Benchmark for the construction of AST nodes by the constructors which AstMeta
+generates for each node class. A long synthetic program is parsed with the
+generated constructors, and with nodes constructed as they were before, by
+AstNode.__init__ followed by a search of the class hierarchy for each keyword
+argument, and the times taken are compared. The trees are checked by
+ast_tests.py.
+
+Usage: python node_construction_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from synthetic_programs import Options, BLOCK, programLines, indexProgram
+from ast_tests import searchingParse
+
+# The number of times the program is parsed, of which the quickest is timed
+REPEATS = 3
+
+def parseTime(parse, data):
+    '''
+    :returns: The shortest time taken to parse data
+    '''
+    elapsed = None
+    for attempt in xrange(REPEATS):
+        start = time.time()
+        parse(data, Options)
+        elapsed = time.time() - start if elapsed is None else min(elapsed, time.time() - start)
+    return elapsed
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    syntax.parser.sharedParser(Options)
+
+    data, source_map = indexProgram(programLines(blocks))
+    generated_time = parseTime(syntax.parser.parse, data)
+    searching_time = parseTime(searchingParse, data)
+    print "%d lines" % len(source_map)
+    print "parse with searching constructors: %8.3f s" % searching_time
+    print "parse with generated constructors: %8.3f s" % generated_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
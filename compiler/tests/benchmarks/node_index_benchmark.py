@@ -0,0 +1,46 @@
+'''
+Benchmark for the node index of node_index.py. A long synthetic program, with
+subroutines, DATA and function calls, is parsed and prepared, which indexes its
+nodes. The time taken to set the type of the calls to a function by traversing
+the AST is compared with that taken using the index. The index is checked by
+ast_tests.py.
+
+Usage: python node_index_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from syntax.ast import UserFunc
+from typing.set_function_type_visitor import SetFunctionTypeVisitor
+from typing.type_system import IntegerOwlType
+from synthetic_programs import BLOCK, extendedLines, silenced
+from ast_tests import INDEXED_EXTRA, preparedProgram
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // (len(BLOCK) + len(INDEXED_EXTRA))
+
+    lines = extendedLines(blocks, INDEXED_EXTRA)
+    program = preparedProgram(lines)
+    sftv = SetFunctionTypeVisitor('FNtwice0', IntegerOwlType())
+    with silenced():
+        start = time.time()
+        program.accept(sftv)
+        traversal_time = time.time() - start
+        start = time.time()
+        for user_func in program.node_index.instances(UserFunc):
+            sftv.setType(user_func)
+        index_time = time.time() - start
+    print "%d lines, %d nodes indexed" % (len(lines), len(program.node_index))
+    print "set function type by traversal: %8.3f s" % traversal_time
+    print "set function type by index:     %8.3f s" % index_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,61 @@
+'''
+Benchmark for parsing programs in worker processes with the parse_jobs option
+of syntax/parser.py. A long synthetic program with many procedure definitions
+is parsed serially and in parallel. The time taken by the workers, which parse
+and serialize their chunks, is reported apart from that taken to load the
+chunks into a single tree, which is the serial part of a parallel parse. The
+parallel trees are checked by syntax_tests.py.
+
+Usage: python parallel_parse_benchmark.py [lines] [jobs]
+'''
+
+import sys
+import os
+import time
+import logging
+import multiprocessing
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from syntax import ast_cache
+from syntax.intern_table import InternTable
+from synthetic_programs import Options, BLOCK, programLines, indexProgram
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def loadChunks(results):
+    intern_table = InternTable()
+    return [ast_cache.loads(result, intern_table) for result in results]
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    jobs = int(args[1]) if len(args) > 1 else 4
+    syntax.parser.sharedParser(Options)
+
+    data, source_map = indexProgram(programLines(blocks))
+    options = Options()
+    options.parse_jobs = jobs
+    # Parse in parallel first, so the workers do not inherit the serial tree
+    program, parallel_time = timed(syntax.parser.parse, data, options)
+    expected, serial_time = timed(syntax.parser.parse, data, Options)
+
+    chunks = syntax.parser.definitionChunks(data, jobs * syntax.parser.CHUNKS_PER_JOB)
+    tasks = [(data[start:end], start, line, options) for start, end, line in chunks]
+    results, chunk_time = timed(map, syntax.parser.parseChunk, tasks)
+    _, load_time = timed(loadChunks, results)
+
+    print "%d lines, %d chunks, %d CPUs" % (len(source_map), len(chunks), multiprocessing.cpu_count())
+    print "serial parse:             %8.3f s" % serial_time
+    print "parallel parse (%2d jobs): %8.3f s" % (jobs, parallel_time)
+    print "parse and serialize chunks in one process: %8.3f s" % chunk_time
+    print "load chunks:                               %8.3f s" % load_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
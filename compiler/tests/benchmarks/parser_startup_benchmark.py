@@ -0,0 +1,68 @@
+'''
+Startup benchmark for building the lexer and parser in syntax/parser.py.
+Each start is timed in a fresh process: a cold start generates the tables into
+an empty table directory, and warm starts load them from that directory.
+
+Usage: python parser_startup_benchmark.py [warm repeats]
+'''
+
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+
+COMPILER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+STARTUP_SCRIPT = r'''
+import sys
+import time
+sys.path.insert(0, %r)
+import syntax.parser
+
+class Options(object):
+    verbose = False
+    debug_lex = False
+    table_dir = %r
+
+start = time.time()
+syntax.parser.sharedLexer(Options)
+syntax.parser.sharedParser(Options)
+first = time.time() - start
+start = time.time()
+syntax.parser.sharedLexer(Options)
+syntax.parser.sharedParser(Options)
+again = time.time() - start
+print first, again
+'''
+
+def startup(table_dir):
+    '''
+    :returns: A 2-tuple of the time taken to build the lexer and parser in a new
+              process, and to retrieve them again within that process.
+    '''
+    script = STARTUP_SCRIPT % (COMPILER_DIR, table_dir)
+    process = subprocess.Popen([sys.executable, '-c', script],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        raise Exception, err
+    first, again = out.split()
+    return float(first), float(again)
+
+def main(args):
+    repeats = int(args[0]) if len(args) > 0 else 5
+    table_dir = tempfile.mkdtemp()
+    try:
+        cold, cold_again = startup(table_dir)
+        warm = min(startup(table_dir)[0] for _ in xrange(repeats))
+    finally:
+        shutil.rmtree(table_dir)
+    print "cold start (generate tables): %8.3f s" % cold
+    print "warm start (cached tables):   %8.3f s" % warm
+    print "reuse within a process:       %8.3f s" % cold_again
+    print "speedup: %.0fx" % (cold / warm)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+'''
+Benchmark for the fused passes of pass_fusion.py. A long synthetic program is
+parsed twice. The passes which prepare the AST for control flow analysis are
+run over one tree by visiting it once for each pass, and over the other with
+runPasses, which fuses them into fewer traversals, and the times taken are
+compared. The prepared trees are checked by ast_tests.py.
+
+Usage: python pass_fusion_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from pass_fusion import runPasses
+from synthetic_programs import Options, BLOCK, extendedLines, indexProgram
+from ast_tests import FUSED_EXTRA, createPasses
+
+def prepare(data, source_map, fused):
+    '''
+    :returns: The number of traversals, and the time taken to prepare the program.
+    '''
+    program = syntax.parser.parse(data, Options)
+    passes = createPasses(data, source_map)
+    start = time.time()
+    if fused:
+        traversals = len(runPasses(program, passes))
+    else:
+        for p in passes:
+            program.accept(p)
+        traversals = len(passes)
+    return traversals, time.time() - start
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // (len(BLOCK) + len(FUSED_EXTRA))
+    syntax.parser.sharedParser(Options)
+
+    data, source_map = indexProgram(extendedLines(blocks, FUSED_EXTRA))
+    separate_traversals, separate_time = prepare(data, source_map, False)
+    fused_traversals, fused_time = prepare(data, source_map, True)
+    print "%d lines" % len(source_map)
+    print "separate passes: %d traversals %8.3f s" % (separate_traversals, separate_time)
+    print "fused passes:    %d traversals %8.3f s" % (fused_traversals, fused_time)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+'''
+Benchmark for the incremental reparse in syntax/parser.py. A synthetic program
+is edited one line at a time, and the time taken to reparse each edit
+incrementally is compared with that taken to parse it from scratch. The edits
+are then reparsed one after another with the deferred position shifts left
+pending, and applied once at the end. The reparsed trees are checked by
+syntax_tests.py.
+
+Usage: python reparse_benchmark.py [lines]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from synthetic_programs import Options, BLOCK, programLines, indexProgram, parseProgram
+from syntax_tests import EDITS, edit
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def reparseTime(program, lines, source_map, blocks, edit_args):
+    '''
+    Reparse one of EDITS of the program of lines, from a program of blocks BLOCKs.
+    :returns: The reparsed program, the edited lines and their SourceMap, and the
+              time taken by the reparse.
+    '''
+    name, block, offset, body = edit_args
+    new_lines, number = edit(lines, blocks // 2 + block, offset, body)
+    new_data, new_source_map = indexProgram(new_lines)
+    program, elapsed = timed(syntax.parser.reparse, program, new_data, new_source_map, source_map,
+                             set([number]), Options)
+    return program, new_lines, new_source_map, elapsed
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    original_lines = lines = programLines(blocks)
+    program, data, source_map = parseProgram(lines)
+
+    for edit_args in EDITS:
+        program, lines, source_map, reparse_time = reparseTime(program, lines, source_map, blocks, edit_args)
+        syntax.parser.applyPositionShifts(program)
+        _, full_time = timed(parseProgram, lines)
+        print "%-22s parse %8.3f s  reparse %8.3f s" % (edit_args[0], full_time, reparse_time)
+
+    lines = original_lines
+    program, data, source_map = parseProgram(lines)
+    total_time = 0.0
+    for edit_args in EDITS:
+        program, lines, source_map, reparse_time = reparseTime(program, lines, source_map, blocks, edit_args)
+        total_time += reparse_time
+    pending = len(program.position_shifts)
+    _, apply_time = timed(syntax.parser.applyPositionShifts, program)
+    print "%-22s reparse %6.3f s  apply %d shifts %6.3f s" % ("all edits", total_time, pending, apply_time)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
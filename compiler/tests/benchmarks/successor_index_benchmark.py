@@ -0,0 +1,44 @@
+'''
+Benchmark for the successor index of ast_utils.py. A long synthetic program,
+with multi-line IF statements nested to the given depth, is parsed and
+prepared, and the time taken to build the successor index is compared with
+that taken to locate the successor of every statement by searching up through
+the enclosing statements. The index is checked by ast_tests.py.
+
+Usage: python successor_index_benchmark.py [lines] [depth]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from ast_utils import indexSuccessors, searchFollowingStatement
+from ast_tests import nestedProgramLines, preparedProgram, statements
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    lines = int(args[0]) if len(args) > 0 else 20000
+    depth = int(args[1]) if len(args) > 1 else 10
+
+    numbered = nestedProgramLines(lines, depth)
+    program = preparedProgram(numbered)
+    all_statements = statements(program)
+
+    start = time.time()
+    for statement in all_statements:
+        searchFollowingStatement(statement)
+    search_time = time.time() - start
+    start = time.time()
+    indexSuccessors(program)
+    index_time = time.time() - start
+    print "%d lines, %d statements, nested to depth %d" % (len(numbered), len(all_statements), depth)
+    print "search for each statement: %8.3f s" % search_time
+    print "build successor index:     %8.3f s" % index_time
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
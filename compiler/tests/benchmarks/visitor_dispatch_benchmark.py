@@ -0,0 +1,91 @@
+'''
+Micro-benchmark for the cached visitor method dispatch of visitor.Visitable.
+Each node of a long synthetic program accepts visitors with the visitor methods
+of TypecheckVisitor, FlowgraphForwardVisitor and, where the CLR is available,
+CilVisitor, replaced by methods which do nothing, so only the dispatch itself
+is timed. The cached dispatch is compared with the search through the visitor
+and node classes which accept made for every visit before it had the cache.
+
+Usage: python visitor_dispatch_benchmark.py [lines] [repeats]
+'''
+
+import sys
+import os
+import time
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import syntax.parser
+from typing.typecheck_visitor import TypecheckVisitor
+from flow.flowgraph_visitor import FlowgraphForwardVisitor
+from synthetic_programs import Options, BLOCK, programLines, indexProgram, nodes
+
+def visitorClasses():
+    classes = [TypecheckVisitor, FlowgraphForwardVisitor]
+    try:
+        from codegen.clr.cil_visitor import CilVisitor
+        classes.append(CilVisitor)
+    except ImportError:
+        print "CilVisitor skipped, since the CLR is not available"
+    return classes
+
+def nullVisitor(visitor_class):
+    '''
+    :returns: An instance of a subclass of visitor_class, the visitor methods of
+              which do nothing.
+    '''
+    def visitNothing(self, node):
+        pass
+    methods = dict((name, visitNothing) for name in dir(visitor_class)
+                   if name.startswith('visit') and name != 'visit')
+    null_class = type('Null' + visitor_class.__name__, (visitor_class,), methods)
+    return object.__new__(null_class)
+
+def searchingAccept(node, klass, visitor):
+    '''
+    The accept method of Visitable before dispatch was cached.
+    '''
+    visitor_method = getattr(visitor, "visit%s" % klass.__name__, None)
+    if visitor_method is None:
+        last = None
+        for base in klass.__bases__:
+            last = searchingAccept(node, base, visitor)
+        return last
+    else:
+        return visitor_method(node)
+
+def timeVisits(all_nodes, visitor, cached, repeats):
+    best = None
+    for i in xrange(repeats):
+        start = time.time()
+        if cached:
+            for node in all_nodes:
+                node.accept(visitor)
+        else:
+            for node in all_nodes:
+                searchingAccept(node, node.__class__, visitor)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    blocks = (int(args[0]) if len(args) > 0 else 20000) // len(BLOCK)
+    repeats = int(args[1]) if len(args) > 1 else 3
+
+    data, source_map = indexProgram(programLines(blocks))
+    all_nodes = nodes(syntax.parser.parse(data, Options))
+    print "%d nodes" % len(all_nodes)
+    for visitor_class in visitorClasses():
+        visitor = nullVisitor(visitor_class)
+        searching_time = timeVisits(all_nodes, visitor, False, repeats)
+        cached_time = timeVisits(all_nodes, visitor, True, repeats)
+        print "%-24s search %6.3f us per visit, cached %6.3f us per visit" % (
+            visitor_class.__name__, 1e6 * searching_time / len(all_nodes), 1e6 * cached_time / len(all_nodes))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
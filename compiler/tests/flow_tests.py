@@ -0,0 +1,616 @@
+'''
+Tests of the control flow graph store, and of the analyses and transformations
+of the control flow graph in flow/.
+
+Usage: python flow_tests.py
+'''
+
+import sys
+import os
+import random
+import logging
+import tempfile
+import unittest
+from itertools import chain
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from main import prepareAst, compile as compileFile
+from syntax.ast import AstStatement, Rem
+from source_debugging import TextSeparators
+from cfg_vertex import CfgVertex
+from cfg_store import (newStore, currentStore, OUT_EDGES, IN_EDGES, COME_FROM_GOSUB_EDGES, LOOP_BACK_EDGES,
+                       LOOP_FROM_EDGES, RELATIONS)
+from node_index import nodeIndex
+from ast_utils import insertStatementBefore, insertStatementAfter, removeStatement
+from flow import createForwardControlFlowGraph, locateEntryPoints, identifyBasicBlocks, eliminateDeadCode
+from flow.basic_block import BasicBlock
+from flow.connectors import connect, connectLoop
+from flow.dominators import dominatorTree, postDominatorTree
+from flow.loop_forest import findLoops, blockSuccessors
+from flow.basic_block_orderer import layoutBlocks
+from flow.traversal import approximateTopologicalOrder, depthFirstSearch, depthFirstEvents, ENTER, EXIT
+from typing.typecheck import typecheck
+from synthetic_programs import (Options, BLOCK, programLines, programText, parseProgram, preparedProgram,
+                                basicBlocks, nodes, silenced)
+
+# The number of lines of the synthetic programs
+LINES = 2000
+
+# Each relation, with the relation which mirrors it
+MIRRORS = ((OUT_EDGES, IN_EDGES), (IN_EDGES, OUT_EDGES), (LOOP_BACK_EDGES, LOOP_FROM_EDGES),
+           (LOOP_FROM_EDGES, LOOP_BACK_EDGES))
+
+PROPERTIES = {OUT_EDGES: 'outEdges', IN_EDGES: 'inEdges', COME_FROM_GOSUB_EDGES: 'comeFromGosubEdges',
+              LOOP_BACK_EDGES: 'loopBackEdges', LOOP_FROM_EDGES: 'loopFromEdges'}
+
+# The sizes of the random graphs which are checked
+SMALL_SIZES = (1, 2, 10, 50, 200)
+
+# The sizes of the graphs compared with the recursive orderer
+ORDER_SIZES = (10, 100, 1000, 3000)
+
+# Loops built with GOTO, as in much old BBC BASIC, repeated throughout the program
+GOTO_LOOPS = [
+    'I%% = 0',
+    'I%% = I%% + 1',
+    'IF I%% > %(n)d THEN %(nested)d',
+    'PRINT I%%',
+    'GOTO %(counted)d',
+    'J%% = 0',
+    'J%% = J%% + 1 : K%% = 0',
+    'K%% = K%% + 1 : PRINT J%%, K%%',
+    'IF K%% < 5 THEN %(inner)d',
+    'IF J%% < 5 THEN %(outer)d',
+]
+
+# A block of a main program with dead code, repeated
+DEAD_CODE_BLOCK = [
+    'PROCused%(n)d(%(n)d)',
+    'X%% = FNtwice%(n)d(X%%)',
+    'GOSUB %(sub)d',
+    'GOTO %(skip)d',
+    'PRINT "Never"',
+    'PROCunused%(n)d',
+    'Y%% = FNunused%(n)d(X%%)',
+    'PRINT X%%',
+]
+
+# The procedures, functions and subroutine of each block, following the main program
+DEFINITIONS = [
+    'DEF PROCused%(n)d(A%%)',
+    'PRINT A%%',
+    'ENDPROC',
+    'DEF FNtwice%(n)d(A%%) = 2 * A%%',
+    'PRINT "After"',
+    'DEF PROCunused%(n)d',
+    'PROCchain%(n)d',
+    'ENDPROC',
+    'DEF PROCchain%(n)d',
+    'PRINT FNunused%(n)d(1)',
+    'ENDPROC',
+    'DEF FNunused%(n)d(A%%) = A%% + 1',
+    'PRINT "Subroutine"',
+    'RETURN',
+]
+
+# The numbers of procedures, functions and subroutines of each block which are
+# called, and which are never called
+USED = 3
+UNUSED = 3
+
+# Programs which call procedures and functions only by name at run time
+DYNAMIC_CALLS = [
+    '10 X = EVAL("FNdouble(21)")\n20 PRINT X\n30 END\n40 DEF FNdouble(A) = A * 2\n'
+    '50 DEF PROCunused\n60 ENDPROC\n',
+    '10 LIBRARY "helpers"\n20 END\n30 DEF FNhelper(A) = A + 1\n',
+]
+
+# A block of straight-line code, loops and branches, repeated to make a program
+# with many more statements than the recursion limit
+STRESS_BLOCK = [
+    'REM Block %(n)d',
+    'A%% = A%% + %(n)d : B = B * 1.5',
+    'FOR I%% = 1 TO 10 : S%% = S%% + I%% : NEXT',
+    'REPEAT : C%% = C%% + 1 : UNTIL C%% > %(n)d',
+    'WHILE D%% < %(n)d : D%% = D%% + 1 : ENDWHILE',
+    'IF A%% > %(n)d THEN PRINT "Big" ELSE PRINT "Small"',
+    'GOTO %(next)d',
+    'PRINT "Skipped"',
+    'PROCshow(A%%)',
+]
+
+# The end of the stress program, with the procedure and subroutine which it calls
+STRESS_TAIL = [
+    'END',
+    'DEF PROCshow(X%)',
+    'PRINT X%',
+    'ENDPROC',
+    'PRINT "Subroutine"',
+    'RETURN',
+]
+
+def edges(vertex, relation):
+    return getattr(vertex, PROPERTIES[relation])
+
+def cfgMismatches(graph):
+    '''
+    :returns: The number of edges which are not mirrored, and the number of rows
+              which differ between the vertices and the compressed sparse rows,
+              which compacts the graph.
+    '''
+    failures = 0
+    for vertex in graph.vertices:
+        for relation, mirror in MIRRORS:
+            failures += sum(vertex not in edges(target, mirror) for target in edges(vertex, relation))
+    rows = [[[target.id for target in edges(vertex, relation)] for relation in RELATIONS]
+            for vertex in graph.vertices]
+    for relation in RELATIONS:
+        offsets, targets = graph.csr(relation)
+        for vertex_id, vertex_rows in enumerate(rows):
+            failures += list(targets[offsets[vertex_id]:offsets[vertex_id + 1]]) != vertex_rows[relation]
+    return failures
+
+def controlFlowGraph(lines):
+    '''
+    :returns: The parsed program of the numbered lines, with its control flow
+              graph, and the CfgStore holding the graph.
+    '''
+    program, data, source_map = parseProgram(lines)
+    with silenced():
+        line_mapper, data_visitor = prepareAst(program, TextSeparators(data), source_map, Options)
+        createForwardControlFlowGraph(program, line_mapper, Options)
+        locateEntryPoints(program, line_mapper, Options)
+    return program, currentStore()
+
+def editGraph(program, count):
+    '''
+    Insert and remove count statements of the control flow graph at random.
+    '''
+    random.seed(42)
+    candidates = [s for s in nodes(program) if isinstance(s, AstStatement) and isinstance(s.parent_index, int)
+                  and s.graph is not None]
+    for i in xrange(count):
+        statement = random.choice(candidates)
+        choice = i % 3
+        if choice == 0:
+            insertStatementBefore(statement, Rem())
+        elif choice == 1:
+            insertStatementAfter(statement, Rem())
+        elif statement.parent_index > 0:
+            removeStatement(statement)
+            candidates.remove(statement)
+
+def dominatorSets(blocks, root, predecessors):
+    '''
+    :returns: A dictionary of the set of dominators of each of blocks, found by
+              iterating the data flow equations until they converge.
+    '''
+    everything = set(blocks)
+    dominators = dict((block, set(everything)) for block in blocks)
+    dominators[root] = set([root])
+    changed = True
+    while changed:
+        changed = False
+        for block in blocks:
+            if block is root:
+                continue
+            incoming = [dominators[p] for p in predecessors(block) if p in everything]
+            new = set.intersection(*incoming) | set([block]) if incoming else set([block])
+            if new != dominators[block]:
+                dominators[block] = new
+                changed = True
+    return dominators
+
+def dominatorFailures(tree, predecessors):
+    '''
+    :returns: The number of blocks for which tree disagrees with data flow
+              analysis, or whose dominance frontier differs from its definition.
+    '''
+    nodes = tree.nodes
+    expected = dominatorSets(nodes, nodes[0], predecessors)
+    count = 0
+    for block in tree.blocks:
+        found = set(n for n in nodes if tree.dominates(n, block))
+        count += found != expected[block]
+        frontier = set(b for b in nodes if b is not None
+                       and any(tree.dominates(block, p) for p in predecessors(b) if p in tree.numbers)
+                       and not tree.strictlyDominates(block, b))
+        count += frontier != set(tree.frontier(block))
+    return count
+
+def forwardChecks(entry_block):
+    tree = dominatorTree(entry_block)
+    return dominatorFailures(tree, lambda b: b.inEdges)
+
+def postChecks(entry_block):
+    tree = postDominatorTree(entry_block)
+    exits = set(block for block in tree.blocks if len(block.outEdges) == 0)
+    # Post-dominance is dominance of the reversed graph, in which None is the virtual exit
+    return dominatorFailures(tree, lambda b: exits if b is None else (list(b.outEdges) or [None]))
+
+def randomGraph(size, seed):
+    '''
+    :returns: The entry block of a random graph of size blocks, most of which
+              are reachable from it.
+    '''
+    random.seed(seed)
+    newStore()
+    blocks = [BasicBlock() for n in xrange(size)]
+    for n in xrange(size - 1):
+        connect(blocks[n], blocks[n + 1 + random.randrange(min(3, size - n - 1))])
+        if random.random() < 0.3:
+            connect(blocks[n], blocks[random.randrange(size)])
+    return blocks[0]
+
+def structuredGraph(size, seed):
+    '''
+    :returns: The entry block of a reducible graph of about size blocks, built
+              from sequences, conditionals, and loops with exits from their
+              headers and their bodies.
+    '''
+    random.seed(seed)
+    newStore()
+    entry = BasicBlock()
+    # Regions to be built, each a number of blocks, and the blocks which enter and leave it
+    pending = [(size, entry, BasicBlock())]
+    while pending:
+        size, enter, leave = pending.pop()
+        choice = random.random()
+        if size <= 1:
+            connect(enter, leave)
+        elif choice < 0.3:
+            middle = BasicBlock()
+            split = random.randrange(1, size)
+            pending.append((split, enter, middle))
+            pending.append((size - split, middle, leave))
+        elif choice < 0.6:
+            split = random.randrange(1, size)
+            pending.append((split, enter, leave))
+            pending.append((size - split, enter, leave))
+        else:
+            header, latch = BasicBlock(), BasicBlock()
+            connect(enter, header)
+            connect(latch, header)
+            connect(header if choice < 0.8 else latch, leave)
+            if random.random() < 0.3:
+                # An early exit from the body of the loop
+                exit = BasicBlock()
+                connect(exit, leave)
+                pending.append((1, header, exit))
+            pending.append((size - 2, header, latch))
+    return entry
+
+def gotoProgram(count):
+    '''
+    :returns: The text of a program of count repetitions of GOTO_LOOPS
+    '''
+    lines = []
+    for n in xrange(count):
+        base = 10 * len(GOTO_LOOPS) * n
+        numbers = dict(n=n, counted=base + 20, nested=base + 60, outer=base + 70, inner=base + 80)
+        lines.extend('%d %s\n' % (base + 10 * (i + 1), body % numbers) for i, body in enumerate(GOTO_LOOPS))
+    lines.append('%d END\n' % (10 * len(GOTO_LOOPS) * count + 10))
+    return ''.join(lines)
+
+def naturalLoops(entry_block):
+    '''
+    :returns: A dictionary of the set of blocks in the natural loops of each
+              header, for a reducible graph.
+    '''
+    tree = dominatorTree(entry_block)
+    loops = {}
+    for block in tree.blocks:
+        for header in blockSuccessors(block):
+            if tree.dominates(header, block):
+                body = loops.setdefault(header, set([header]))
+                pending = [block]
+                while pending:
+                    member = pending.pop()
+                    if member not in body:
+                        body.add(member)
+                        pending.extend(member.inEdges)
+    return loops
+
+def loopFailures(entry_block, forest):
+    '''
+    :returns: The number of loops and blocks which differ from the natural loops
+    '''
+    expected = naturalLoops(entry_block)
+    found = dict((loop.header, set(loop.allBlocks())) for loop in forest.loops)
+    failures = len(set(expected) ^ set(found))
+    failures += sum(found.get(header) != body for header, body in expected.iteritems())
+    for block in depthFirstSearch(entry_block):
+        failures += block.loop_depth != sum(block in body for body in expected.itervalues())
+    return failures
+
+def layoutFailures(entry_block, forest, order):
+    '''
+    :returns: The number of ways in which order is not a valid layout
+    '''
+    failures = order[0] is not entry_block
+    failures += sorted(map(id, order)) != sorted(map(id, depthFirstSearch(entry_block)))
+    positions = dict((block, i) for i, block in enumerate(order))
+    for loop in forest.loops:
+        places = [positions[block] for block in loop.allBlocks()]
+        failures += max(places) - min(places) + 1 != len(places)
+    return failures
+
+class Vertex(CfgVertex):
+    __slots__ = CfgVertex.vertex_slots + ('number',)
+
+    def __init__(self, number):
+        super(Vertex, self).__init__()
+        self.number = number
+
+class RecursiveOrderer(object):
+    '''
+    The orderer which was used before, which recurses to order each strongly
+    connected component.
+    '''
+    def __init__(self, vertex, vertices_to_consider):
+        self.order = []
+        self.stack = []
+        self.cur_dfsnum = 0
+        self.index = {}
+        self.low = {}
+        self.vertices_to_consider = vertices_to_consider
+        for v in self.vertices_to_consider:
+            self.index[v] = "To be done"
+        self.index[vertex] = "Done"
+        for successor in self.successors(vertex):
+            if self.index[successor] == "To be done":
+                self.visit(successor)
+        self.order.insert(0, vertex)
+
+    def successors(self, vertex):
+        return [successor for successor in chain(vertex.outEdges, vertex.loopBackEdges)
+                if successor in self.vertices_to_consider]
+
+    def visit(self, start_vertex):
+        to_be_done = lambda vertex: self.index[vertex] == "To be done"
+        for event, cur_vertex, predecessor in depthFirstEvents(start_vertex, self.successors, to_be_done):
+            if event is ENTER:
+                self.index[cur_vertex] = self.cur_dfsnum
+                self.low[cur_vertex] = self.cur_dfsnum
+                self.cur_dfsnum += 1
+                self.stack.append(cur_vertex)
+            elif event is EXIT:
+                self.finish(cur_vertex)
+                if predecessor is not None:
+                    self.low[predecessor] = min(self.low[predecessor], self.low[cur_vertex])
+            elif self.index[cur_vertex] == "Done":
+                pass
+            elif cur_vertex in self.stack:
+                self.low[predecessor] = min(self.low[predecessor], self.index[cur_vertex])
+
+    def finish(self, cur_vertex):
+        if self.low[cur_vertex] == self.index[cur_vertex]:
+            scc = []
+            while True:
+                popped = self.stack.pop()
+                scc.append(popped)
+                self.index[popped] = "Done"
+                if popped == cur_vertex:
+                    break
+            if len(scc) == 1:
+                self.order.insert(0, cur_vertex)
+            else:
+                sizes = [v.inDegree for v in scc]
+                first = scc[sizes.index(max(sizes))]
+                self.order = RecursiveOrderer(first, scc).order + self.order
+
+def orderGraph(size, seed):
+    '''
+    :returns: The first vertex of a graph of size vertices, each of which
+              falls through to the next. Some branch forward, and some close
+              loops, mostly short and so nested within longer ones.
+    '''
+    random.seed(seed)
+    newStore()
+    vertices = [Vertex(n) for n in xrange(size)]
+    for n in xrange(size - 1):
+        connect(vertices[n], vertices[n + 1])
+        choice = random.random()
+        if choice < 0.1:
+            connect(vertices[n], vertices[min(size - 1, n + random.randint(2, 20))])
+        elif choice < 0.2:
+            connect(vertices[n], vertices[max(1, n - random.randint(1, 10))])
+        elif choice < 0.22:
+            connectLoop(vertices[n], vertices[max(1, n - random.randint(10, 200))])
+    vertices[0].graph.compact()
+    return vertices[0]
+
+def deadCodeProgram(blocks):
+    '''
+    :returns: The text of a program of blocks DEAD_CODE_BLOCKs, and their DEFINITIONS
+    '''
+    lines = []
+    definitions_start = 10 * (len(DEAD_CODE_BLOCK) * blocks + 1)
+    for n in xrange(blocks):
+        base = 10 * len(DEAD_CODE_BLOCK) * n
+        sub = definitions_start + 10 * (len(DEFINITIONS) * n + len(DEFINITIONS) - 1)
+        numbers = dict(n=n, sub=sub, skip=base + 10 * len(DEAD_CODE_BLOCK))
+        lines.extend((base + 10 * (i + 1), body % numbers) for i, body in enumerate(DEAD_CODE_BLOCK))
+    lines.append((definitions_start, 'END'))
+    for n in xrange(blocks):
+        base = definitions_start + 10 * len(DEFINITIONS) * n
+        lines.extend((base + 10 * (i + 1), body % dict(n=n)) for i, body in enumerate(DEFINITIONS))
+    return programText(lines)
+
+def blockStatements(basic_blocks, names):
+    '''
+    :returns: A list of the statements of the basic blocks of each of the named entry points
+    '''
+    return [statement for name in names
+            for block in depthFirstSearch(basic_blocks[name]) for statement in block.statements]
+
+def describeStatements(statements):
+    return sorted((statement.lineNum, statement.__class__.__name__) for statement in statements)
+
+def stressProgram(lines):
+    '''
+    :returns: The text of a program of about the given number of lines of STRESS_BLOCKs
+    '''
+    blocks = lines // len(STRESS_BLOCK)
+    first_tail_line = 10 * (blocks * len(STRESS_BLOCK) + 2)
+    numbered = [(10, 'GOSUB %d' % (first_tail_line + 40))]
+    for n in xrange(blocks):
+        for i, body in enumerate(STRESS_BLOCK):
+            line = 10 * (n * len(STRESS_BLOCK) + i + 2)
+            numbered.append((line, body % {'n': n, 'next': line + 20}))
+    for i, body in enumerate(STRESS_TAIL):
+        numbered.append((first_tail_line + 10 * i, body))
+    return programText(numbered)
+
+class CfgStoreTest(unittest.TestCase):
+    '''
+    The edges of every statement must be mirrored by the reverse edges of the
+    statements they reach, and be the same when read from the compressed sparse
+    rows as when read through each vertex, also after editing.
+    '''
+
+    def setUp(self):
+        self.program, self.graph = controlFlowGraph(programLines(LINES // len(BLOCK)))
+
+    def test_graph(self):
+        self.assertEqual(cfgMismatches(self.graph), 0)
+
+    def test_edited_graph(self):
+        editGraph(self.program, len(self.graph) // 100)
+        self.assertEqual(cfgMismatches(self.graph), 0)
+        # Once more, after the edits have been compacted
+        self.assertEqual(cfgMismatches(self.graph), 0)
+
+class DominatorsTest(unittest.TestCase):
+    '''
+    The dominator and post-dominator trees must agree with dominator sets found
+    by a simple data flow analysis, and the dominance frontiers with their
+    definition.
+    '''
+
+    def test_random_graphs(self):
+        for size in SMALL_SIZES:
+            for seed in xrange(5):
+                entry_block = randomGraph(size, seed)
+                self.assertEqual(forwardChecks(entry_block), 0, (size, seed))
+                self.assertEqual(postChecks(entry_block), 0, (size, seed))
+
+    def test_compiled_program(self):
+        for name, entry_block in basicBlocks(programText(programLines(300 // len(BLOCK)))).items():
+            self.assertEqual(forwardChecks(entry_block), 0, name)
+            self.assertEqual(postChecks(entry_block), 0, name)
+
+    def test_trees_are_cached_until_changed(self):
+        entry_block = randomGraph(50, 1)
+        tree = dominatorTree(entry_block)
+        self.assertTrue(dominatorTree(entry_block) is tree)
+        self.assertTrue(postDominatorTree(entry_block) is postDominatorTree(entry_block))
+        connect(tree.blocks[-1], BasicBlock())
+        self.assertTrue(dominatorTree(entry_block) is not tree)
+        self.assertEqual(forwardChecks(entry_block), 0)
+
+class LoopForestTest(unittest.TestCase):
+    '''
+    The loops of reducible graphs must be the unions of the natural loops of the
+    back edges to each header, and the layout of any graph must place the entry
+    block first and the blocks of each loop together.
+    '''
+
+    def test_structured_graphs(self):
+        for size in SMALL_SIZES + (1000,):
+            for seed in xrange(5):
+                entry_block = structuredGraph(size, seed)
+                forest = findLoops(entry_block)
+                self.assertEqual(loopFailures(entry_block, forest), 0, (size, seed))
+                self.assertEqual(layoutFailures(entry_block, forest, layoutBlocks(forest)), 0, (size, seed))
+
+    def test_random_graphs(self):
+        for size in SMALL_SIZES + (1000,):
+            for seed in xrange(5):
+                entry_block = randomGraph(size, seed)
+                forest = findLoops(entry_block)
+                self.assertEqual(layoutFailures(entry_block, forest, layoutBlocks(forest)), 0, (size, seed))
+
+    def test_goto_loops(self):
+        for name, entry_block in basicBlocks(gotoProgram(LINES // len(GOTO_LOOPS))).items():
+            forest = findLoops(entry_block)
+            self.assertEqual(layoutFailures(entry_block, forest, layoutBlocks(forest)), 0, name)
+
+class BlockOrderTest(unittest.TestCase):
+    '''
+    The approximate topological order must be that found by the recursive
+    orderer which was used before.
+    '''
+
+    def test_matches_recursive_orderer(self):
+        for size in ORDER_SIZES:
+            start = orderGraph(size, size)
+            order = [v.number for v in approximateTopologicalOrder(start)]
+            recursive = [v.number for v in RecursiveOrderer(start, set(depthFirstSearch(start))).order]
+            self.assertEqual(order, recursive, size)
+
+class DeadCodeTest(unittest.TestCase):
+    '''
+    Only the unused procedures and functions may be removed, every statement
+    left must be in a basic block, and the basic blocks left must hold the same
+    statements as without the elimination.
+    '''
+
+    def compileProgram(self, text, eliminate):
+        '''
+        :returns: A 4-tuple of the parse tree, the entry points, the dictionary of
+                  entry blocks, and the counts returned by eliminateDeadCode, or
+                  None if eliminate is False.
+        '''
+        program, entry_points = preparedProgram(text)
+        counts = eliminateDeadCode(program, entry_points, Options) if eliminate else None
+        with silenced():
+            basic_blocks = identifyBasicBlocks(entry_points, Options)
+        return program, entry_points, basic_blocks, counts
+
+    def test_unused_definitions_are_removed(self):
+        blocks = 20
+        text = deadCodeProgram(blocks)
+        program, entry_points, all_basic_blocks, counts = self.compileProgram(text, eliminate=False)
+        program, entry_points, basic_blocks, (node_count, method_count) = self.compileProgram(text, eliminate=True)
+        self.assertEqual(method_count, UNUSED * blocks)
+        self.assertEqual(len(entry_points), 1 + USED * blocks)
+        statements = blockStatements(basic_blocks, entry_points)
+        self.assertEqual(describeStatements(statements),
+                         describeStatements(blockStatements(all_basic_blocks, entry_points)))
+        remaining = [statement for statement in nodeIndex(program).instances(AstStatement)
+                     if statement.parent_index is not None]
+        self.assertEqual(set(remaining), set(statements))
+        with silenced():
+            typecheck(program, entry_points, Options)
+
+    def test_dynamic_calls_keep_definitions(self):
+        for text in DYNAMIC_CALLS:
+            program, entry_points = preparedProgram(text)
+            names = set(entry_points)
+            node_count, method_count = eliminateDeadCode(program, entry_points, Options)
+            self.assertEqual(method_count, 0)
+            self.assertEqual(set(entry_points), names)
+
+class RecursionStressTest(unittest.TestCase):
+    '''
+    None of the traversals of the AST and the control flow graph may recurse once
+    for each statement of a program.
+    '''
+
+    def test_compile_without_raising_recursion_limit(self):
+        handle, filename = tempfile.mkstemp(suffix='.bas')
+        os.write(handle, stressProgram(10000))
+        os.close(handle)
+        recursion_limit = sys.getrecursionlimit()
+        try:
+            with silenced():
+                compileFile(filename, Options)
+        finally:
+            os.remove(filename)
+        self.assertEqual(sys.getrecursionlimit(), recursion_limit)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.CRITICAL)
+    unittest.main()
@@ -0,0 +1,404 @@
+'''
+Tests of the lexers, parser, incremental reparse and AST cache of syntax/, and
+of the detokeniser of decoder.py.
+
+Usage: python syntax_tests.py
+'''
+
+import sys
+import os
+import re
+import shutil
+import logging
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import ply.lex as lex
+import decoder
+from decoder import tokens, cfnTokens, comTokens, stmtTokens, DecodeLineNo, fileType
+from main import indexLineNumbers
+import syntax.lexer
+import syntax.parser
+from syntax import ast_cache
+from syntax.ast import AstStatement
+from syntax.ast_meta import AstNode
+from syntax.intern_table import SYMBOL_NODES
+from syntax.token_spans import TokenSpans
+from syntax.trie_lexer import TrieLexer
+from source_debugging import SourceDebuggingVisitor, TextSeparators
+from synthetic_programs import (Options, BLOCK, programLines, procedureLines, indexProgram, parseProgram,
+                                testPrograms, nodes, describe, token, encodeLineNo, tokenisedLines,
+                                tokenisedProgram)
+
+# The number of lines of the synthetic programs
+LINES = 2000
+
+def legacyDetokenise(lineData):
+    '''
+    The regular expression substitution which the table-driven detokeniser replaced.
+    '''
+    return re.sub(r'"(?:(?:[^"]+|"")*)"(?!")|( ?)([\xc6-\xc8])?(\xf4.*|\x8d[\x40-\x7f]{3}|[\x7f-\xff])',
+                  legacyReplaceFunc, lineData)
+
+def legacyReplaceFunc(match):
+    if match.group().startswith('"'):
+        return match.group()
+    else:
+        prefix, ext, token = match.groups()
+        if len(prefix) == 0:
+            prefix = ' '
+        tokenOrd = ord(token[0])
+        if ext:
+            if ext == '\xc6':
+                return cfnTokens[tokenOrd-0x8e]
+            if ext == '\xc7':
+                return comTokens[tokenOrd-0x8e]
+            if ext == '\xc8':
+                return stmtTokens[tokenOrd-0x8e]
+            raise Exception, "Bad token"
+        else:
+            if token[0] == '\x8d':
+                return str(DecodeLineNo(token[1:]))
+            else:
+                return prefix + tokens[tokenOrd - 127] + token[1:]
+
+def lexTokens(lexer, data):
+    '''
+    :returns: A list of the type, value, line number and position of each token
+              of data, followed by the final line number and position of the lexer.
+    '''
+    lexer.input(data)
+    lexer.lineno = 1
+    result = []
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            break
+        result.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+    result.append((lexer.lineno, lexer.lexpos))
+    return result
+
+def streamTokens(lexer):
+    tokens = []
+    while True:
+        tok = lexer.token()
+        if tok is None:
+            return tokens
+        tokens.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+
+# Lines which exercise the joins between keywords and the text around them
+EDGE_CASES = [
+    'X=' + token('TO') + 'P',
+    'T$=' + token('TIME') + '$',
+    'Y=' + token('RND') + '(6)',
+    token('PRINT') + token('TRUE') + ';' + token('FALSE'),
+    token('GOTO') + encodeLineNo(10),
+    'Z=12' + token('AND') + '3',
+    '',
+    '',
+    token('DATA') + ' 1,2,' + token('PRINT') + ',"3"',
+    token('END'),
+]
+
+# Edits, as a block number from the middle of the program, a line offset within
+# the block, and a replacement body, or None to delete the line. Offsets
+# between lines insert a new line.
+EDITS = [
+    ('change a statement', 0, 4, '  B% = B% + 2'),
+    ('change a loop', 1, 12, 'FOR I% = 1 TO 3 : S% = S% - I% : NEXT'),
+    ('lengthen a line', 2, 1, 'PROCdraw0(X% * 2, Y% * 2) : PRINT "Drawn"'),
+    ('insert a line', 3, 0.5, 'PRINT "Inserted"'),
+    ('delete a line', 4, 13, None),
+    ('change a WHEN clause', 5, 9, '  WHEN 1, 2: PRINT "One or two"'),
+    ('follow an ENDIF', 6, 7, 'ENDIF : PRINT "After"'),
+    ('change the next line', 6, 8, 'CASE B% + 1 OF'),
+]
+
+def edit(lines, block, offset, body):
+    '''
+    :returns: The edited lines, and the changed logical line number.
+    '''
+    lines = list(lines)
+    number = 10 * (block * 100 + int(offset) + 1)
+    index = [line for line, _ in lines].index(number)
+    if offset != int(offset):
+        number += 5
+        lines.insert(index + 1, (number, body))
+    elif body is None:
+        del lines[index]
+    else:
+        lines[index] = (number, body)
+    return lines, number
+
+def reparseEdit(program, lines, source_map, blocks, edit_args):
+    '''
+    Reparse one of EDITS of the program of lines, from a program of blocks BLOCKs.
+    :returns: The reparsed program, the edited lines and their SourceMap
+    '''
+    name, block, offset, body = edit_args
+    new_lines, number = edit(lines, blocks // 2 + block, offset, body)
+    new_data, new_source_map = indexProgram(new_lines)
+    program = syntax.parser.reparse(program, new_data, new_source_map, source_map, set([number]), Options)
+    return program, new_lines, new_source_map
+
+def misinterned(program):
+    '''
+    :returns: The number of nodes whose identifier is not the interned spelling
+              of their symbol id
+    '''
+    table = program.intern_table
+    return len([node for node in nodes(program) if isinstance(node, SYMBOL_NODES)
+                and node.identifier is not table.spelling(node.symbol_id)])
+
+def statements(node):
+    '''
+    :returns: The statements of a subtree, in depth first order.
+    '''
+    result = []
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, AstNode):
+            continue
+        if isinstance(node, AstStatement):
+            result.append(node)
+        children = []
+        for name, child in sorted(node.children.items()):
+            if isinstance(child, list):
+                children.extend(child)
+            else:
+                children.append(child)
+        pending.extend(reversed(children))
+    return result
+
+def trackedPositions(data, source_map):
+    '''
+    :returns: The line number and position of each statement parsed with
+              positions tracked by the parser and set by SourceDebuggingVisitor.
+    '''
+    program = syntax.parser.parse(data, Options)
+    program.accept(SourceDebuggingVisitor(TextSeparators(data), source_map))
+    return [(s.lineNum, (s.startLine, s.startColumn, s.endLine, s.endColumn))
+            for s in statements(program)]
+
+def compactPositions(data, source_map):
+    '''
+    :returns: The line number and position of each statement parsed with
+              compact positions, resolved from the TokenSpans table.
+    '''
+    options = Options()
+    options.compact_positions = True
+    program = syntax.parser.parse(data, options)
+    spans = program.token_spans
+    return [(s.lineNum, spans.position(s.span, source_map) if s.span is not None else (None,) * 4)
+            for s in statements(program)]
+
+def comparePositions(expected, actual):
+    '''
+    :returns: The number of statements with different line numbers or start
+              positions, where the tracked start position is known, the number
+              with different end positions, where the tracked end position is
+              known, and the number of which the tracked end position is not
+              known, as for the last statement of a program.
+    '''
+    assert len(expected) == len(actual)
+    starts = ends = unknown = 0
+    for (expected_line, expected_position), (actual_line, actual_position) in zip(expected, actual):
+        if expected_line != actual_line or (expected_position[1] is not None
+                                            and expected_position[:2] != actual_position[:2]):
+            starts += 1
+        elif expected_position[3] is None:
+            unknown += 1
+        elif expected_position[2:] != actual_position[2:]:
+            ends += 1
+    return starts, ends, unknown
+
+def summarise(program):
+    '''
+    :returns: A description of the program, its symbol ids and further attributes
+    '''
+    symbols = [(node.identifier, node.symbol_id) for node in nodes(program) if isinstance(node, SYMBOL_NODES)]
+    attributes = [sorted(getattr(node, '__dict__', {}).keys()) for node in nodes(program)]
+    spans = getattr(program, 'token_spans', None)
+    if spans is not None:
+        # The serialized table keeps only the tokens which begin or end a span
+        spans = [(spans.startLine(span), spans.endLine(span), spans.startPos(span), spans.endPos(span))
+                 for span in xrange(len(spans.span_firsts))]
+    return (describe(program), symbols, attributes, program.syntax_errors,
+            program.intern_table.spellings, spans)
+
+class DetokeniseTest(unittest.TestCase):
+
+    def test_matches_legacy_detokeniser(self):
+        acorn = decoder.BbcBasicAcornDecoder('')
+        for line in tokenisedLines(100):
+            self.assertEqual(acorn.detokenise(line), legacyDetokenise(line))
+
+    def test_bb4w_tokens_wrap_around_to_exit(self):
+        bb4w = decoder.BbcBasic8086Decoder('')
+        token = lambda text: chr((0x80 + decoder.bb4wTokens.index(text)) & 0xff)
+        line = token('FOR') + ' I%=1 ' + token('TO') + ' 10:' + token('EXIT') + ' ' + token('FOR')
+        self.assertEqual(bb4w.detokenise(line), ' FOR I%=1 TO 10: EXIT FOR')
+        self.assertEqual(bb4w.detokenise(token('PRIVATE') + ' A%:' + token('BY')), ' PRIVATE A%: BY')
+
+class LexerTest(unittest.TestCase):
+
+    def test_trie_lexer_matches_ply_lexer(self):
+        ply_lexer = lex.lex(module=syntax.lexer)
+        trie_lexer = TrieLexer(syntax.lexer)
+        for name, data, source_map in testPrograms():
+            self.assertEqual(lexTokens(trie_lexer, data), lexTokens(ply_lexer, data), name)
+
+    def check_token_stream(self, bodies):
+        '''
+        Lex a tokenised program directly from its tokens, and as text detokenised
+        by main.indexLineNumbers, which must give the same tokens with the same
+        line numbers and positions.
+        '''
+        data = tokenisedProgram(bodies)
+        text, source_map = indexLineNumbers(data, Options)
+        text_lexer = syntax.parser.sharedLexer(Options).clone()
+        text_lexer.lineno = 1
+        text_lexer.input(text + '\n')
+        token_lexer = syntax.parser.buildTokenStreamLexer(Options)
+        token_lexer.input(fileType(data))
+        self.assertEqual(streamTokens(token_lexer), streamTokens(text_lexer))
+
+    def test_token_stream_edge_cases(self):
+        self.check_token_stream(EDGE_CASES)
+
+    def test_token_stream_synthetic(self):
+        self.check_token_stream(tokenisedLines(LINES))
+
+class ReparseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.blocks = LINES // len(BLOCK)
+        self.lines = programLines(self.blocks)
+
+    def test_each_edit(self):
+        program, data, source_map = parseProgram(self.lines)
+        lines = self.lines
+        for edit_args in EDITS:
+            program, lines, source_map = reparseEdit(program, lines, source_map, self.blocks, edit_args)
+            syntax.parser.applyPositionShifts(program)
+            expected, _, _ = parseProgram(lines)
+            self.assertEqual(describe(program), describe(expected), edit_args[0])
+
+    def test_pending_position_shifts(self):
+        program, data, source_map = parseProgram(self.lines)
+        lines = self.lines
+        for edit_args in EDITS:
+            program, lines, source_map = reparseEdit(program, lines, source_map, self.blocks, edit_args)
+        self.assertTrue(len(program.position_shifts) > 1)
+        syntax.parser.applyPositionShifts(program)
+        self.assertEqual(len(program.position_shifts), 0)
+        expected, _, _ = parseProgram(lines)
+        self.assertEqual(describe(program), describe(expected))
+
+class InternTableTest(unittest.TestCase):
+
+    def test_identifiers_are_interned(self):
+        program, data, source_map = parseProgram(procedureLines(LINES // 10))
+        self.assertEqual(misinterned(program), 0)
+        spellings = set(node.identifier for node in nodes(program) if isinstance(node, SYMBOL_NODES))
+        self.assertEqual(len(program.intern_table), len(spellings))
+
+class ParallelParseTest(unittest.TestCase):
+
+    def check(self, lines):
+        data, source_map = indexProgram(lines)
+        options = Options()
+        options.parse_jobs = 2
+        program = syntax.parser.parse(data, options)
+        self.assertEqual(summarise(program), summarise(syntax.parser.parse(data, Options)))
+        self.assertEqual(misinterned(program), 0)
+        return data, options
+
+    def test_synthetic_program(self):
+        data, options = self.check(programLines(LINES // len(BLOCK)))
+        self.assertTrue(syntax.parser.parallelParse(data, options, 2) is not None)
+
+    def test_procedures(self):
+        self.check(procedureLines(LINES // 10))
+
+    def test_chunk_within_if(self):
+        # The chunk beginning at the DEF PROC cannot be parsed on its own
+        bodies = ['IF A% THEN'] + ['PRINT %d' % n for n in xrange(200)] + ['DEF PROCy', 'ENDPROC', 'ENDIF']
+        data, options = self.check([(10 * (n + 1), body) for n, body in enumerate(bodies)])
+        self.assertEqual(len(syntax.parser.definitionChunks(data, 8)), 2)
+        self.assertTrue(syntax.parser.parallelParse(data, options, 2) is None)
+
+class CompactPositionsTest(unittest.TestCase):
+
+    def check(self, data, source_map, name=None):
+        expected = trackedPositions(data, source_map)
+        actual = compactPositions(data, source_map)
+        starts, ends, unknown = comparePositions(expected, actual)
+        self.assertEqual((starts, ends), (0, 0), name)
+
+    def test_test_programs(self):
+        for name, data, source_map in testPrograms():
+            self.check(data, source_map, name)
+
+    def test_synthetic_program(self):
+        data, source_map = indexProgram(programLines(LINES // len(BLOCK)))
+        self.check(data, source_map)
+
+class AstCacheTest(unittest.TestCase):
+
+    def check(self, data, options=Options, name=None):
+        program = syntax.parser.parse(data, options)
+        loaded = ast_cache.loads(ast_cache.dumps(program))
+        self.assertEqual(summarise(loaded), summarise(program), name)
+
+    def test_test_programs(self):
+        for name, data, source_map in testPrograms():
+            self.check(data, name=name)
+
+    def test_synthetic_program(self):
+        data, source_map = indexProgram(programLines(LINES // len(BLOCK)))
+        self.check(data)
+        options = Options()
+        options.compact_positions = True
+        self.check(data, options)
+
+    def test_token_spans(self):
+        spans = TokenSpans()
+        for start, end, line in ((0, 3, 1), (3, 300, 1), (70000, 70001, 2), (70001, 80000, 400), (80000, 80000, 400)):
+            spans.token_starts.append(start)
+            spans.token_ends.append(end)
+            spans.token_lines.append(line)
+        for first, last, to_start in ((3, 4, False), (0, 1, True), (4, 2, False), (1, 3, True)):
+            spans.addSpan(first, last, to_start)
+        loaded = ast_cache.decodeTokenSpans(ast_cache.encodeTokenSpans(spans))
+        for span in xrange(len(spans.span_firsts)):
+            self.assertEqual((loaded.startLine(span), loaded.endLine(span), loaded.startPos(span), loaded.endPos(span)),
+                             (spans.startLine(span), spans.endLine(span), spans.startPos(span), spans.endPos(span)))
+        self.assertEqual(len(loaded), 4)
+
+    def test_cached_parse(self):
+        data, source_map = indexProgram(programLines(LINES // len(BLOCK)))
+        options = Options()
+        options.ast_cache = tempfile.mkdtemp()
+        try:
+            parsed = syntax.parser.cachedParse(data, options)
+            self.assertEqual(len(os.listdir(options.ast_cache)), 1)
+            loaded = syntax.parser.cachedParse(data, options)
+        finally:
+            shutil.rmtree(options.ast_cache)
+        self.assertTrue(loaded is not parsed)
+        self.assertEqual(summarise(loaded), summarise(parsed))
+
+    def test_cache_key(self):
+        options = Options()
+        options.compact_positions = True
+        key = syntax.parser.astCacheKey('10 PRINT\n', Options)
+        self.assertNotEqual(syntax.parser.astCacheKey('10 PRINT\n', options), key)
+        self.assertNotEqual(syntax.parser.astCacheKey('10 PRINT 1\n', Options), key)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.CRITICAL)
+    unittest.main()
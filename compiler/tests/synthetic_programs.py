@@ -0,0 +1,270 @@
+'''
+The options and synthetic programs shared by the tests in this directory and
+the benchmarks in benchmarks/.
+'''
+
+import sys
+import os
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from main import readFile, indexLineNumbers, warnOnMissingNewline, prepareAst, correlateLoops
+import syntax.parser
+from syntax.ast_meta import AstNode
+from source_debugging import TextSeparators
+from flow import (createForwardControlFlowGraph, locateEntryPoints, convertLongjumpsToExceptions,
+                  convertSubroutinesToProcedures, identifyBasicBlocks)
+from decoder import tokens
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Options(object):
+    '''
+    The default command line options of main.py, without the CLR. Create an
+    instance to change any of them.
+    '''
+    verbose = False
+    debug_lex = False
+    debug_parser = False
+    use_clr = False
+    create_il = False
+    peverify = False
+    detokenize = False
+    table_dir = None
+    lexer = 'ply'
+    parse_jobs = 1
+    compact_positions = False
+    ast_cache = None
+    eliminate_dead_code = True
+
+# A block of program text, repeated to make a program of the required length
+BLOCK = [
+    'REM Block %(n)d',
+    'PROCdraw%(n)d(X%%, Y%%)',
+    'IF A%% > %(n)d THEN',
+    '  PRINT "Big"',
+    '  B%% = B%% + 1',
+    'ELSE',
+    '  PRINT "Small"',
+    'ENDIF',
+    'CASE B%% OF',
+    '  WHEN 1: PRINT "One"',
+    '  OTHERWISE PRINT "Other"',
+    'ENDCASE',
+    'FOR I%% = 1 TO %(n)d : S%% = S%% + I%% : NEXT',
+    'IF S%% > 100 THEN PRINT "Done" ELSE GOTO %(line)d',
+    '',
+    'DEF PROCdraw%(n)d(X%%, Y%%)',
+    'DRAW X%%, Y%%',
+    'ENDPROC',
+]
+
+# A procedure, repeated to make a program with a realistic mix of identifiers.
+# Each procedure has its own parameters and local variables, shares a result
+# and a string with the procedures with the same number modulo SHARED, and uses
+# globals common to the whole program.
+PROCEDURE = [
+    'DEF PROCupdate%(n)d(count%(n)d%%, name%(n)d$)',
+    'LOCAL total%(n)d, index%(n)d%%',
+    'FOR index%(n)d%% = 1 TO count%(n)d%%',
+    '  total%(n)d = total%(n)d + values(index%(n)d%%) * scale',
+    '  name%(n)d$ = name%(n)d$ + STR$(index%(n)d%%)',
+    'NEXT',
+    'result%(shared)d = total%(n)d / count%(n)d%% + result%(shared)d',
+    'title%(shared)d$ = name%(n)d$',
+    'PRINT title%(shared)d$; result%(shared)d; I%%; X%%',
+    'ENDPROC',
+]
+
+SHARED = 50
+
+def programLines(blocks):
+    '''
+    :returns: The numbered lines of a program of blocks BLOCKs
+    '''
+    lines = []
+    for n in xrange(blocks):
+        for i, body in enumerate(BLOCK):
+            line = 10 * (n * 100 + i + 1)
+            lines.append((line, body % {'n': n, 'line': line}))
+    return lines
+
+def extendedLines(blocks, extra):
+    '''
+    :returns: The numbered lines of a program of blocks BLOCKs, with the lines
+              of extra following the first line of each block. Each line of
+              extra is formatted with the number n of its block, and sub, the
+              line number of the last line of extra but one.
+    '''
+    lines = []
+    for n, (line, body) in enumerate(programLines(blocks)):
+        lines.append((line, body))
+        if n % len(BLOCK) == 0:
+            numbers = {'n': n // len(BLOCK), 'sub': line + len(extra) - 1}
+            lines.extend((line + i + 1, body % numbers) for i, body in enumerate(extra))
+    return lines
+
+def procedureLines(procedures):
+    '''
+    :returns: The numbered lines of a program of procedures PROCEDUREs
+    '''
+    lines = []
+    for n in xrange(procedures):
+        numbers = {'n': n, 'shared': n % SHARED}
+        lines.extend((10 * (n * len(PROCEDURE) + i + 1), body % numbers) for i, body in enumerate(PROCEDURE))
+    return lines
+
+def programText(lines):
+    return ''.join('%d %s\n' % (number, body) for number, body in lines)
+
+def indexProgram(lines, options=Options):
+    '''
+    :returns: The program text of the numbered lines, ready for the parser, and its SourceMap
+    '''
+    data, source_map = indexLineNumbers(programText(lines), options)
+    return data + '\n', source_map
+
+def parseProgram(lines, options=Options):
+    '''
+    :returns: The parsed program of the numbered lines, its program text and its SourceMap
+    '''
+    data, source_map = indexProgram(lines, options)
+    program = syntax.parser.parse(data, options)
+    return program, data, source_map
+
+def testPrograms(options=Options):
+    '''
+    :returns: A list of the name, program text and SourceMap of each of the test
+              programs in this directory which the parser can handle.
+    '''
+    programs = []
+    for filename in sorted(os.listdir(TEST_DIR)):
+        if not filename.endswith('.bbctxt'):
+            continue
+        try:
+            data, source_map = indexLineNumbers(readFile(os.path.join(TEST_DIR, filename)), options)
+            data = warnOnMissingNewline(data)
+            syntax.parser.parse(data, options)
+        except Exception:
+            continue
+        programs.append((filename, data, source_map))
+    return programs
+
+@contextmanager
+def silenced():
+    '''
+    Discard the progress which the compiler prints.
+    '''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def preparedProgram(text, options=Options):
+    '''
+    :returns: A 2-tuple of the parse tree of the program in text, and its entry
+              points, after the passes which precede the identification of basic
+              blocks.
+    '''
+    data, source_map = indexLineNumbers(text, options)
+    data += '\n'
+    program = syntax.parser.parse(data, options)
+    with silenced():
+        line_mapper, data_visitor = prepareAst(program, TextSeparators(data), source_map, options)
+        createForwardControlFlowGraph(program, line_mapper, options)
+        entry_points = locateEntryPoints(program, line_mapper, options)
+        convertLongjumpsToExceptions(program, line_mapper, options)
+        convertSubroutinesToProcedures(program, entry_points, line_mapper, options)
+        correlateLoops(entry_points, options)
+    return program, entry_points
+
+def basicBlocks(text, options=Options):
+    '''
+    :returns: The dictionary of entry blocks of the program in text
+    '''
+    program, entry_points = preparedProgram(text, options)
+    with silenced():
+        return identifyBasicBlocks(entry_points, options)
+
+def nodes(root):
+    '''
+    :returns: The AstNodes of a subtree.
+    '''
+    result = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, AstNode):
+            result.append(node)
+            for child in node.children.itervalues():
+                if isinstance(child, list):
+                    pending.extend(child)
+                else:
+                    pending.append(child)
+    return result
+
+def describe(node, parent=None, name=None, index=None):
+    '''
+    :returns: A nested list describing a subtree, including its positions and
+              parent links.
+    '''
+    if not isinstance(node, AstNode):
+        return repr(node)
+    links = (getattr(node, 'parent', None) is parent,
+             getattr(node, 'parent_property', None) == name,
+             getattr(node, 'parent_index', None) == index)
+    children = []
+    for child_name, child in sorted(node.children.items()):
+        if isinstance(child, list):
+            children.append([describe(c, node, child_name, i) for i, c in enumerate(child)])
+        else:
+            children.append(describe(child, node, child_name))
+    options = [(name, describe(value, getattr(value, 'parent', None)) if isinstance(value, AstNode) else value)
+               for name, value in sorted(node.options.items())]
+    return [node.__class__.__name__, options, links, children]
+
+def token(text):
+    '''
+    :returns: The BBC BASIC token of the keyword text
+    '''
+    return chr(0x7f + tokens.index(text))
+
+def encodeLineNo(lineNumber):
+    '''
+    :returns: The tokenised form of a line number following GOTO or GOSUB
+    '''
+    lo = lineNumber & 0xff
+    hi = (lineNumber >> 8) & 0xff
+    byte0 = (((lo & 0xc0) >> 2) | ((hi & 0xc0) >> 4)) ^ 0x54
+    return '\x8d' + chr(byte0) + chr((lo & 0x3f) | 0x40) + chr((hi & 0x3f) | 0x40)
+
+def tokenisedLines(count):
+    '''
+    :returns: The bodies of count tokenised lines, of the constructs found in
+              typical programs: keywords, quoted strings containing token bytes,
+              extension tokens, line numbers and REM.
+    '''
+    bodies = [
+        token('PRINT') + ' "HELLO ' + token('AND') + ' ""WORLD""";A%+1',
+        token('IF') + ' X%>3 ' + token('THEN') + ' ' + token('GOTO') + encodeLineNo(1000) + ' ' + token('ELSE') + ' ' + token('PROC') + 'draw(X%)',
+        '\xc8\x8e' + ' X% ' + token('OF'),
+        token('FOR') + ' I%=1 ' + token('TO') + ' 10 ' + token('STEP') + ' 2:' + token('NEXT'),
+        'A$=' + token('LEFT$(') + 'B$,3)+' + token('CHR$') + '65',
+        token('REM') + ' Comments ' + token('PRINT') + ' are "not" detokenised',
+        'X=' + token('SIN') + '(Y)*' + token('COS') + '(Z)+' + token('SQR') + '(W)',
+    ]
+    return [bodies[i % len(bodies)] for i in xrange(count)]
+
+def tokenisedProgram(bodies):
+    '''
+    :returns: A BBC BASIC (6502) tokenised program of the line bodies, numbered 10, 20...
+    '''
+    lines = []
+    for i, body in enumerate(bodies):
+        line_number = 10 * (i + 1)
+        lines.append('\r' + chr(line_number >> 8) + chr(line_number & 0xff) + chr(len(body) + 4) + body)
+    return ''.join(lines) + '\r\xff'
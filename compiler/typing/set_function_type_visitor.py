@@ -18,8 +18,14 @@ class SetFunctionTypeVisitor(Visitor):
         node.forEachChild(self.visit)
         
     def visitUserFunc(self, user_func):
+        self.setType(user_func)
+        user_func.forEachChild(self.visit)
+        
+    def setType(self, user_func):
+        '''
+        Set the type of user_func if it is a call to the function.
+        '''
         if user_func.name == self.function_name:
             print "Setting type of call to %s to %s" % (self.function_name, self.function_type) 
             user_func.actualType = self.function_type
-        user_func.forEachChild(self.visit)
         
\ No newline at end of file
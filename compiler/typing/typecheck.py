@@ -6,7 +6,8 @@ Created on 5 Jan 2010
 
 import logging
 
-from syntax.ast import DefineFunction
+from syntax.ast import DefineFunction, UserFunc
+from node_index import nodeIndex
 
 from typecheck_visitor import TypecheckVisitor
 from function_type_inferer import inferTypeOfFunction
@@ -54,7 +55,7 @@ def setFunctionType(parse_tree, function_name, function_type):
     :param type: The type to which the actualType of call should be set
     '''
     assert function_name.startswith('FN')
-    # TODO: Visit each function call and the the type of those that match
     print "Setting type of %s to %s" % (function_name, function_type)
     sftv = SetFunctionTypeVisitor(function_name, function_type)
-    parse_tree.accept(sftv)
+    for user_func in nodeIndex(parse_tree).instances(UserFunc):
+        sftv.setType(user_func)
@@ -4,9 +4,8 @@ import logging
 
 from visitor import Visitor
 from errors import *
-from utility import underscoresToCamelCase
 from syntax.ast import Cast, Concatenate
-from ast_utils import elideNode
+from ast_utils import elideNode, nodeIndexOf
 from typing.type_system import (NumericOwlType, ObjectOwlType, IntegerOwlType,
                                 FloatOwlType, ByteOwlType, PendingOwlType,
                                 StringOwlType, ArrayOwlType)
@@ -23,7 +22,11 @@ class TypecheckVisitor(Visitor):
         :param entry_points: A dictionary of entry_point names to AstStatements.
         '''
         self.__entry_points = entry_points
-        pass
+        # The types decoded from the sigils of the identifiers of variables and
+        # arrays, and of the arrays indexed by indexers, by symbol id
+        self.__variable_types = {}
+        self.__array_types = {}
+        self.__element_types = {}
     
     def visit(self, node):
         "Override visit to allow safe traversal of lists"
@@ -122,20 +125,33 @@ class TypecheckVisitor(Visitor):
         self.promoteNumericOperands(operator)
         operator.actualType = IntegerOwlType()
                         
+    def symbolType(self, types, node, identifier):
+        '''
+        :param types: The dictionary of types by symbol id in which to cache the type
+        :param node: A Variable, Array or Indexer
+        :param identifier: The identifier to decode
+        :returns: The type decoded from the sigil of identifier
+        '''
+        try:
+            return types[node.symbol_id]
+        except KeyError:
+            type = types[node.symbol_id] = sigil.identifierToType(identifier)
+            return type
+    
     def visitArray(self, array):
         # Decode the variable name sigil into the actual type
         # The sigils are one of [$%&~]
-        array.actualType = sigil.identifierToType(array.identifier)
+        array.actualType = self.symbolType(self.__array_types, array, array.identifier)
     
     def visitVariable(self, variable):
         # Decode the variable name sigil into the actual type
         # The sigils are one of [$%&~]
-        variable.actualType = sigil.identifierToType(variable.identifier)
+        variable.actualType = self.symbolType(self.__variable_types, variable, variable.identifier)
         
     def visitIndexer(self, indexer):
         # Decode the variable name sigil into the actual type
         # The sigils are one of [$%&~]
-        indexer.actualType = sigil.identifierToType(indexer.identifier[:-1])
+        indexer.actualType = self.symbolType(self.__element_types, indexer, indexer.identifier[:-1])
         for index in indexer.indices:
             self.visit(index)
             self.checkAndInsertRValueCast(index, IntegerOwlType())
@@ -393,6 +409,9 @@ class TypecheckVisitor(Visitor):
         cast.value.parent_property = "value"
         cast.value.parent_index = None
         parent.setProperty(cast, parent_property, parent_index)
+        node_index = nodeIndexOf(cast)
+        if node_index is not None:
+            node_index.insertBefore(cast, cast.value)
                     
     def checkSignature(self, node):
         """
@@ -406,14 +425,14 @@ class TypecheckVisitor(Visitor):
             if isinstance(info, list):
                 info = info[0]
                 formal_type = info.formalType
-                child_nodes = getattr(node, underscoresToCamelCase(name))
+                child_nodes = getattr(node, name)
                 if child_nodes is not None:
                     for child_node in child_nodes:
                         child_result = self.checkType(node, child_node, formal_type, info)
                         result = result and child_result
             else:
                 formal_type = info.formalType
-                child_node = getattr(node, underscoresToCamelCase(name))
+                child_node = getattr(node, name)
                 child_result = self.checkType(node, child_node, formal_type, info)
                 result = result and child_result
         return result
@@ -1,6 +1,7 @@
 # Miscellaneous utility functions
 
 import re
+from types import MemberDescriptorType
 
 def underscoresToCamelCase(s):
     "Converts 'text_separated_like_this' to 'textSeparatedLikeThis'"
@@ -13,11 +14,9 @@ def camelCaseToUnderscores(s):
     return re.sub(r'([a-z])([A-Z])', r'\1_\2', s).lower()
 
 def hasprop(cls, name):
-    "Determines whether the supplied object has a property called 'name'"
-    (name in cls.__dict__ and isinstance(cls.__dict__[name], property))
-    
+    "Determines whether the supplied object has a property, or a slot, called 'name'"
     if name in cls.__dict__:
-        return isinstance(cls.__dict__[name], property)
+        return isinstance(cls.__dict__[name], (property, MemberDescriptorType))
     for base in cls.__bases__:
         if hasprop(base, name):
             return True
@@ -1,10 +1,47 @@
 # The Visitor base class
 
+from types import FunctionType
+
+# The visitor methods which accept calls, for each pair of visitor class and
+# visitable class. Discarded when any visitor class is changed.
+_dispatch_cache = {}
+
+# The caches of methods found on visitor classes, all of which are discarded
+# when any visitor class is changed
+_method_caches = [_dispatch_cache]
+
+def methodCache():
+    """
+    :returns: A new dictionary for caching methods found on visitor classes,
+              which is cleared whenever any visitor class is changed.
+    """
+    cache = {}
+    _method_caches.append(cache)
+    return cache
+
+def discardMethodCaches():
+    for cache in _method_caches:
+        cache.clear()
+
+class VisitorMeta(type):
+    """
+    The metaclass of visitors, which discards the cached visitor methods
+    whenever a visitor class is changed.
+    """
+    def __setattr__(cls, name, value):
+        super(VisitorMeta, cls).__setattr__(name, value)
+        discardMethodCaches()
+
+    def __delattr__(cls, name):
+        super(VisitorMeta, cls).__delattr__(name)
+        discardMethodCaches()
+
 class Visitor(object):
     """
     A base visitor class
     """
-    
+    __metaclass__ = VisitorMeta
+
     def visit(self, node):
         """
         Visits a given node by telling the node to call this Visitor's
@@ -13,31 +50,61 @@ class Visitor(object):
         if node is not None:
             return node.accept(self)
 
+def visitorMethod(visitor_class, name):
+    """
+    :returns: A function taking a visitor and a node which calls the method of
+              visitor_class called name, or None if there is no such method.
+    """
+    for klass in visitor_class.__mro__:
+        if name in klass.__dict__:
+            method = klass.__dict__[name]
+            if isinstance(method, FunctionType):
+                return method
+            return lambda visitor, node: getattr(visitor, name)(node)
+    return None
+
+def dispatch(visitor_class, klass):
+    """
+    Find the visitor methods for the type of AstNode. The visitor method for
+    a class is found by appending the class name to 'visit' so if the class
+    name is AstNode the method is visitor.visitAstNode. If a method of that
+    name does not exist, then the visitor methods of each of the superclasses
+    are found in turn.
+    :returns: A 2-tuple of the visitor methods, and whether the result of the
+              last of them is the result of the visit.
+    """
+    method = visitorMethod(visitor_class, "visit%s" % klass.__name__)
+    if method is not None:
+        return (method,), True
+    methods = ()
+    returns_last = False
+    for base in klass.__bases__:
+        base_methods, returns_last = dispatch(visitor_class, base)
+        methods += base_methods
+    return methods, returns_last
+
 class Visitable(object):
     """
     A mixin for classes which are visitable
-    """    
+    """
+    __slots__ = ()
+
     def accept(self, visitor):
         """
-        Accept method for visitor pattern.
-        """
-        return self._accept(self.__class__, visitor)
-    
-    def _accept(self, klass, visitor):
-        """
-        Recursive accept implementation that calls the right visitor
-        method 'overloaded' for the type of AstNode. This is done by
-        appending the class name to 'visit' so if the class name is AstNode
-        the method called is visitor.visitAstNode. If a method of that name
-        does not exist, then it recursively attempts to call the visitor
-        method on the superclass.
+        Accept method for visitor pattern. Calls the visitor methods for the type
+        of the visitable, which are found once for each visitor class.
         """
-        visitor_method = getattr(visitor, "visit%s" % klass.__name__, None)
-        if visitor_method is None:
-            bases = klass.__bases__
-            last = None
-            for i in bases:
-                last = self._accept(i, visitor)
-            return last
+        key = (visitor.__class__, self.__class__)
+        try:
+            methods, returns_last = _dispatch_cache[key]
+        except KeyError:
+            methods, returns_last = _dispatch_cache[key] = dispatch(*key)
+        if len(methods) == 1:
+            result = methods[0](visitor, self)
         else:
-            return visitor_method(self)
\ No newline at end of file
+            result = None
+            for method in methods:
+                result = method(visitor, self)
+        if returns_last:
+            return result
+        return None
@@ -4,6 +4,9 @@ from syntax.ast import If, OnGoto
 from flow.traversal import depthFirstSearch
 
 def dumpXmlBlocks(basic_blocks, filename, options):
+    # The XML is written with the .NET XmlTextWriter
+    if not options.use_clr:
+        return
     import clr
     clr.AddReference('System.Xml')
     from System.Xml import XmlTextWriter, Formatting